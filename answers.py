@@ -0,0 +1,91 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# уровни общения, которые выбирают на этапе test_interaction
+INTERACTION_LEVELS = (0, 1, 2)
+# education_max в ветке смены профессии: без готовности учиться — не выше 1
+EDUCATION_LIMITS = (None, 1)
+
+
+class AnswerTable:
+    """Заранее посчитанные ответы воронки: id профессий для каждого сочетания фильтров.
+
+    У теста и смены профессии конечное число исходов: (уровень общения,
+    категория, требование) или (категория, требование, education_max из
+    EDUCATION_LIMITS), а также те же сочетания без требования. Таблица
+    перебирает их один раз по профессиям каталога, так что строится за
+    сумму |категории| × |требования| по профессиям. Списки id по
+    возрастанию лежат подряд в одном array('q'), одинаковые хранятся один
+    раз, а словарь ключ → (начало, конец) отвечает за O(1); листание по id
+    — bisect внутри списка.
+    """
+
+    def __init__(self, ids, slices):
+        self.ids = ids
+        self.slices = slices
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        lists = {}
+        rows = sorted(catalog.ranking_rows(), key=lambda row: row[0])
+        for pid, interaction_level, education_level, categories, requirements in rows:
+            limits = [limit for limit in EDUCATION_LIMITS
+                      if limit is None or education_level is not None and education_level <= limit]
+            requirements = [None] + list(dict.fromkeys(requirements))
+            for c in dict.fromkeys(categories):
+                for r in requirements:
+                    if interaction_level is not None:
+                        lists.setdefault((interaction_level, c, r, None), []).append(pid)
+                    for limit in limits:
+                        lists.setdefault((None, c, r, limit), []).append(pid)
+
+        ids, slices, shared = array("q"), {}, {}
+        for key, group in lists.items():
+            group = tuple(group)
+            where = shared.get(group)
+            if where is None:
+                where = shared[group] = (len(ids), len(ids) + len(group))
+                ids.extend(group)
+            slices[key] = where
+        return cls(ids, slices)
+
+    def __len__(self):
+        return len(self.slices)
+
+    def nbytes(self):
+        """Примерный объём в памяти: массив id, словарь и его ключи."""
+        size = self.ids.buffer_info()[1] * self.ids.itemsize + sys.getsizeof(self.slices)
+        for key, where in self.slices.items():
+            size += sys.getsizeof(key) + sys.getsizeof(where)
+        return size
+
+    @staticmethod
+    def covers(interaction_level=None, category_id=None, education_max=None):
+        """Покрывает ли таблица такое сочетание фильтров (сами списки для проверки не нужны)."""
+        if category_id is None or education_max not in EDUCATION_LIMITS:
+            return False
+        return interaction_level is None or interaction_level in INTERACTION_LEVELS and education_max is None
+
+    def find(self, interaction_level=None, category_id=None, requirement_id=None, education_max=None,
+             limit=None, after_id=None, before_id=None):
+        """id профессий в порядке возрастания, как у find_professions, или None вне воронки.
+
+        None значит, что такое сочетание фильтров таблица не покрывает и
+        ответ нужно искать обычным запросом; покрытое сочетание без
+        профессий даёт пустой список.
+        """
+        if not self.covers(interaction_level, category_id, education_max):
+            return None
+
+        start, stop = self.slices.get((interaction_level, category_id, requirement_id, education_max), (0, 0))
+        if after_id is not None:
+            start = bisect_right(self.ids, after_id, start, stop)
+        if before_id is not None:
+            stop = bisect_left(self.ids, before_id, start, stop)
+            if limit is not None:
+                start = max(start, stop - limit)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return self.ids[start:stop].tolist()
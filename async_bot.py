@@ -0,0 +1,246 @@
+import asyncio
+import functools
+import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.util import extract_arguments
+
+from logic import DB_Manager
+from cache import Debouncer
+from outbox import AsyncOutbox
+from sessions import SessionStore, SQLiteSessionStore
+from conversation import (Chat, machine, choose, render_card, feedback_keyboard, turn_page, start_search,
+                          START_TEXT, HELP_TEXT, FEEDBACK_THANKS)
+import config
+import metrics
+
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDB:
+    """Асинхронный фасад над DB_Manager: вызовы уходят в отдельный пул потоков."""
+
+    def __init__(self, db, workers=4):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
+
+bot = AsyncTeleBot(config.token)
+db = DB_Manager(config.database, use_catalog=config.use_memory_catalog, write_behind=config.write_behind,
+                snapshot=config.catalog_snapshot or None, users_database=config.users_database or None,
+                immutable=config.catalog_immutable, catalog_poll=config.catalog_poll_seconds,
+                warm_answers=True)
+adb = AsyncDB(db, workers=config.db_workers)
+outbox = AsyncOutbox(bot, global_rate=config.send_rate, chat_rate=config.chat_send_rate,
+                     chat_burst=config.chat_send_burst, senders=config.send_workers)
+# повторная доставка нажатия и двойной тап по кнопке отзыва не доходят до базы
+feedback_debounce = Debouncer(window=config.feedback_debounce_seconds)
+
+if config.sessions_database:
+    sessions = SQLiteSessionStore(config.sessions_database)
+else:
+    sessions = SessionStore()
+
+# апдейты одного пользователя обрабатываются по очереди, разных — параллельно
+_user_locks = weakref.WeakValueDictionary()
+
+
+def _user_lock(user_id):
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+
+@bot.message_handler(commands=['start'])
+@metrics.handler
+async def start_cmd(message):
+    async with _user_lock(message.from_user.id):
+        sessions.start(message.from_user.id)
+        outbox.send_message(message.chat.id, START_TEXT, parse_mode="HTML")
+
+@bot.message_handler(commands=['help'])
+@metrics.handler
+async def help_command(message):
+    outbox.send_message(message.chat.id, HELP_TEXT, parse_mode="HTML")
+
+
+@bot.message_handler(commands=['search'])
+@metrics.handler
+async def search_command(message):
+    user_id = message.from_user.id
+    query = (extract_arguments(message.text or "") or "").strip()
+
+    async with _user_lock(user_id):
+        state = await adb.run(sessions.get, user_id)
+
+        if not state:
+            sessions.start(user_id)
+            outbox.send_message(message.chat.id, "Привет! Как тебя зовут?")
+            return
+
+        ctx = Chat(message.chat.id, db, outbox.send_message)
+        try:
+            await adb.run(start_search, ctx, state, query)
+        finally:
+            sessions.save(state)
+            ctx.flush()
+
+
+@bot.message_handler(func=lambda m: True)
+@metrics.handler
+async def handle_all_messages(message):
+    user_id = message.from_user.id
+    text = (message.text or "").strip()
+
+    async with _user_lock(user_id):
+        state = await adb.run(sessions.get, user_id)
+
+        if not state:
+            sessions.start(user_id)
+            outbox.send_message(message.chat.id, "Привет! Как тебя зовут?")
+            return
+
+        # этап целиком выполняется в пуле базы, ответы отправляются уже из цикла событий
+        ctx = Chat(message.chat.id, db, outbox.send_message)
+        try:
+            await adb.run(machine.dispatch, ctx, state, text)
+        finally:
+            sessions.save(state)
+            ctx.flush()
+
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith("viewprof:"))
+@metrics.handler
+async def callback_view_prof(call):
+    try:
+        pid = int(call.data.split(":", 1)[1])
+    except Exception:
+        outbox.answer_callback_query(call.id, "Ошибка идентификатора.")
+        return
+
+    card = await adb.run(render_card, db, pid)
+    if not card:
+        outbox.answer_callback_query(call.id, "Профессия не найдена.")
+        return
+
+    text, ikb = card
+    outbox.send_message(call.message.chat.id, text, parse_mode="HTML", reply_markup=ikb)
+
+    outbox.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith(("cat:", "req:")))
+@metrics.handler
+async def callback_choose(call):
+    async with _user_lock(call.from_user.id):
+        state = await adb.run(sessions.get, call.from_user.id)
+        ctx = Chat(call.message.chat.id, db, outbox.send_message)
+        try:
+            chosen = await adb.run(choose, ctx, state, call.data)
+        finally:
+            sessions.save(state)
+            ctx.flush()
+    outbox.answer_callback_query(call.id, None if chosen else "Этот выбор уже неактуален.")
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith("page:"))
+@metrics.handler
+async def callback_page(call):
+    state = await adb.run(sessions.get, call.from_user.id)
+    page = await adb.run(turn_page, db, state, call.data)
+    if page is None:
+        outbox.answer_callback_query(call.id, "Список устарел — выполни поиск заново.")
+        return
+
+    text, ikb = page
+    outbox.edit_message_text(text, call.message.chat.id, call.message.message_id,
+                             parse_mode="HTML", reply_markup=ikb)
+    outbox.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda call: call.data and call.data.startswith("rate:"))
+@metrics.handler
+async def callback_rate_from_list(call):
+    try:
+        pid = int(call.data.split(":", 1)[1])
+    except Exception:
+        outbox.answer_callback_query(call.id, "Ошибка.")
+        return
+
+    outbox.send_message(call.message.chat.id, "Пожалуйста, оцени эту профессию:", reply_markup=feedback_keyboard(pid))
+    outbox.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda call: call.data and (call.data.startswith("fb_yes:") or call.data.startswith("fb_no:")))
+@metrics.handler
+async def callback_feedback(call):
+    parts = call.data.split(":")
+    if len(parts) != 2:
+        outbox.answer_callback_query(call.id, "Неправильные данные.")
+        return
+
+    kind, pid_s = parts[0], parts[1]
+    try:
+        pid = int(pid_s)
+    except Exception:
+        outbox.answer_callback_query(call.id, "Неправильный ID профессии.")
+        return
+
+    is_satisfied = 1 if kind == "fb_yes" else 0
+    user_id = call.from_user.id
+    if feedback_debounce.seen(call.id, (call.message.chat.id, call.message.message_id, call.data)):
+        outbox.answer_callback_query(call.id)
+        return
+
+    try:
+        await adb.save_user_feedback(user_id, pid, is_satisfied)
+    except Exception as e:
+        metrics.handled_error("save_user_feedback", e)
+
+    outbox.send_message(user_id, FEEDBACK_THANKS[is_satisfied])
+
+    outbox.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
+
+    outbox.answer_callback_query(call.id)
+
+
+
+async def main():
+    metrics.profiler.threshold = config.profile_slow_ms / 1000
+    if config.metrics_port:
+        metrics.start_metrics_server(config.metrics_listen, config.metrics_port)
+    outbox.start()
+    try:
+        await bot.infinity_polling(timeout=60)
+    finally:
+        await outbox.close()
+        await bot.close_session()
+        sessions.close()
+        adb.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format=config.log_format)
+    log.info("Бот запущен (asyncio)...")
+    asyncio.run(main())
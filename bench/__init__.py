@@ -0,0 +1,12 @@
+"""Нагрузочный бенчмарк бота без сети и без настоящего Telegram.
+
+generate — синтетический каталог профессий нужного размера,
+transport — подмена Telegram API, которая только записывает вызовы,
+replay — прогон сценариев разговоров для множества пользователей,
+pool — пул соединений против соединения на каждый запрос,
+sessions — память на сессию при 100 тыс. и 1 млн сессий,
+runtimes — bot.py против async_bot.py на фейковом HTTP-сервере Bot API,
+search — задержка /search на каталоге в 100 тыс. профессий.
+
+Запуск: python -m bench --professions 10000 --users 2000 --output results.json
+"""
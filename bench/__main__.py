@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.generate import generate_catalog
+from bench.replay import SCENARIOS, Replayer, load_bot
+from bench.transport import FakeTelegram
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, previous):
+    """Печатает изменение p95 по этапам относительно прошлого прогона."""
+    for label, stats in current["stages"].items():
+        old = previous.get("stages", {}).get(label)
+        if not old:
+            print(f"{label:32} {stats['p95_ms']:>9.3f} ms  (новый этап)")
+            continue
+        delta = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        print(f"{label:32} {stats['p95_ms']:>9.3f} ms  {delta:+.1f}%")
+    before = previous.get("overall", {}).get("updates_per_second")
+    after = current["overall"]["updates_per_second"]
+    print(f"{'updates/s':32} {after:>9.1f}     было {before}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк ПрофГайд Бота")
+    parser.add_argument("--database", help="готовая база; по умолчанию генерируется синтетическая")
+    parser.add_argument("--professions", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--requirements", type=int, default=8, help="навыков на категорию")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка Telegram API, мс")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="куда записать JSON с результатами (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if database is None:
+            database = os.path.join(tmp, "bench.db")
+            started = time.perf_counter()
+            generate_catalog(database, args.professions, args.categories, args.requirements, seed=args.seed)
+            print(f"каталог сгенерирован за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+        transport = FakeTelegram(latency=args.latency / 1000)
+        transport.install()
+        bot = load_bot(database)
+        try:
+            replayer = Replayer(bot, transport, seed=args.seed)
+            seconds = replayer.run(args.users, scenarios)
+        finally:
+            bot.outbox.close()
+            bot.sessions.close()
+            bot.db.close()
+            transport.uninstall()
+
+    result = replayer.report(seconds)
+    result["meta"] = {
+        "commit": git_commit(),
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "database": args.database,
+        "professions": None if args.database else args.professions,
+        "categories": None if args.database else args.categories,
+        "users": args.users,
+        "scenarios": scenarios,
+        "latency_ms": args.latency,
+        "seed": args.seed,
+    }
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
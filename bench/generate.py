@@ -0,0 +1,51 @@
+import os
+import random
+
+from logic import DB_Manager
+
+
+WORDS = ("работа", "клиенты", "анализ", "проекты", "команда", "данные", "производство", "обучение",
+         "документы", "оборудование", "исследования", "продажи", "дизайн", "здоровье", "техника")
+
+
+def generate_catalog(path, professions=1000, categories=20, requirements=8, seed=0):
+    """Создаёт базу path со схемой DB_Manager и синтетическим каталогом.
+
+    У каждой категории свой набор из requirements навыков; профессия входит
+    в 1-2 категории и получает 1-3 навыка из них. Существующий файл
+    перезаписывается. Возвращает число вставленных профессий.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rng = random.Random(seed)
+    category_names = [f"Категория {i}" for i in range(1, categories + 1)]
+    skills = {c: [f"Навык {i}.{j}" for j in range(1, requirements + 1)]
+              for i, c in enumerate(category_names, 1)}
+
+    db = DB_Manager(path)
+    try:
+        with db.write_pool.connection() as conn, conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO categories (name) VALUES (?)", [(c,) for c in category_names])
+            conn.executemany("INSERT INTO requirements (name) VALUES (?)", [(s,) for c in category_names for s in skills[c]])
+            category_ids = dict(conn.execute("SELECT name, id FROM categories"))
+            requirement_ids = dict(conn.execute("SELECT name, id FROM requirements"))
+
+            for n in range(1, professions + 1):
+                description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15))).capitalize() + "."
+                cur = conn.execute(
+                    "INSERT INTO professions (name, description, interaction_level, education_level) VALUES (?, ?, ?, ?)",
+                    (f"Профессия {n}", description, rng.randint(0, 2), rng.randint(0, 3)))
+                pid = cur.lastrowid
+
+                own = rng.sample(category_names, rng.randint(1, min(2, categories)))
+                conn.executemany("INSERT INTO profession_categories (profession_id, category_id) VALUES (?, ?)",
+                                 [(pid, category_ids[c]) for c in own])
+                pool = [s for c in own for s in skills[c]]
+                conn.executemany("INSERT INTO profession_requirements (profession_id, requirement_id) VALUES (?, ?)",
+                                 [(pid, requirement_ids[r]) for r in rng.sample(pool, rng.randint(1, min(3, len(pool))))])
+    finally:
+        db.close()
+    return professions
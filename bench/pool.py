@@ -0,0 +1,118 @@
+"""Пул соединений против нового соединения на каждый запрос.
+
+Те же запросы к каталогу выполняются в threads потоках двумя способами:
+через ConnectionPool, как это делает DB_Manager, и как было до пула —
+sqlite3.connect на вызов и close после. Печатает запросы в секунду и
+задержки p50/p99 для каждого способа.
+
+Запуск: python -m bench.pool --professions 10000 --threads 8 --seconds 3
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from bench.generate import generate_catalog
+from bench.replay import summarize
+from logic import ConnectionPool
+
+
+QUERIES = (
+    ("""
+        SELECT v.id, v.name FROM categories v
+        WHERE EXISTS (SELECT 1 FROM profession_categories WHERE category_id = v.id)
+        ORDER BY v.name, v.id
+    """, lambda rng, n: ()),
+    ("SELECT id, name, description, interaction_level, education_level FROM professions WHERE id = ?",
+     lambda rng, n: (rng.randint(1, n),)),
+    ("""
+        SELECT l.category_id, v.name FROM profession_categories l JOIN categories v ON v.id = l.category_id
+        WHERE l.profession_id = ? ORDER BY l.id
+    """, lambda rng, n: (rng.randint(1, n),)),
+)
+
+
+def pooled(pool):
+    def run(sql, params):
+        with pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+    return run
+
+
+def per_call(database):
+    def run(sql, params):
+        conn = sqlite3.connect(database)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    return run
+
+
+def measure(run, professions, threads, seconds, seed=0):
+    """Гоняет QUERIES в threads потоках seconds секунд; возвращает сводку задержек и QPS."""
+    samples = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + seconds
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        own = samples[i]
+        while time.perf_counter() < deadline:
+            sql, params = rng.choice(QUERIES)
+            started = time.perf_counter()
+            run(sql, params(rng, professions))
+            own.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = summarize([s for own in samples for s in own])
+    result["qps"] = round(result["count"] / elapsed, 1)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пул соединений против соединения на запрос")
+    parser.add_argument("--database", help="готовая база; по умолчанию генерируется синтетическая")
+    parser.add_argument("--professions", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if database is None:
+            database = os.path.join(tmp, "bench.db")
+            generate_catalog(database, args.professions, seed=args.seed)
+        conn = sqlite3.connect(database)
+        professions = conn.execute("SELECT max(id) FROM professions").fetchone()[0] or 1
+        conn.close()
+
+        pool = ConnectionPool(database, size=args.threads, readonly=True)
+        try:
+            result = {
+                "pool": measure(pooled(pool), professions, args.threads, args.seconds, args.seed),
+                "per_call": measure(per_call(database), professions, args.threads, args.seconds, args.seed),
+            }
+        finally:
+            pool.close()
+
+    result["speedup"] = round(result["pool"]["qps"] / result["per_call"]["qps"], 2)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    for name in ("pool", "per_call"):
+        print(f"{name:10} {result[name]['qps']:>10.1f} запросов/с  p99 {result[name]['p99_ms']} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
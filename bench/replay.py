@@ -0,0 +1,177 @@
+import importlib
+import itertools
+import os
+import random
+import time
+from collections import namedtuple
+
+from telebot import types
+
+import config
+
+
+Pick = namedtuple("Pick", [])
+Inline = namedtuple("Inline", ["prefix"])
+
+PICK = Pick()
+
+# шаг сценария: текст сообщения, PICK — случайная кнопка последней reply-клавиатуры,
+# Inline(prefix) — случайная inline-кнопка с таким префиксом (если её нет, шаг пропускается)
+SCENARIOS = {
+    "test": ["/start", "name", "age", "📘 Пройти тест", PICK, Inline("cat:"), Inline("req:"),
+             Inline("page:"), Inline("viewprof:"), Inline("fb_")],
+    "change": ["/start", "name", "age", "🔁 Сменить профессию", Inline("cat:"), "Нет", PICK, Inline("cat:"),
+               Inline("req:"), Inline("rate:"), Inline("fb_")],
+    "info": ["/start", "name", "age", "ℹ️ Про профессию", Inline("cat:"), Inline("viewprof:"), Inline("fb_")],
+}
+
+
+def load_bot(database):
+    """Импортирует bot.py поверх заданной базы с обработкой апдейтов в текущем потоке."""
+    config.database = database
+    config.users_database = os.path.splitext(database)[0] + "-users.db"
+    config.token = "0:bench"
+    config.sessions_database = None
+    config.mode = "polling"
+    # меряется работа бота, а не лимиты Telegram
+    config.send_rate = config.chat_send_rate = 0
+
+    import bot
+    bot = importlib.reload(bot)
+    bot.bot.threaded = False
+    return bot
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(samples),
+        "mean_ms": ms(sum(samples) / len(samples)),
+        "p50_ms": ms(percentile(samples, 50)),
+        "p95_ms": ms(percentile(samples, 95)),
+        "p99_ms": ms(percentile(samples, 99)),
+        "max_ms": ms(samples[-1]),
+    }
+
+
+def resolve_step(rng, transport, user_id, step):
+    """Превращает шаг сценария в ("message", текст) или ("callback", data); None — шаг пропускается."""
+    if isinstance(step, Inline):
+        choices = [d for d in transport.inline_buttons.get(user_id, ()) if d.startswith(step.prefix)]
+        return ("callback", rng.choice(choices)) if choices else None
+    if step is PICK:
+        choices = transport.reply_buttons.get(user_id)
+        return ("message", rng.choice(choices)) if choices else None
+    if step == "name":
+        return "message", f"Пользователь {user_id}"
+    if step == "age":
+        return "message", str(rng.randint(14, 50))
+    return "message", step
+
+
+def message_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def callback_update(update_id, user_id, data):
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "bench", "data": data,
+        "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+        "message": {"message_id": 1, "date": 0, "text": "", "chat": {"id": user_id, "type": "private"}},
+    }}
+
+
+class Replayer:
+    """Прогоняет сценарии разговоров через обработчики bot.py.
+
+    Пользователи идут вперемешку — на каждом шаге выбирается случайный
+    активный пользователь, — так в хранилище сессий одновременно живут
+    тысячи незавершённых разговоров. Время каждого апдейта записывается
+    под меткой этапа: стадия сессии до сообщения, команда или префикс
+    callback-кнопки.
+    """
+
+    def __init__(self, bot, transport, seed=0):
+        self.bot = bot
+        self.transport = transport
+        self.rng = random.Random(seed)
+        self.samples = {}
+        self.skipped = 0
+        self._update_ids = itertools.count(1)
+
+    def run(self, users=1000, scenarios=("test", "change", "info"), first_user_id=1000000):
+        active = [[first_user_id + i, SCENARIOS[self.rng.choice(scenarios)], 0] for i in range(users)]
+        started = time.perf_counter()
+
+        while active:
+            i = self.rng.randrange(len(active))
+            cursor = active[i]
+            user_id, steps, position = cursor
+            self._step(user_id, steps[position])
+            cursor[2] += 1
+            if cursor[2] == len(steps):
+                active[i] = active[-1]
+                active.pop()
+
+        if self.bot.db.writer is not None:
+            self.bot.db.writer.flush()
+        return time.perf_counter() - started
+
+    def _step(self, user_id, step):
+        resolved = resolve_step(self.rng, self.transport, user_id, step)
+        if resolved is None:
+            self.skipped += 1
+            return
+        kind, value = resolved
+        if kind == "callback":
+            self._timed("callback:" + step.prefix.rstrip(":_"), self._callback(user_id, value))
+            return
+
+        if value.startswith("/"):
+            label = "command:" + value
+        else:
+            state = self.bot.sessions.get(user_id)
+            label = state.stage if state else "new_user"
+        self._timed(label, self._message(user_id, value))
+
+    def _timed(self, label, update):
+        started = time.perf_counter()
+        self.bot.bot.process_new_updates([update])
+        self.bot.outbox.flush()
+        self.samples.setdefault(label, []).append(time.perf_counter() - started)
+
+    def _message(self, user_id, text):
+        return types.Update.de_json(message_update(next(self._update_ids), user_id, text))
+
+    def _callback(self, user_id, data):
+        return types.Update.de_json(callback_update(next(self._update_ids), user_id, data))
+
+    def report(self, seconds):
+        updates = sum(len(v) for v in self.samples.values())
+        overall = summarize([s for v in self.samples.values() for s in v]) if updates else {}
+        overall.update({
+            "updates": updates,
+            "seconds": round(seconds, 3),
+            "updates_per_second": round(updates / seconds, 1) if seconds else None,
+            "skipped_steps": self.skipped,
+        })
+        return {
+            "overall": overall,
+            "stages": {label: summarize(v) for label, v in sorted(self.samples.items())},
+            "api_calls": dict(self.transport.calls),
+        }
@@ -0,0 +1,321 @@
+"""Пропускная способность потокового бота (bot.py) против asyncio-бота (async_bot.py).
+
+Оба бота запускаются отдельными процессами в режиме polling и ходят по
+HTTP в один и тот же фейковый сервер Bot API: getUpdates отдаёт апдейты
+виртуальных пользователей, остальные методы отвечают через latency мс,
+как настоящий Telegram. Каждый пользователь проходит сценарий из
+bench.replay и отправляет следующий шаг, когда бот ответил на предыдущий
+и замолчал на settle мс (шаг-кнопка ещё ждёт клавиатуру с этой кнопкой).
+Печатает апдейты в секунду и задержку от выдачи апдейта до первого ответа
+бота для каждого рантайма.
+
+Запуск: python -m bench.runtimes --professions 2000 --users 300 --latency 50
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from bench.generate import generate_catalog
+from bench.replay import SCENARIOS, Inline, callback_update, message_update, resolve_step, summarize
+from bench.transport import FakeTelegram
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIMES = ("threaded", "async")
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+
+class Conversations:
+    """Виртуальные пользователи: выдают апдейты по сценариям и ждут ответов бота."""
+
+    def __init__(self, transport, users, scenarios, settle, patience=5.0, step_timeout=10.0, seed=0,
+                 first_user_id=1000000):
+        self.transport = transport
+        self.settle = settle
+        self.patience = patience
+        self.step_timeout = step_timeout
+        self.rng = random.Random(seed)
+        # курсор пользователя: шаги, позиция, когда выдан апдейт, последний ответ, последняя клавиатура
+        self.users = {first_user_id + i: [SCENARIOS[self.rng.choice(scenarios)], 0, None, None, None]
+                      for i in range(users)}
+        self.latencies = []
+        self.steps = 0
+        self.skipped = 0
+        self.lost = 0
+        self.done = threading.Event()
+        self._update_ids = itertools.count(1)
+        self._updates = []
+        self._callbacks = {}
+        self._lock = threading.Condition()
+
+    def get_updates(self, offset, limit, timeout):
+        deadline = time.perf_counter() + timeout
+        with self._lock:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and not self.done.is_set():
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                self._lock.wait(left)
+            return self._updates[:limit]
+
+    def answered(self, params):
+        """Вызов бота к API: отмечает ответ пользователю, которому он адресован."""
+        now = time.perf_counter()
+        with self._lock:
+            if "callback_query_id" in params:
+                user_id = self._callbacks.pop(params["callback_query_id"], None)
+            else:
+                user_id = int(params.get("chat_id", 0))
+            cursor = self.users.get(user_id)
+            if cursor is None:
+                return
+            if cursor[3] is None and cursor[2] is not None:
+                self.latencies.append(now - cursor[2])
+            cursor[3] = now
+            if params.get("reply_markup") not in (None, "", "null"):
+                cursor[4] = now
+
+    def run(self):
+        """Гоняет сценарии до конца; возвращает время в секундах."""
+        started = time.perf_counter()
+        with self._lock:
+            for user_id in list(self.users):
+                self._next(user_id, started)
+            self._lock.notify_all()
+        while True:
+            time.sleep(0.001)
+            now = time.perf_counter()
+            with self._lock:
+                for user_id, (steps, position, issued, replied, marked) in list(self.users.items()):
+                    if replied is not None and now - replied >= self.settle and (
+                            now - replied >= self.patience or self._has_button(user_id, steps, position, marked)):
+                        self.steps += 1
+                    elif now - issued >= self.step_timeout:
+                        self.lost += 1
+                    else:
+                        continue
+                    self._next(user_id, now)
+                if not self.users:
+                    break
+                self._lock.notify_all()
+        self.done.set()
+        with self._lock:
+            self._lock.notify_all()
+        return time.perf_counter() - started
+
+    def _has_button(self, user_id, steps, position, marked):
+        # под нагрузкой клавиатура может прийти отдельным сообщением намного позже первого ответа;
+        # шаг-кнопка ждёт её до patience и только потом пропускается
+        if position == len(steps) or isinstance(steps[position], str):
+            return True
+        if marked is None:
+            return False
+        step = steps[position]
+        if isinstance(step, Inline):
+            return any(d.startswith(step.prefix) for d in self.transport.inline_buttons.get(user_id, ()))
+        return bool(self.transport.reply_buttons.get(user_id))
+
+    def _next(self, user_id, now):
+        # шаги без нужной кнопки пропускаются, как в bench.replay
+        cursor = self.users[user_id]
+        steps = cursor[0]
+        while cursor[1] < len(steps):
+            step = steps[cursor[1]]
+            cursor[1] += 1
+            resolved = resolve_step(self.rng, self.transport, user_id, step)
+            if resolved is None:
+                self.skipped += 1
+                continue
+            update_id = next(self._update_ids)
+            kind, value = resolved
+            if kind == "callback":
+                self._callbacks[str(update_id)] = user_id
+                self._updates.append(callback_update(update_id, user_id, value))
+            else:
+                self._updates.append(message_update(update_id, user_id, value))
+            cursor[2], cursor[3], cursor[4] = now, None, None
+            return
+        del self.users[user_id]
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """HTTP-сервер с методами Bot API поверх FakeTelegram и Conversations."""
+
+    daemon_threads = True
+
+    def __init__(self, transport, conversations):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.transport = transport
+        self.conversations = conversations
+        self.polled = threading.Event()
+
+    def handle_error(self, request, client_address):
+        # соединения рвутся, когда процесс бота останавливают посреди long polling
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # иначе заголовки и тело ответа ждут друг друга по 40 мс (Nagle и отложенный ACK)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        self._handle()
+
+    do_POST = do_GET
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode("utf-8")))
+        name = url.path.rsplit("/", 1)[1]
+
+        server = self.server
+        if name == "getUpdates":
+            server.polled.set()
+            payload = {"ok": True, "result": server.conversations.get_updates(
+                int(params.get("offset", 0)), int(params.get("limit", 100)), float(params.get("timeout", 0)))}
+        elif name == "getMe":
+            payload = {"ok": True, "result": BOT_USER}
+        else:
+            server.conversations.answered(params)
+            payload = server.transport("post", url.path, params=params).json()
+
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_bot(runtime, api_url, database, users_database, senders):
+    """Точка входа дочернего процесса: бот нужного рантайма поверх фейкового API."""
+    import config
+    from telebot import apihelper, asyncio_helper
+
+    config.database = database
+    config.users_database = users_database
+    config.token = "0:bench"
+    config.sessions_database = None
+    config.mode = "polling"
+    config.metrics_port = 0
+    config.send_rate = config.chat_send_rate = 0
+    config.send_workers = senders
+    apihelper.API_URL = asyncio_helper.API_URL = api_url + "/bot{0}/{1}"
+
+    if runtime == "async":
+        import asyncio
+        import async_bot
+        asyncio.run(async_bot.main())
+    else:
+        import bot
+        bot.bot.infinity_polling(timeout=10, long_polling_timeout=1)
+
+
+def measure(runtime, database, users, scenarios, latency, settle, senders, seed, tmp):
+    transport = FakeTelegram(latency=latency)
+    conversations = Conversations(transport, users, scenarios, settle, seed=seed)
+    server = FakeBotAPI(transport, conversations)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    child = subprocess.Popen(
+        [sys.executable, "-m", "bench.runtimes", "--bot", runtime, "--api", server.url, "--database", database,
+         "--users-database", os.path.join(tmp, f"{runtime}-users.db"), "--senders", str(senders)],
+        cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        # время запуска процесса и загрузки каталога не в счёт
+        while not server.polled.wait(0.1):
+            if child.poll() is not None:
+                raise RuntimeError(f"{runtime}: бот завершился с кодом {child.returncode}")
+        seconds = conversations.run()
+    finally:
+        child.terminate()
+        child.wait()
+        server.shutdown()
+        server.server_close()
+
+    result = summarize(conversations.latencies) if conversations.latencies else {}
+    result.update({
+        "updates": conversations.steps,
+        "seconds": round(seconds, 3),
+        "updates_per_second": round(conversations.steps / seconds, 1),
+        "skipped_steps": conversations.skipped,
+        "lost_steps": conversations.lost,
+        "api_calls": dict(transport.calls),
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Потоковый бот против asyncio-бота на фейковом Bot API")
+    parser.add_argument("--database", help="готовая база; по умолчанию генерируется синтетическая")
+    parser.add_argument("--professions", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--runtimes", default=",".join(RUNTIMES))
+    parser.add_argument("--latency", type=float, default=50.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--settle", type=float, help="тишина после ответа бота до следующего шага, мс "
+                                                     "(по умолчанию latency + 20)")
+    # при config.send_workers отправитель насыщается раньше обработчиков, и сравнивать становится нечего
+    parser.add_argument("--senders", type=int, default=64, help="потоков или задач отправки в Outbox бота")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bot", choices=RUNTIMES, help=argparse.SUPPRESS)
+    parser.add_argument("--api", help=argparse.SUPPRESS)
+    parser.add_argument("--users-database", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.bot:
+        run_bot(args.bot, args.api, args.database, args.users_database, args.senders)
+        return
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    runtimes = [r for r in args.runtimes.split(",") if r]
+    unknown = (set(scenarios) - set(SCENARIOS)) | (set(runtimes) - set(RUNTIMES))
+    if unknown:
+        parser.error(f"unknown scenarios or runtimes: {', '.join(sorted(unknown))}")
+    settle = (args.latency + 20 if args.settle is None else args.settle) / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if database is None:
+            database = os.path.join(tmp, "bench.db")
+            generate_catalog(database, args.professions, seed=args.seed)
+        result = {runtime: measure(runtime, database, args.users, scenarios, args.latency / 1000, settle,
+                                   args.senders, args.seed, tmp)
+                  for runtime in runtimes}
+
+    if len(result) == 2:
+        result["speedup"] = round(result["async"]["updates_per_second"] / result["threaded"]["updates_per_second"], 2)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    for runtime in runtimes:
+        stats = result[runtime]
+        print(f"{runtime:10} {stats['updates_per_second']:>8.1f} апдейтов/с  p99 {stats.get('p99_ms')} ms",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Задержка /search на большом синтетическом каталоге.
+
+Каждый запрос выполняется repeat раз через DB_Manager.search_professions
+(первая страница и страница с offset); печатает p50/p95/p99 по запросам.
+Синтетический каталог — худший случай для поиска: слово «Профессия» есть
+в каждом названии, а слова описаний повторяются в десятках тысяч строк,
+и bm25 оценивает каждое совпадение.
+
+Запуск: python -m bench.search --professions 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bench.generate import generate_catalog
+from bench.replay import summarize
+from logic import DB_Manager
+
+
+# точные, с опечаткой (нечёткий поиск) и по названию
+QUERIES = (
+    "анализ клиенты",
+    "данные",
+    "оборудованее",
+    "кат",
+    "анлиз",
+    "навкы",
+    "профессия 99999",
+    "профессея 12345",
+    "анализ клиенты данные",
+)
+
+
+def measure(db, text, offset, repeat):
+    db.search_professions(text, offset=offset)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows, fuzzy = db.search_professions(text, offset=offset)
+        samples.append(time.perf_counter() - started)
+    result = summarize(samples)
+    result.update({"rows": len(rows), "fuzzy": fuzzy})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Задержка поиска профессий")
+    parser.add_argument("--database", help="готовая база; по умолчанию генерируется синтетическая")
+    parser.add_argument("--professions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--offset", type=int, default=20, help="смещение второй измеряемой страницы")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if database is None:
+            database = os.path.join(tmp, "bench.db")
+            started = time.perf_counter()
+            generate_catalog(database, args.professions, seed=args.seed)
+            print(f"каталог сгенерирован за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+        db = DB_Manager(database, users_database=os.path.join(tmp, "users.db"))
+        try:
+            result = {text: {"first": measure(db, text, 0, args.repeat),
+                             "offset": measure(db, text, args.offset, args.repeat)}
+                      for text in QUERIES}
+        finally:
+            db.close()
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    for text, pages in result.items():
+        first, offset = pages["first"], pages["offset"]
+        print(f"{text:24} p50 {first['p50_ms']:>6.2f} p99 {first['p99_ms']:>6.2f} ms  "
+              f"с offset p50 {offset['p50_ms']:>6.2f} p99 {offset['p99_ms']:>6.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
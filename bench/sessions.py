@@ -0,0 +1,68 @@
+"""Память на сессию: SessionStore против словаря user_states, который был до него.
+
+В обоих вариантах у пользователя одно и то же состояние середины теста
+(имя, возраст, уровень общения, категория). Объём меряется tracemalloc
+как прирост выделенной памяти после заполнения.
+
+Запуск: python -m bench.sessions --counts 100000,1000000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from sessions import SessionStore
+
+
+def fill_store(count):
+    store = SessionStore(maxsize=count)
+    for user_id in range(1, count + 1):
+        session = store.start(user_id)
+        session.stage = "test_category"
+        session.name = f"Пользователь {user_id}"
+        session.age = 14 + user_id % 40
+        session.interaction_level = user_id % 3
+        session.category = user_id % 20
+        store.save(session)
+    return store
+
+
+def fill_dict(count):
+    # состояние в том виде, в каком бот хранил его до SessionStore
+    user_states = {}
+    for user_id in range(1, count + 1):
+        user_states[user_id] = {"stage": "test_category", "data": {
+            "name": f"Пользователь {user_id}",
+            "age": 14 + user_id % 40,
+            "interaction_level": user_id % 3,
+            "category": user_id % 20,
+        }}
+    return user_states
+
+
+def measure(fill, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        sessions = fill(count)
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del sessions
+    return {"bytes": size, "bytes_per_session": round(size / count, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память на сессию при разном числе сессий")
+    parser.add_argument("--counts", default="100000,1000000")
+    args = parser.parse_args(argv)
+
+    result = {}
+    for count in (int(c) for c in args.counts.split(",") if c):
+        result[count] = {"store": measure(fill_store, count), "dict": measure(fill_dict, count)}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
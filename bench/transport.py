@@ -0,0 +1,75 @@
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+
+from telebot import apihelper
+
+
+class _Response:
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, payload):
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeTelegram:
+    """Подмена Telegram Bot API внутри процесса для синхронного TeleBot.
+
+    Ставится как apihelper.CUSTOM_REQUEST_SENDER: ничего не отправляет,
+    считает вызовы по методам и запоминает последние клавиатуры каждого
+    чата, чтобы сценарий мог «нажать» кнопку. latency — искусственная
+    задержка каждого вызова в секундах.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.reply_buttons = {}
+        self.inline_buttons = {}
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def install(self):
+        self._previous = apihelper.CUSTOM_REQUEST_SENDER
+        apihelper.CUSTOM_REQUEST_SENDER = self
+
+    def uninstall(self):
+        apihelper.CUSTOM_REQUEST_SENDER = self._previous
+
+    def __call__(self, method, url, **kwargs):
+        name = url.rsplit("/", 1)[1]
+        params = kwargs.get("params") or {}
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.calls[name] += 1
+            message_id = next(self._message_ids)
+            if "chat_id" in params and "reply_markup" in params:
+                self._remember(int(params["chat_id"]), params["reply_markup"])
+
+        if name in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            chat_id = int(params.get("chat_id", 0))
+            return _Response({"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", ""),
+            }})
+        return _Response({"ok": True, "result": True})
+
+    def _remember(self, chat_id, markup):
+        if not markup:
+            return
+        markup = json.loads(markup) if isinstance(markup, str) else markup
+        if "keyboard" in markup:
+            self.reply_buttons[chat_id] = [b["text"] for row in markup["keyboard"] for b in row]
+        elif "inline_keyboard" in markup:
+            self.inline_buttons[chat_id] = [b["callback_data"] for row in markup["inline_keyboard"] for b in row
+                                            if "callback_data" in b]
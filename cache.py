@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+Vocabulary = namedtuple("Vocabulary", ["items", "index"])
+
+
+def make_vocabulary(items):
+    """Пары (id, название) в исходном порядке плюс словарь id → название для проверки за O(1)."""
+    items = tuple(items)
+    return Vocabulary(items, dict(items))
+
+
+class TTLCache:
+    """LRU-кэш с ограничением размера, временем жизни записей и счётчиками.
+
+    invalidate() увеличивает generation: значение, которое начали загружать
+    до сброса, возвращается вызвавшему, но в кэш уже не попадает.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            generation = self.generation
+
+        value = loader()
+
+        with self._lock:
+            if generation != self.generation:
+                return value
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class RenderCache(TTLCache):
+    """Кэш готовых текстов и клавиатур, привязанный к версии каталога.
+
+    При смене версии все записи сбрасываются, поэтому после изменения
+    каталога карточки перерисовываются с новыми данными.
+    """
+
+    def __init__(self, maxsize=4096):
+        super().__init__(maxsize=maxsize, ttl=float("inf"))
+        self.version = None
+
+    def render(self, version, key, builder):
+        if version != self.version:
+            self.invalidate()
+            self.version = version
+        return self.get((version, key), builder)
+
+
+class Debouncer:
+    """Отсеивает повторы: ключ, уже встреченный за последние window секунд, считается повтором.
+
+    Хранит не больше maxsize ключей, самые старые вытесняются первыми.
+    hits — сколько повторов отсеяно, misses — сколько ключей пропущено.
+    """
+
+    def __init__(self, window=10, maxsize=65536):
+        self.window = window
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, *keys):
+        """True, если хоть один из ключей уже был в окне; все ключи запоминаются."""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                key, stamp = next(iter(self._seen.items()))
+                if stamp > now - self.window and len(self._seen) < self.maxsize:
+                    break
+                self._seen.popitem(last=False)
+
+            repeated = any(key in self._seen for key in keys)
+            for key in keys:
+                self._seen.setdefault(key, now)
+            if repeated:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return repeated
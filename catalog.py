@@ -0,0 +1,155 @@
+from bisect import bisect_left, bisect_right
+
+
+class Catalog:
+    """Каталог профессий в памяти с инвертированными индексами.
+
+    Отвечает на те же запросы, что и SQL-методы DB_Manager, пересечением
+    множеств id вместо JOIN по таблицам категорий и требований. Категории и
+    требования профессий хранятся id из словарей, названия — в
+    category_names и requirement_names.
+    """
+
+    def __init__(self):
+        self.professions = {}
+        self.category_names = {}
+        self.requirement_names = {}
+        self.categories = {}
+        self.requirements = {}
+        self.by_category = {}
+        self.by_requirement = {}
+        self.by_interaction = {}
+        self.by_education = {}
+
+    @classmethod
+    def load(cls, conn):
+        catalog = cls()
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT id, name, description, interaction_level, education_level
+            FROM professions
+            ORDER BY id
+        """)
+        for row in cur:
+            catalog.add_profession(*row)
+
+        catalog.category_names = dict(cur.execute("SELECT id, name FROM categories"))
+        catalog.requirement_names = dict(cur.execute("SELECT id, name FROM requirements"))
+
+        cur.execute("""
+            SELECT profession_id, category_id
+            FROM profession_categories
+            ORDER BY id
+        """)
+        for pid, category_id in cur:
+            catalog.add_category(pid, category_id)
+
+        cur.execute("""
+            SELECT profession_id, requirement_id
+            FROM profession_requirements
+            ORDER BY id
+        """)
+        for pid, requirement_id in cur:
+            catalog.add_requirement(pid, requirement_id)
+
+        return catalog
+
+    def __len__(self):
+        return len(self.professions)
+
+    def ranking_rows(self):
+        """(id, уровень общения, уровень образования, id категорий, id требований) для Ranker."""
+        for pid, row in self.professions.items():
+            yield pid, row[3], row[4], self.categories.get(pid, ()), self.requirements.get(pid, ())
+
+    def add_profession(self, pid, name, description, interaction_level, education_level):
+        self.professions[pid] = (pid, name, description, interaction_level, education_level)
+        self.categories.setdefault(pid, [])
+        self.requirements.setdefault(pid, [])
+        self.by_interaction.setdefault(interaction_level, set()).add(pid)
+        self.by_education.setdefault(education_level, set()).add(pid)
+
+    def add_category(self, pid, category_id):
+        self.categories.setdefault(pid, []).append(category_id)
+        self.by_category.setdefault(category_id, set()).add(pid)
+
+    def add_requirement(self, pid, requirement_id):
+        self.requirements.setdefault(pid, []).append(requirement_id)
+        self.by_requirement.setdefault(requirement_id, set()).add(pid)
+
+    def _existing(self, ids):
+        return sorted(pid for pid in ids if pid in self.professions)
+
+    def get_all_categories(self):
+        categories = [(c, self.category_names[c]) for c, ids in self.by_category.items() if ids]
+        return sorted(categories, key=lambda item: (item[1], item[0]))
+
+    def get_all_requirements(self, category_id):
+        result = {}
+        for pid in sorted(self.by_category.get(category_id, ())):
+            for r in self.requirements.get(pid, ()):
+                result.setdefault(r, self.requirement_names[r])
+        return list(result.items())
+
+    def get_professions_in_category(self, category_id):
+        return [self.professions[pid][:2] for pid in self._existing(self.by_category.get(category_id, ()))]
+
+    def get_profession_details(self, prof_id):
+        row = self.professions.get(prof_id)
+        if not row:
+            return None
+
+        return {
+            "id": row[0],
+            "name": row[1],
+            "description": row[2],
+            "interaction_level": row[3],
+            "education_level": row[4],
+            "categories": [self.category_names[c] for c in self.categories.get(prof_id, ())],
+            "requirements": [self.requirement_names[r] for r in self.requirements.get(prof_id, ())],
+            "category_ids": list(self.categories.get(prof_id, ())),
+            "requirement_ids": list(self.requirements.get(prof_id, ())),
+        }
+
+    def get_rows(self, ids):
+        """(id, name, description) для id по порядку; отсутствующих профессий нет в ответе."""
+        return [self.professions[pid][:3] for pid in ids if pid in self.professions]
+
+    def find_professions(self, interaction_level=None, category_id=None, requirement_id=None, education_max=None,
+                         limit=None, after_id=None, before_id=None):
+        filters = []
+
+        if interaction_level is not None:
+            filters.append(self.by_interaction.get(interaction_level, set()))
+
+        if category_id is not None:
+            filters.append(self.by_category.get(category_id, set()))
+
+        if requirement_id is not None:
+            filters.append(self.by_requirement.get(requirement_id, set()))
+
+        if education_max is not None:
+            allowed = set()
+            for level, ids in self.by_education.items():
+                if level is not None and level <= education_max:
+                    allowed |= ids
+            filters.append(allowed)
+
+        if filters:
+            filters.sort(key=len)
+            ids = set(filters[0]).intersection(*filters[1:])
+        else:
+            ids = self.professions.keys()
+
+        ids = self._existing(ids)
+        if after_id is not None:
+            ids = ids[bisect_right(ids, after_id):]
+        if before_id is not None:
+            ids = ids[:bisect_left(ids, before_id)]
+            if limit is not None:
+                ids = ids[max(len(ids) - limit, 0):]
+        if limit is not None:
+            ids = ids[:limit]
+
+        return [self.professions[pid][:3] for pid in ids]
@@ -0,0 +1,290 @@
+import csv
+import json
+import logging
+
+from migrations import (VOCABULARIES, create_catalog_indexes, drop_catalog_indexes, create_search_triggers,
+                        drop_search_triggers, refresh_search_rows, has_search_index, create_version_triggers,
+                        drop_version_triggers, bump_catalog_version)
+
+
+log = logging.getLogger(__name__)
+
+FIELDS = ("name", "description", "interaction_level", "education_level", "categories", "requirements")
+FORMATS = ("csv", "jsonl")
+
+# в CSV списки категорий и требований записываются в одну ячейку через ;
+LIST_SEPARATOR = ";"
+# разделитель для сравнения списков внутри SQL, в данных не встречается
+_SEP = "\x1f"
+
+_REPORTED_ERRORS = 20
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _read(path, fmt):
+    """(номер строки, запись) по одной; для JSONL запись — ещё не разобранная строка."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f), 2)
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    yield line, text
+
+
+def _list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    items = (str(v).strip() for v in value if v is not None)
+    return list(dict.fromkeys(v for v in items if v))
+
+
+def _level(value, highest):
+    if value is None or value == "":
+        return None
+    level = int(value)
+    if not 0 <= level <= highest:
+        raise ValueError(f"level {level} is out of range 0..{highest}")
+    return level
+
+
+def _normalize(record):
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is empty")
+    description = record.get("description")
+    return ((name, description if description != "" else None,
+             _level(record.get("interaction_level"), 2), _level(record.get("education_level"), 3)),
+            _list(record.get("categories")), _list(record.get("requirements")))
+
+
+def import_catalog(db, path, fmt=None, batch_size=20000):
+    """Потоковая загрузка каталога из CSV или JSONL в одной транзакции.
+
+    Профессии сопоставляются по названию: новые добавляются, у
+    изменившихся обновляются поля и заменяются категории и требования,
+    совпадающие не трогаются. Если название встречается в файле несколько
+    раз, побеждает последняя строка. Файл читается пачками по batch_size в
+    временные таблицы, а всё остальное делают несколько SQL-запросов над
+    ними; при большой загрузке индексы каталога и триггеры поиска снимаются
+    и строятся заново уже после вставки, а версия каталога увеличивается
+    один раз за загрузку. Битые строки пропускаются с
+    предупреждением. Возвращает словарь со счётчиками.
+    """
+    fmt = detect_format(path, fmt)
+    stats = {"read": 0, "skipped": 0, "duplicates": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+
+    with db.write_pool.connection() as conn:
+        cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+        conn.execute("PRAGMA cache_size = -262144")
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("""
+                    CREATE TEMP TABLE import_rows (
+                        seq INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        description TEXT,
+                        interaction_level INTEGER,
+                        education_level INTEGER,
+                        categories TEXT,
+                        requirements TEXT
+                    )
+                """)
+                conn.execute("CREATE TEMP TABLE import_links (seq INTEGER NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL)")
+
+                rows, links = [], []
+                for line, record in _read(path, fmt):
+                    stats["read"] += 1
+                    try:
+                        fields, categories, requirements = _normalize(record)
+                    except (ValueError, TypeError) as e:
+                        stats["skipped"] += 1
+                        if stats["skipped"] <= _REPORTED_ERRORS:
+                            log.warning("%s:%s: %s", path, line, e)
+                        continue
+
+                    rows.append((line, *fields, _SEP.join(categories) or None, _SEP.join(requirements) or None))
+                    links.extend((line, "c", c) for c in categories)
+                    links.extend((line, "r", r) for r in requirements)
+                    if len(rows) >= batch_size:
+                        _stage(conn, rows, links)
+                        rows, links = [], []
+                _stage(conn, rows, links)
+
+                changed_ids = _merge(conn, stats)
+        finally:
+            for table in ("import_rows", "import_links", "import_targets"):
+                conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+            conn.execute(f"PRAGMA cache_size = {cache_size}")
+
+    if changed_ids:
+        # поштучно обновлять ранжирование имеет смысл только для небольших загрузок
+        db.invalidate_catalog(changed_ids if len(changed_ids) <= 1000 else None)
+    return stats
+
+
+def _stage(conn, rows, links):
+    conn.executemany("INSERT INTO import_rows VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT INTO import_links VALUES (?, ?, ?)", links)
+
+
+def _merge(conn, stats):
+    conn.execute("CREATE INDEX temp.import_rows_name ON import_rows (name, seq)")
+    stats["duplicates"] = conn.execute("""
+        DELETE FROM import_rows
+        WHERE seq NOT IN (SELECT max(seq) FROM import_rows GROUP BY name)
+    """).rowcount
+    conn.execute("DELETE FROM import_links WHERE seq NOT IN (SELECT seq FROM import_rows)")
+    conn.execute("CREATE INDEX temp.import_links_seq ON import_links (seq)")
+
+    conn.execute("CREATE TEMP TABLE import_targets (seq INTEGER PRIMARY KEY, id INTEGER NOT NULL)")
+    matched = conn.execute("""
+        SELECT count(*) FROM import_rows i
+        WHERE EXISTS (SELECT 1 FROM professions p WHERE p.name = i.name)
+    """).fetchone()[0]
+    stats["updated"] = conn.execute("""
+        INSERT INTO import_targets (seq, id)
+        SELECT i.seq, p.id
+        FROM import_rows i
+        JOIN professions p ON p.id = (SELECT min(id) FROM professions WHERE name = i.name)
+        WHERE p.description IS NOT i.description
+           OR p.interaction_level IS NOT i.interaction_level
+           OR p.education_level IS NOT i.education_level
+           OR (SELECT group_concat(name, char(31)) FROM (
+                   SELECT v.name FROM profession_categories l JOIN categories v ON v.id = l.category_id
+                   WHERE l.profession_id = p.id ORDER BY l.id
+               )) IS NOT i.categories
+           OR (SELECT group_concat(name, char(31)) FROM (
+                   SELECT v.name FROM profession_requirements l JOIN requirements v ON v.id = l.requirement_id
+                   WHERE l.profession_id = p.id ORDER BY l.id
+               )) IS NOT i.requirements
+    """).rowcount
+    stats["unchanged"] = matched - stats["updated"]
+
+    search = has_search_index(conn)
+    if search:
+        drop_search_triggers(conn)
+    # версия каталога растёт один раз на загрузку, а не на каждую строку
+    drop_version_triggers(conn)
+
+    conn.execute("""
+        UPDATE professions
+        SET description = i.description,
+            interaction_level = i.interaction_level,
+            education_level = i.education_level
+        FROM import_targets t JOIN import_rows i ON i.seq = t.seq
+        WHERE professions.id = t.id
+    """)
+    conn.execute("DELETE FROM profession_categories WHERE profession_id IN (SELECT id FROM import_targets)")
+    conn.execute("DELETE FROM profession_requirements WHERE profession_id IN (SELECT id FROM import_targets)")
+
+    last_id = conn.execute("SELECT coalesce(max(id), 0) FROM professions").fetchone()[0]
+    stats["inserted"] = conn.execute("""
+        INSERT INTO professions (name, description, interaction_level, education_level)
+        SELECT name, description, interaction_level, education_level
+        FROM import_rows i
+        WHERE NOT EXISTS (SELECT 1 FROM professions p WHERE p.name = i.name)
+        ORDER BY seq
+    """).rowcount
+    conn.execute("""
+        INSERT INTO import_targets (seq, id)
+        SELECT i.seq, p.id FROM professions p JOIN import_rows i ON i.name = p.name
+        WHERE p.id > ?
+    """, (last_id,))
+
+    # перестроить индекс с нуля быстрее, чем вставлять в него большую пачку строк
+    new_links = conn.execute("""
+        SELECT count(*) FROM import_links l JOIN import_targets t ON t.seq = l.seq
+    """).fetchone()[0]
+    existing_links = conn.execute("""
+        SELECT (SELECT count(*) FROM profession_categories) + (SELECT count(*) FROM profession_requirements)
+    """).fetchone()[0]
+    defer_indexes = new_links > existing_links // 4
+    if defer_indexes:
+        drop_catalog_indexes(conn)
+
+    for (vocabulary, table, column), kind in zip(VOCABULARIES, ("c", "r")):
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {vocabulary} (name)
+            SELECT DISTINCT l.value
+            FROM import_links l JOIN import_targets t ON t.seq = l.seq
+            WHERE l.kind = ?
+        """, (kind,))
+        conn.execute(f"""
+            INSERT INTO {table} (profession_id, {column}_id)
+            SELECT t.id, v.id
+            FROM import_links l
+            JOIN import_targets t ON t.seq = l.seq
+            JOIN {vocabulary} v ON v.name = l.value
+            WHERE l.kind = ?
+            ORDER BY l.rowid
+        """, (kind,))
+
+    if defer_indexes:
+        create_catalog_indexes(conn)
+    if search:
+        refresh_search_rows(conn, "SELECT id FROM temp.import_targets")
+        create_search_triggers(conn)
+    create_version_triggers(conn)
+
+    changed_ids = [pid for (pid,) in conn.execute("SELECT id FROM import_targets ORDER BY id")]
+    if changed_ids:
+        bump_catalog_version(conn)
+    return changed_ids
+
+
+EXPORT_SQL = """
+    SELECT p.name, p.description, p.interaction_level, p.education_level,
+           (SELECT json_group_array(name) FROM (
+                SELECT v.name FROM profession_categories l JOIN categories v ON v.id = l.category_id
+                WHERE l.profession_id = p.id ORDER BY l.id
+           )),
+           (SELECT json_group_array(name) FROM (
+                SELECT v.name FROM profession_requirements l JOIN requirements v ON v.id = l.requirement_id
+                WHERE l.profession_id = p.id ORDER BY l.id
+           ))
+    FROM professions p
+    ORDER BY p.id
+"""
+
+
+def export_catalog(db, path, fmt=None):
+    """Потоковая выгрузка каталога в CSV или JSONL в формате, который понимает import_catalog."""
+    fmt = detect_format(path, fmt)
+    count = 0
+    with db.pool.connection() as conn, open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+
+        for name, description, interaction_level, education_level, categories, requirements in conn.execute(EXPORT_SQL):
+            categories = [c for c in json.loads(categories) if c is not None]
+            requirements = [r for r in json.loads(requirements) if r is not None]
+            if writer is not None:
+                writer.writerow((name, description, interaction_level, education_level,
+                                 LIST_SEPARATOR.join(categories), LIST_SEPARATOR.join(requirements)))
+            else:
+                f.write(json.dumps({
+                    "name": name,
+                    "description": description,
+                    "interaction_level": interaction_level,
+                    "education_level": education_level,
+                    "categories": categories,
+                    "requirements": requirements,
+                }, ensure_ascii=False) + "\n")
+            count += 1
+    return count
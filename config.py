@@ -1,2 +1,30 @@
 database = "profession.db"
-token = " "
\ No newline at end of file
+token = " "
+use_memory_catalog = True
+write_behind = True
+sessions_database = None
+mode = "polling"
+webhook_url = ""
+webhook_listen = "127.0.0.1"
+webhook_port = 8443
+webhook_secret = ""
+workers = 8
+worker_queue_size = 1000
+db_workers = 4
+metrics_listen = "127.0.0.1"
+metrics_port = 0
+profile_slow_ms = 500
+log_format = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+send_rate = 30
+chat_send_rate = 1
+chat_send_burst = 3
+# сколько вызовов Telegram API идёт одновременно; вызовы одного чата всё равно уходят по очереди
+send_workers = 8
+catalog_snapshot = ""
+feedback_debounce_seconds = 10
+# пользователи и отзывы в отдельной базе; пусто — в одной базе с каталогом
+users_database = "users.db"
+# каталог не меняется, пока бот работает (обновляется заменой файла и перезапуском)
+catalog_immutable = False
+# раз в столько секунд бот сверяет версию каталога в базе и подхватывает изменения; 0 — не следить
+catalog_poll_seconds = 5
\ No newline at end of file
@@ -0,0 +1,605 @@
+import html
+import json
+
+from telebot import types
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from cache import RenderCache
+from metrics import track_cache, handled_error
+from fsm import INVALID, StateMachine, choice
+
+
+START_TEXT = (
+    "👋 <b>Привет!</b>\n\n"
+    "Я — <b>ПрофГайд Бот</b> 🤖✨\n"
+    "Помогу подобрать профессию, сменить карьеру или узнать о специальности.\n\n"
+    "<i>Давай познакомимся! Как тебя зовут?</i>"
+)
+
+HELP_TEXT = (
+    "📘 <b>Справка</b>\n\n"
+    "Вот что я умею:\n\n"
+    "🔹 <b>Пройти тест</b> — подберу профессии по интересам и стилю работы.\n"
+    "🔹 <b>Сменить профессию</b> — подскажу варианты при смене сферы и с учётом готовности учиться.\n"
+    "🔹 <b>Узнать про профессию</b> — покажу подробности (требования, образование, путь).\n"
+    "🔹 <b>Оставить отзыв</b> — скажи, подошла ли профессия.\n"
+    "🔹 <b>/search</b> — найду профессию по названию или ключевым словам.\n\n"
+    "Используй кнопки — так удобнее 😊"
+)
+
+FEEDBACK_THANKS = {
+    1: "🥰 Спасибо! Рад, что подсказал подходящую профессию.",
+    0: "Спасибо за отклик — попробуем подобрать другой вариант.",
+}
+
+
+MESSAGE_LIMIT = 4096
+
+
+def coalesce(replies):
+    """Склеивает подряд идущие сообщения в один чат, чтобы сэкономить вызовы API.
+
+    Сообщение присоединяется к следующему, если у него нет клавиатуры, а
+    остальные параметры (parse_mode и т.п.) совпадают: тексты идут через
+    пустую строку, клавиатура берётся от последнего.
+    """
+    merged = []
+    for chat_id, text, kwargs in replies:
+        if merged:
+            prev_chat_id, prev_text, prev_kwargs = merged[-1]
+            if (prev_chat_id == chat_id and prev_kwargs.get("reply_markup") is None
+                    and {k: v for k, v in prev_kwargs.items() if k != "reply_markup"}
+                    == {k: v for k, v in kwargs.items() if k != "reply_markup"}
+                    and len(prev_text) + 2 + len(text) <= MESSAGE_LIMIT):
+                merged[-1] = (chat_id, prev_text + "\n\n" + text, kwargs)
+                continue
+        merged.append((chat_id, text, kwargs))
+    return merged
+
+
+class Chat:
+    """Контекст одного апдейта: база и ответы в нужный чат.
+
+    Ответы копятся и уходят одной пачкой в flush(), где подряд идущие
+    сообщения склеиваются (см. coalesce).
+    """
+
+    def __init__(self, chat_id, db, send=None):
+        self.chat_id = chat_id
+        self.db = db
+        self.replies = []
+        self._send = send
+
+    def send(self, text, **kwargs):
+        self.replies.append((self.chat_id, text, kwargs))
+
+    def take(self):
+        replies, self.replies = coalesce(self.replies), []
+        return replies
+
+    def flush(self):
+        for chat_id, text, kwargs in self.take():
+            self._send(chat_id, text, **kwargs)
+
+
+def pretty_interaction(level: int) -> str:
+    """Человекочитаемое описание уровня общения (0-2)."""
+    if level == 0:
+        return "🟦 Низкая необходимость общения — работа преимущественно самостоятельная"
+    if level == 1:
+        return "🟩 Умеренный уровень общения — сочетание индивидуальной работы и командного взаимодействия"
+    if level == 2:
+        return "🟥 Высокий уровень общения — постоянная работа с людьми/клиентами"
+    return "—"
+
+def pretty_education(level: int) -> str:
+    """Человекочитаемое описание уровня образования (0-3)."""
+    mapping = {
+        0: "0 — Образование не требуется (самообучение, практика)",
+        1: "1 — Курсы / колледж / профессиональное обучение",
+        2: "2 — Университет (бакалавриат / магистратура)",
+        3: "3 — PhD / докторантура"
+    }
+    return mapping.get(level, "—")
+
+
+
+def make_reply_keyboard(button_texts, row_width=2, resize=True, one_time=True):
+    kb = types.ReplyKeyboardMarkup(row_width=row_width, resize_keyboard=resize, one_time_keyboard=one_time)
+    buttons = [types.KeyboardButton(text=t) for t in button_texts]
+    kb.add(*buttons)
+    return kb
+
+# клавиатуры и карточки хранятся уже сериализованными в JSON
+renders = RenderCache()
+track_cache("render", renders)
+
+def reply_keyboard(button_texts, row_width=2):
+    return renders.get(("reply", tuple(button_texts), row_width),
+                       lambda: make_reply_keyboard(button_texts, row_width=row_width).to_json())
+
+def start_menu_keyboard():
+    return reply_keyboard(["📘 Пройти тест", "🔁 Сменить профессию", "ℹ️ Про профессию"], row_width=1)
+
+# кнопки выбора категории и требования несут в callback_data только id из словаря
+CATEGORY_PREFIX = "cat"
+REQUIREMENT_PREFIX = "req"
+
+def choice_keyboard(prefix, options):
+    """Inline-клавиатура по кнопке в ряд для пар (id, название), callback_data — prefix:id."""
+    def build():
+        ikb = InlineKeyboardMarkup()
+        for option_id, name in options:
+            ikb.add(InlineKeyboardButton(text=name, callback_data=f"{prefix}:{option_id}"))
+        return ikb.to_json()
+    return renders.get(("choice", prefix, tuple(options)), build)
+
+
+
+def escape_html(text):
+    """Экранирует &, < и >, чтобы данные из базы не ломали HTML-разметку.
+
+    В отличие от старого Markdown, HTML у Telegram допускает экранирование и
+    внутри <b> и <i>, так что «*», «_» и «`» в названиях ничего не ломают.
+    """
+    return html.escape("" if text is None else str(text), quote=False)
+
+def profession_card(prof):
+    inter_text = pretty_interaction(prof.get("interaction_level"))
+    edu_text = pretty_education(prof.get("education_level"))
+    categories = ", ".join(escape_html(c) for c in prof.get("categories", []))
+    requirements = ", ".join(escape_html(r) for r in prof.get("requirements", []))
+
+    return (f"🎯 <b>{escape_html(prof['name'])}</b>\n\n"
+            f"{escape_html(prof['description'])}\n\n"
+            f"📂 <b>Категории:</b> {categories}\n"
+            f"📌 <b>Требования:</b> {requirements}\n\n"
+            f"🗣 <b>Уровень общения:</b> {inter_text}\n"
+            f"🎓 <b>Образование:</b> {edu_text}\n\n"
+            "Хотите оставить отзыв по этой профессии?")
+
+def feedback_keyboard(pid):
+    def build():
+        ikb = InlineKeyboardMarkup()
+        ikb.add(InlineKeyboardButton("👍 Подходит", callback_data=f"fb_yes:{pid}"),
+                InlineKeyboardButton("👎 Не подходит", callback_data=f"fb_no:{pid}"))
+        return ikb.to_json()
+    return renders.get(("feedback", pid), build)
+
+def render_card(db, pid):
+    """HTML-текст карточки и JSON клавиатуры отзыва, либо None, если профессии нет."""
+    def build():
+        prof = db.get_profession_details(pid)
+        if not prof:
+            return None
+        return profession_card(prof), feedback_keyboard(pid)
+    return renders.render(db.catalog_version, ("card", pid), build)
+
+
+
+PAGE_SIZE = 5
+DESCRIPTION_LIMIT = 300
+
+
+def _shorten(text, limit=DESCRIPTION_LIMIT):
+    text = text or ""
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+def page_nav(search_id, offset, has_next):
+    """Кнопки «Назад»/«Далее»: в callback_data — номер поиска и смещение нужной страницы."""
+    nav = []
+    if offset > 0:
+        nav.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"page:{search_id}:p:{max(offset - PAGE_SIZE, 0)}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"page:{search_id}:n:{offset + PAGE_SIZE}"))
+    return nav
+
+def professions_page(db, filters, search_id=0, offset=0, age=None):
+    """Одна страница результатов: HTML-текст и JSON клавиатуры, либо None.
+
+    Профессии идут по отзывам (оценка Уилсона в возрастной группе age),
+    поэтому листание, как у поиска, идёт по смещению. Строк читается не
+    больше PAGE_SIZE + 1 — лишняя показывает, есть ли страница дальше.
+    """
+    rows = db.find_professions(**filters, order_by_feedback=True, age=age, limit=PAGE_SIZE + 1, offset=offset)
+    has_next = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    if not rows:
+        return None
+    return render_professions("Найденные профессии:", rows, page_nav(search_id, offset, has_next))
+
+def render_professions(title, rows, nav=()):
+    lines = []
+    ikb = InlineKeyboardMarkup()
+    for pid, name, desc in rows:
+        lines.append(f"🔹 <b>{escape_html(name)}</b>\n<i>{escape_html(_shorten(desc))}</i>")
+
+        btn_view = InlineKeyboardButton(text="Подробнее", callback_data=f"viewprof:{pid}")
+        btn_rate = InlineKeyboardButton(text="Оценить", callback_data=f"rate:{pid}")
+        ikb.add(btn_view, btn_rate)
+
+    if nav:
+        ikb.row(*nav)
+
+    text = title + "\n\n" + "\n\n".join(lines)
+    return text, ikb.to_json()
+
+def remember_search(state, search):
+    """Запоминает фильтры или запрос в сессии: в callback_data кнопок листания — только номер и смещение."""
+    state.search = json.dumps(search, ensure_ascii=False)
+    state.search_id = (state.search_id or 0) + 1
+
+def send_professions_list(ctx, state, **filters):
+    remember_search(state, filters)
+    page = professions_page(ctx.db, filters, state.search_id, age=state.age)
+    if page is None:
+        # точных совпадений нет — предлагаем ближайшие по ранжированию
+        try:
+            rows = ctx.db.rank_professions(**filters, k=PAGE_SIZE)
+        except Exception as e:
+            handled_error("rank_professions", e)
+            rows = []
+        if not rows:
+            ctx.send("Ничего не найдено по вашим критериям.")
+            return
+        page = render_professions("Точных совпадений нет, но вот самые близкие варианты:", rows)
+
+    text, ikb = page
+    ctx.send(text, parse_mode="HTML", reply_markup=ikb)
+
+def send_nearby_professions(ctx, state):
+    """При переходе в другую сферу — её профессии, ближе всего к нынешней (по графу похожих профессий)."""
+    if state.wants_to_stay or state.current_field is None:
+        return
+    try:
+        rows = ctx.db.nearby_professions(state.current_field, state.target_field,
+                                         education_max=_edu_max(state), k=PAGE_SIZE)
+    except Exception as e:
+        handled_error("nearby_professions", e)
+        return
+    if rows:
+        text, ikb = render_professions("Ближе всего к тому, чем ты занимаешься сейчас:", rows)
+        ctx.send(text, parse_mode="HTML", reply_markup=ikb)
+
+def search_page(db, text, search_id=0, offset=0):
+    """Страница результатов /search: HTML-текст и JSON клавиатуры, либо None.
+
+    Результаты упорядочены по релевантности, поэтому листание идёт по
+    смещению: в callback_data кнопок — смещение нужной страницы.
+    """
+    rows, fuzzy = db.search_professions(text, limit=PAGE_SIZE + 1, offset=offset)
+    has_next = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    if not rows:
+        return None
+
+    title = "Точных совпадений нет, возможно, вы имели в виду:" if fuzzy else "Результаты поиска:"
+    return render_professions(title, rows, page_nav(search_id, offset, has_next))
+
+def send_search_results(ctx, state, text):
+    remember_search(state, {"query": text})
+
+    try:
+        page = search_page(ctx.db, text, state.search_id)
+    except Exception as e:
+        handled_error("search_professions", e)
+        page = None
+    if page is None:
+        ctx.send("По запросу ничего не найдено. Попробуй другие слова.", reply_markup=start_menu_keyboard())
+        return
+
+    page_text, ikb = page
+    ctx.send(page_text, parse_mode="HTML", reply_markup=ikb)
+
+def start_search(ctx, state, text):
+    """Команда /search: с текстом сразу ищет, без текста — спрашивает, что искать."""
+    if state.stage in ("awaiting_name", "awaiting_age"):
+        ctx.send("Сначала давай познакомимся 🙂")
+        return
+    if text:
+        send_search_results(ctx, state, text)
+        state.stage = "menu"
+        return
+    ctx.send("Что ищем? Напиши название профессии или ключевые слова.")
+    state.stage = "search_query"
+
+FILTERS = frozenset(("interaction_level", "category_id", "requirement_id", "education_max"))
+
+def turn_page(db, state, data):
+    """Страница для кнопки «Назад»/«Далее» или None, если список устарел."""
+    try:
+        _, search_id, _, offset = data.split(":")
+        search_id, offset = int(search_id), max(int(offset), 0)
+    except ValueError:
+        return None
+    if state is None or not state.search or state.search_id != search_id:
+        return None
+
+    filters = json.loads(state.search)
+    if "query" in filters:
+        return search_page(db, filters["query"], search_id, offset=offset)
+    if not FILTERS.issuperset(filters):
+        return None
+    return professions_page(db, filters, search_id, offset=offset, age=state.age)
+
+
+
+def _categories(ctx):
+    try:
+        return ctx.db.get_all_categories()
+    except Exception as e:
+        handled_error("get_all_categories", e)
+        return []
+
+def _requirements(ctx, category_id):
+    try:
+        return ctx.db.get_all_requirements(category_id)
+    except Exception as e:
+        handled_error("get_all_requirements", e)
+        return []
+
+def _edu_max(state):
+    return 1 if not state.ready else None
+
+def _change_category(state):
+    return state.current_field if state.wants_to_stay else state.target_field
+
+
+def _choice_id(prefix, data):
+    """id из callback_data кнопки выбора (prefix:id) или None для любого другого ввода."""
+    kind, _, value = data.partition(":")
+    return int(value) if kind == prefix and value.isdigit() else None
+
+def valid_category(ctx, state, data):
+    category_id = _choice_id(CATEGORY_PREFIX, data)
+    try:
+        return category_id if category_id is not None and ctx.db.has_category(category_id) else INVALID
+    except Exception:
+        return INVALID
+
+def valid_requirement(category_of):
+    def validate(ctx, state, data):
+        requirement_id = _choice_id(REQUIREMENT_PREFIX, data)
+        try:
+            if requirement_id is not None and ctx.db.has_requirement(category_of(state), requirement_id):
+                return requirement_id
+            return INVALID
+        except Exception:
+            return INVALID
+    return validate
+
+def valid_name(ctx, state, text):
+    return text or INVALID
+
+def valid_age(ctx, state, text):
+    try:
+        return int(text)
+    except Exception:
+        return INVALID
+
+
+YES_NO = choice({"Да": True, "Нет": False})
+
+
+def fallback(ctx, state, text):
+    ctx.send("Не понял. Выбери действие:", reply_markup=start_menu_keyboard())
+    return "menu"
+
+
+machine = StateMachine(fallback)
+
+
+@machine.stage("awaiting_name", valid_name, "Напиши, пожалуйста, своё имя (текстом).",
+               transitions=["awaiting_age"])
+def on_name(ctx, state, name):
+    state.name = name
+    ctx.send(f"Приятно познакомиться, {name}! Сколько тебе лет?")
+    return "awaiting_age"
+
+
+@machine.stage("awaiting_age", valid_age, "Пожалуйста, введи возраст числом (например: 16).",
+               transitions=["menu"])
+def on_age(ctx, state, age):
+    state.age = age
+
+    try:
+        ctx.db.add_user(state.user_id, state.name, age)
+    except Exception as e:
+        handled_error("add_user", e)
+
+    ctx.send("Отлично! Чем хочешь заняться?", reply_markup=start_menu_keyboard())
+    return "menu"
+
+
+@machine.stage("menu", transitions=["test_interaction", "change_current_field", "info_choose_category"])
+def on_menu(ctx, state, text):
+    if text == "📘 Пройти тест":
+        kb = reply_keyboard(["Нравится", "Нейтрально", "Не люблю"], row_width=1)
+        ctx.send("Как ты относишься к общению с людьми?", reply_markup=kb)
+        return "test_interaction"
+
+    if text == "🔁 Сменить профессию":
+        categories = _categories(ctx)
+        if not categories:
+            ctx.send("В базе пока нет категорий.")
+            return None
+        kb = choice_keyboard(CATEGORY_PREFIX, categories)
+        ctx.send("В какой сфере ты сейчас работаешь? (выбери категорию)", reply_markup=kb)
+        return "change_current_field"
+
+    if text == "ℹ️ Про профессию":
+        categories = _categories(ctx)
+        if not categories:
+            ctx.send("В базе пока нет категорий.")
+            return None
+        kb = choice_keyboard(CATEGORY_PREFIX, categories)
+        ctx.send("Выбери категорию, чтобы посмотреть профессии:", reply_markup=kb)
+        return "info_choose_category"
+
+    ctx.send("Выбери опцию из меню:", reply_markup=start_menu_keyboard())
+    return None
+
+
+
+@machine.stage("search_query", transitions=["menu"])
+def on_search_query(ctx, state, text):
+    if not text:
+        ctx.send("Напиши, что искать (текстом).")
+        return None
+    send_search_results(ctx, state, text)
+    return "menu"
+
+
+
+@machine.stage("test_interaction", choice({"не люблю": 0, "нейтрально": 1, "нравится": 2}, key=str.lower),
+               "Пожалуйста, выбери один из вариантов кнопками.",
+               transitions=["test_category", "menu"])
+def on_test_interaction(ctx, state, level):
+    state.interaction_level = level
+
+    categories = _categories(ctx)
+    if not categories:
+        ctx.send("В базе пока нет категорий.")
+        return "menu"
+
+    kb = choice_keyboard(CATEGORY_PREFIX, categories)
+    ctx.send("Выбери категорию, которая тебе нравится:", reply_markup=kb)
+    return "test_category"
+
+
+@machine.stage("test_category", valid_category, "Пожалуйста, выбери категорию кнопкой.",
+               transitions=["test_requirement", "menu"])
+def on_test_category(ctx, state, category_id):
+    state.category = category_id
+
+    reqs = _requirements(ctx, category_id)
+    if not reqs:
+        send_professions_list(ctx, state, interaction_level=state.interaction_level, category_id=category_id)
+        ctx.send("Готово — вернулись в меню.", reply_markup=start_menu_keyboard())
+        return "menu"
+
+    kb = choice_keyboard(REQUIREMENT_PREFIX, reqs)
+    ctx.send("Выбери навык/требование, которое тебе ближе:", reply_markup=kb)
+    return "test_requirement"
+
+
+@machine.stage("test_requirement", valid_requirement(lambda state: state.category),
+               "Пожалуйста, выбери требование кнопкой.", transitions=["menu"])
+def on_test_requirement(ctx, state, requirement_id):
+    send_professions_list(ctx, state, interaction_level=state.interaction_level,
+                          category_id=state.category, requirement_id=requirement_id)
+
+    ctx.send("Хотите что-то ещё?", reply_markup=start_menu_keyboard())
+    return "menu"
+
+
+
+@machine.stage("change_current_field", valid_category, "Пожалуйста, выбери категорию кнопкой.",
+               transitions=["change_wants_to_stay"])
+def on_change_current_field(ctx, state, category_id):
+    state.current_field = category_id
+    kb = reply_keyboard(["Да", "Нет"])
+    ctx.send(f"Хочешь остаться в сфере '{ctx.db.category_name(category_id)}'?", reply_markup=kb)
+    return "change_wants_to_stay"
+
+
+@machine.stage("change_wants_to_stay", YES_NO, "Выбери кнопкой.", transitions=["change_ready_to_study"])
+def on_change_wants_to_stay(ctx, state, wants_to_stay):
+    state.wants_to_stay = wants_to_stay
+    kb = reply_keyboard(["Да", "Нет"])
+    ctx.send("Готов(а) получать новое образование (например, курсы/колледж/университет)?", reply_markup=kb)
+    return "change_ready_to_study"
+
+
+@machine.stage("change_ready_to_study", YES_NO, "Выбери кнопкой.",
+               transitions=["change_target_category", "change_choose_requirement", "menu"])
+def on_change_ready_to_study(ctx, state, ready):
+    state.ready = ready
+
+    if not state.wants_to_stay:
+        categories = _categories(ctx)
+        if not categories:
+            ctx.send("В базе нет категорий.")
+            return "menu"
+        kb = choice_keyboard(CATEGORY_PREFIX, categories)
+        ctx.send("В какую сферу хочешь перейти? (выбери категорию)", reply_markup=kb)
+        return "change_target_category"
+
+    category_id = state.current_field
+    reqs = _requirements(ctx, category_id)
+
+    if not reqs:
+        send_professions_list(ctx, state, category_id=category_id, education_max=_edu_max(state))
+        ctx.send("Готово — вернулись в меню.", reply_markup=start_menu_keyboard())
+        return "menu"
+
+    kb = choice_keyboard(REQUIREMENT_PREFIX, reqs)
+    ctx.send("Выбери требование/навык:", reply_markup=kb)
+    return "change_choose_requirement"
+
+
+@machine.stage("change_target_category", valid_category, "Выбери категорию кнопкой.",
+               transitions=["change_choose_requirement", "menu"])
+def on_change_target_category(ctx, state, category_id):
+    state.target_field = category_id
+    reqs = _requirements(ctx, category_id)
+
+    if not reqs:
+        send_professions_list(ctx, state, category_id=category_id, education_max=_edu_max(state))
+        send_nearby_professions(ctx, state)
+        ctx.send("Готово — возвращаемся в меню.", reply_markup=start_menu_keyboard())
+        return "menu"
+
+    kb = choice_keyboard(REQUIREMENT_PREFIX, reqs)
+    ctx.send("Выбери требование:", reply_markup=kb)
+    return "change_choose_requirement"
+
+
+@machine.stage("change_choose_requirement", valid_requirement(_change_category),
+               "Выбери требование кнопкой.", transitions=["menu"])
+def on_change_choose_requirement(ctx, state, requirement_id):
+    send_professions_list(ctx, state, category_id=_change_category(state), requirement_id=requirement_id,
+                          education_max=_edu_max(state))
+    send_nearby_professions(ctx, state)
+
+    ctx.send("Готово! Вернулись в меню.", reply_markup=start_menu_keyboard())
+    return "menu"
+
+
+
+@machine.stage("info_choose_category", valid_category, "Пожалуйста, выбери категорию кнопкой.",
+               transitions=["menu"])
+def on_info_choose_category(ctx, state, category_id):
+    # большая категория не даёт клавиатуры на сотни кнопок: те же страницы, что у подбора и поиска
+    filters = {"category_id": category_id}
+    remember_search(state, filters)
+    page = professions_page(ctx.db, filters, state.search_id, age=state.age)
+    if page is None:
+        ctx.send("В этой категории пока нет профессий.")
+        ctx.send("Вернуться в меню?", reply_markup=start_menu_keyboard())
+        return "menu"
+
+    text, ikb = page
+    ctx.send(text, parse_mode="HTML", reply_markup=ikb)
+    return "menu"
+
+
+machine.compile()
+
+
+# этапы, которые ждут нажатия кнопки выбора, и префикс callback_data этих кнопок
+CHOICE_STAGES = {
+    "test_category": CATEGORY_PREFIX,
+    "change_current_field": CATEGORY_PREFIX,
+    "change_target_category": CATEGORY_PREFIX,
+    "info_choose_category": CATEGORY_PREFIX,
+    "test_requirement": REQUIREMENT_PREFIX,
+    "change_choose_requirement": REQUIREMENT_PREFIX,
+}
+
+
+def choose(ctx, state, data):
+    """Нажатие кнопки выбора категории или требования; False, если текущий этап его не ждёт."""
+    if state is None or CHOICE_STAGES.get(state.stage) != data.partition(":")[0]:
+        return False
+    machine.dispatch(ctx, state, data)
+    return True
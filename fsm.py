@@ -0,0 +1,80 @@
+import time
+
+from metrics import STAGE_SECONDS
+
+
+INVALID = object()
+
+
+class Stage:
+    __slots__ = ("name", "handler", "validator", "error_text", "transitions")
+
+    def __init__(self, name, handler, validator=None, error_text=None, transitions=()):
+        self.name = name
+        self.handler = handler
+        self.validator = validator
+        self.error_text = error_text
+        self.transitions = frozenset(transitions)
+
+
+class StateMachine:
+    """Таблица этапов диалога: имя этапа → обработчик, проверка ввода и переходы.
+
+    Обработчик получает (ctx, state, value), где value — результат
+    валидатора, и возвращает имя следующего этапа или None, чтобы остаться
+    на текущем. Если валидатор вернул INVALID, пользователю отправляется
+    error_text, а обработчик не вызывается.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.stages = {}
+
+    def stage(self, name, validator=None, error_text=None, transitions=()):
+        def decorator(handler):
+            self.stages[name] = Stage(name, handler, validator, error_text, transitions)
+            return handler
+        return decorator
+
+    def compile(self):
+        """Проверяет, что все объявленные переходы ведут в существующие этапы."""
+        for stage in self.stages.values():
+            unknown = stage.transitions - self.stages.keys()
+            if unknown:
+                raise ValueError(f"stage {stage.name!r} has unknown transitions: {sorted(unknown)}")
+        return self
+
+    def dispatch(self, ctx, state, text):
+        label = state.stage if state.stage in self.stages else "fallback"
+        started = time.perf_counter()
+        try:
+            self._dispatch(ctx, state, text)
+        finally:
+            STAGE_SECONDS.observe(label, time.perf_counter() - started)
+
+    def _dispatch(self, ctx, state, text):
+        stage = self.stages.get(state.stage)
+        if stage is None:
+            state.stage = self.fallback(ctx, state, text)
+            return
+
+        value = text
+        if stage.validator is not None:
+            value = stage.validator(ctx, state, text)
+            if value is INVALID:
+                ctx.send(stage.error_text)
+                return
+
+        next_stage = stage.handler(ctx, state, value)
+        if next_stage is None:
+            return
+        if next_stage not in stage.transitions:
+            raise ValueError(f"stage {stage.name!r} cannot move to {next_stage!r}")
+        state.stage = next_stage
+
+
+def choice(mapping, key=None):
+    """Валидатор для фиксированного набора кнопок: текст → значение."""
+    def validate(ctx, state, text):
+        return mapping.get(key(text) if key else text, INVALID)
+    return validate
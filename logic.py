@@ -1,16 +1,495 @@
+import logging
+import math
+import os
+import queue
+import re
 import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import quote
 from config import database
+from catalog import Catalog
+from snapshot import CatalogSnapshot, write_snapshot
+import neighbors
+from answers import AnswerTable
+from cache import TTLCache, make_vocabulary
+from migrations import (apply_migrations, user_migrations, has_search_index, get_catalog_version, age_band,
+                        SEARCH_TABLES, SEARCH_PREFIX_LENGTHS, FEEDBACK_STATS_SQL, FEEDBACK_AGE_STATS_SQL, FEEDBACK_UPSERT_SQL)
+from writer import WriteBehindWriter
+from metrics import timed, track_cache, db_error, QUEUE_DEPTH
+from ranking import Ranker, np
+
+
+log = logging.getLogger(__name__)
+
+
+def wilson_lower_bound(likes, dislikes, z=1.96):
+    """Нижняя граница доверительного интервала Уилсона для доли лайков."""
+    n = (likes or 0) + (dislikes or 0)
+    if n == 0:
+        return 0.0
+    p = likes / n
+    return (p + z * z / (2 * n) - z * math.sqrt((p * (1 - p) + z * z / (4 * n)) / n)) / (1 + z * z / n)
+
+
+def _search_words(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def fts_query(text):
+    """Запрос FTS5 из пользовательского текста: все слова, каждое — как префикс.
+
+    Окончание длинных слов отрезается, чтобы «программисты» находило
+    «программист», а «врачи» — «врач»; числа остаются как есть. Префикс слова
+    не длиннее самого длинного префиксного индекса, а однобуквенные слова,
+    которые совпадают почти со всем каталогом, пропускаются.
+    """
+    terms = []
+    for word in _search_words(text):
+        if len(word) < min(SEARCH_PREFIX_LENGTHS):
+            continue
+        if word.isalpha():
+            if len(word) >= 6:
+                word = word[:-2]
+            elif len(word) == 5:
+                word = word[:-1]
+            word = word[:max(SEARCH_PREFIX_LENGTHS)]
+        terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def trigram_query(text):
+    """Нечёткий запрос к триграммному индексу: любые триграммы слов запроса.
+
+    Чем больше триграмм совпало, тем выше bm25, поэтому слово с опечаткой
+    всё равно находит нужную профессию первой.
+    """
+    grams = []
+    for word in _search_words(text):
+        for i in range(len(word) - 2):
+            gram = f'"{word[i:i + 3]}"'
+            if gram not in grams:
+                grams.append(gram)
+    if not grams:
+        return ""
+    return " OR ".join(grams)
+
+
+# всё, что построено из одного состояния каталога: version — номер для кэшей
+# процесса, revision — значение catalog_version в базе, из которой всё прочитано
+CatalogView = namedtuple("CatalogView", ["version", "revision", "catalog", "answers"])
+
+
+class ConnectionPool:
+    """Ограниченный пул долгоживущих соединений с SQLite.
+
+    readonly=True открывает базу по URI с mode=ro: такие соединения не
+    пишут и не берут блокировок записи, а страницы каталога читают через
+    большое mmap-окно. immutable=True к тому же говорит SQLite, что файл
+    не меняется, и снимает даже разделяемые блокировки — годится, только
+    если каталог не пишут, пока бот работает.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-16000",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    READONLY_PRAGMAS = (
+        "PRAGMA query_only=1",
+        "PRAGMA cache_size=-16000",
+        "PRAGMA mmap_size=2147418112",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    def __init__(self, database, size=8, cached_statements=256, readonly=False, immutable=False):
+        self.database = database
+        self.size = size
+        self.cached_statements = cached_statements
+        self.readonly = readonly
+        self.immutable = immutable
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open(self):
+        if self.readonly:
+            uri = "file:" + quote(self.database) + "?mode=ro" + ("&immutable=1" if self.immutable else "")
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.cached_statements)
+            pragmas = self.READONLY_PRAGMAS
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+            pragmas = self.PRAGMAS
+        for pragma in pragmas:
+            conn.execute(pragma)
+        conn.create_function("wilson", 2, wilson_lower_bound, deterministic=True)
+        return conn
+
+    def acquire(self, timeout=None):
+        if self._closed:
+            raise sqlite3.ProgrammingError("connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._open()
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("connection pool exhausted")
+
+    def release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
 
 
 class DB_Manager:
-    def __init__(self, database):
+    """Доступ к каталогу профессий и к данным пользователей.
+
+    Каталог читается только через pool — read-only соединения, которые не
+    ждут чужих транзакций записи. Пишут в каталог лишь миграции, импорт и
+    граф соседей, через небольшой write_pool. Пользователи и отзывы живут в
+    users_pool: по умолчанию в том же файле, а с users_database — в
+    отдельной базе со своим WAL, так что поток записей отзывов не задевает
+    чтение каталога.
+
+    Каталог в памяти, таблица ответов и их версия лежат в одном CatalogView
+    и подменяются одним присваиванием. С catalog_poll фоновый поток раз в
+    столько секунд сверяет catalog_version в базе и, если она изменилась,
+    строит всё заново рядом со старым, а обработчики до подмены читают
+    прежнюю версию. Со snapshot поток следит не за базой, а за файлом
+    снимка: его пишет процесс, изменивший каталог.
+    """
+
+    def __init__(self, database, pool_size=8, use_catalog=False, cache_size=512, cache_ttl=300,
+                 write_behind=False, snapshot=None, users_database=None, immutable=False, catalog_poll=None,
+                 warm_answers=False):
         self.database = database
+        self.users_database = users_database or database
+        self.snapshot = snapshot
+        self.write_pool = ConnectionPool(database, size=2)
+        self.pool = ConnectionPool(database, size=pool_size, readonly=True, immutable=immutable)
+        self.users_pool = ConnectionPool(self.users_database, size=pool_size)
+        self.vocabulary_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._view = CatalogView(0, None, None, None)
+        self._view_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.ranker = None
+        self._ranker_lock = threading.Lock()
+        self._answers_lock = threading.Lock()
+        self._answers_memo = None
         self.create_tables()
+        self.migrate()
+        if immutable:
+            # immutable-соединения не читают WAL, поэтому всё должно быть в основном файле
+            with self.write_pool.connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if snapshot:
+            self.load_snapshot()
+        elif use_catalog:
+            self.reload_catalog()
+        if self.catalog is None:
+            with self.pool.connection() as conn:
+                self._publish(revision=get_catalog_version(conn), bump=False)
+        self.writer = WriteBehindWriter(self.users_pool) if write_behind else None
+
+        track_cache("vocabulary", self.vocabulary_cache)
+        if self.writer is not None:
+            QUEUE_DEPTH.track("db_writer", self.writer.qsize)
+
+        self._poll_stop = threading.Event()
+        self._poller = None
+        # immutable-соединения чужих записей не видят, следить не за чем
+        if catalog_poll and not immutable:
+            self._poller = threading.Thread(target=self._poll, args=(catalog_poll,), name="catalog-poll",
+                                            daemon=True)
+            self._poller.start()
+
+        # таблица ответов строится при первом запросе; с warm_answers — сразу в фоне, и старт её не ждёт
+        self._warmer = None
+        if warm_answers:
+            self._warmer = threading.Thread(target=self._warm_answers, name="answers-warmup", daemon=True)
+            self._warmer.start()
+
+    def close(self):
+        self._poll_stop.set()
+        if self._poller is not None:
+            self._poller.join()
+        if self._warmer is not None:
+            self._warmer.join()
+        if self.writer is not None:
+            self.writer.close()
+        self.pool.close()
+        self.write_pool.close()
+        self.users_pool.close()
+
+    def _write(self, *statements):
+        """Записывает пары (sql, params) одной транзакцией (или через writer)."""
+        if self.writer is not None:
+            self.writer.submit(statements)
+            return
+        with self.users_pool.connection() as conn, conn:
+            conn.execute("BEGIN")
+            for sql, params in statements:
+                conn.execute(sql, params)
+
+    @property
+    def catalog(self):
+        return self._view.catalog
+
+    @property
+    def answers(self):
+        return self._view.answers
+
+    @property
+    def catalog_version(self):
+        return self._view.version
+
+    @property
+    def catalog_revision(self):
+        return self._view.revision
+
+    def _publish(self, bump=True, **changes):
+        """Подменяет части CatalogView; с bump — под новым номером версии и со сбросом кэшей."""
+        with self._view_lock:
+            view = self._view._replace(**changes)
+            if bump:
+                view = view._replace(version=view.version + 1)
+            self._view = view
+        if bump:
+            self.vocabulary_cache.invalidate()
+        return view
+
+    def _load_catalog(self):
+        """Каталог и его версию в базе, прочитанные в одной транзакции — без чужих записей посередине."""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            revision = get_catalog_version(conn)
+            catalog = Catalog.load(conn)
+        return catalog, revision
+
+    def _build_catalog(self):
+        # снимок пишет только процесс, который сам меняет каталог (импорт, invalidate_catalog) или
+        # не нашёл его при старте; остальные лишь переоткрывают файл в refresh_snapshot
+        catalog, revision = self._load_catalog()
+        if self.snapshot:
+            write_snapshot(catalog, self.snapshot, revision)
+            catalog = CatalogSnapshot(self.snapshot)
+        return catalog, revision
+
+    @timed
+    def reload_catalog(self):
+        catalog, revision = self._build_catalog()
+        self._publish(catalog=catalog, revision=revision)
+
+    @timed
+    def load_snapshot(self):
+        """Открывает бинарный снимок каталога; если его ещё нет, строит из базы."""
+        if not os.path.exists(self.snapshot):
+            self.reload_catalog()
+            return
+        try:
+            catalog = CatalogSnapshot(self.snapshot)
+            self._publish(catalog=catalog, revision=catalog.revision)
+        except ValueError as e:
+            db_error("load_snapshot", e)
+            self.reload_catalog()
+
+    @timed
+    def refresh_snapshot(self):
+        """Переоткрывает снимок, если его файл заменил другой процесс. Возвращает True, если заменил."""
+        try:
+            stat = os.stat(self.snapshot)
+        except OSError:
+            return False
+        with self._reload_lock:
+            current = self.catalog.stat
+            if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (current.st_ino, current.st_mtime_ns,
+                                                                  current.st_size):
+                return False
+
+            catalog = CatalogSnapshot(self.snapshot)
+            answers = AnswerTable.from_catalog(catalog) if self.answers is not None else None
+            self._publish(catalog=catalog, answers=answers, revision=catalog.revision)
+            with self._ranker_lock:
+                self.ranker = None
+        return True
+
+    @timed
+    def check_catalog(self):
+        """Сверяет catalog_version в базе с прочитанной; при расхождении перестраивает каталог.
+
+        Новый каталог, таблица ответов и ранжировщик строятся рядом со
+        старыми и подменяются, только когда готовы целиком. Со снимком база
+        не перечитывается: снимок переоткрывается, если файл заменили.
+        Граф похожих профессий не трогает — его обновляет invalidate_catalog
+        в пишущем процессе или build-neighbors. Возвращает True, если каталог
+        был перестроен.
+        """
+        if self.snapshot:
+            return self.refresh_snapshot()
+        with self.pool.connection() as conn:
+            revision = get_catalog_version(conn)
+        if revision == self.catalog_revision:
+            return False
+
+        with self._reload_lock:
+            source, changes = self._rebuild_view(with_ranker=True)
+            if changes["revision"] == self.catalog_revision:
+                return False
+            ranker = Ranker.from_catalog(source) if source is not None and self.ranker is not None else None
+            self._publish(**changes)
+            with self._ranker_lock:
+                self.ranker = ranker
+        return True
+
+    def _rebuild_view(self, with_ranker=False):
+        """Новые каталог, таблица ответов и версия для _publish, а также каталог, из которого они построены.
+
+        Каталог в памяти (или снимок) пересобирается, только если он
+        используется; без него каталог читается из базы лишь для таблицы
+        ответов или ранжировщика.
+        """
+        if self.catalog is not None:
+            catalog, revision = self._build_catalog()
+            source = catalog
+        elif self.answers is not None or with_ranker and self.ranker is not None:
+            catalog = None
+            source, revision = self._load_catalog()
+        else:
+            catalog = source = None
+            with self.pool.connection() as conn:
+                revision = get_catalog_version(conn)
+        answers = AnswerTable.from_catalog(source) if self.answers is not None else None
+        return source, {"catalog": catalog, "answers": answers, "revision": revision}
+
+    def _poll(self, interval):
+        while not self._poll_stop.wait(interval):
+            try:
+                self.check_catalog()
+            except Exception as e:
+                # check_catalog сам учтён в DB_ERRORS через timed
+                log.warning("catalog reload failed: %s", e, exc_info=e)
+
+    @timed
+    def invalidate_catalog(self, changed_ids=None):
+        """Вызывается после любой записи в таблицы каталога.
+
+        Если известны id изменённых профессий, ранжировщик и граф похожих
+        профессий обновляют только их строки, иначе ранжировщик будет
+        пересобран при следующем запросе, а граф перестраивается сразу.
+        """
+        with self._reload_lock:
+            _, changes = self._rebuild_view()
+            self._publish(**changes)
+            self._update_neighbors(changed_ids)
+
+            with self._ranker_lock:
+                if self.ranker is None:
+                    return
+                if changed_ids is None:
+                    self.ranker = None
+                    return
+                for pid in changed_ids:
+                    prof = self.get_profession_details(pid)
+                    if prof is None:
+                        self.ranker.remove(pid)
+                    else:
+                        self.ranker.upsert(pid, prof["interaction_level"], prof["education_level"],
+                                           prof["category_ids"], prof["requirement_ids"])
+
+    def _update_neighbors(self, changed_ids):
+        if changed_ids is None:
+            self.rebuild_neighbors()
+            return
+        with self.write_pool.connection() as conn:
+            catalog = self.catalog if isinstance(self.catalog, Catalog) else Catalog.load(conn)
+            with conn:
+                conn.execute("BEGIN")
+                neighbors.update_neighbors(conn, catalog, changed_ids)
+
+    @timed
+    def rebuild_neighbors(self, k=neighbors.K):
+        """Перестраивает граф похожих профессий с нуля; возвращает число рёбер."""
+        with self.write_pool.connection() as conn:
+            catalog = self.catalog if isinstance(self.catalog, Catalog) else Catalog.load(conn)
+            with conn:
+                conn.execute("BEGIN")
+                return neighbors.rebuild_neighbors(conn, catalog, k)
+
+    @timed
+    def rebuild_answers(self):
+        """Заново строит таблицу ответов воронки (см. AnswerTable) и возвращает её."""
+        with self._answers_lock:
+            return self._build_answers()
+
+    def _warm_answers(self):
+        try:
+            self._get_answers()
+        except Exception as e:
+            db_error("warm_answers", e)
+
+    def _get_answers(self):
+        with self._answers_lock:
+            answers = self.answers
+            return answers if answers is not None else self._build_answers()
+
+    def _build_answers(self):
+        # таблица ставится в CatalogView, только если каталог за время сборки не сменился
+        view = self._view
+        if view.catalog is not None:
+            revision = view.revision
+            answers = AnswerTable.from_catalog(view.catalog)
+        else:
+            # без каталога в памяти таблица запоминается вместе с версией базы: пока опрос не опубликовал
+            # эту версию, таблица в CatalogView не попадает, но и заново для каждого запроса не строится
+            with self.pool.connection() as conn:
+                revision = get_catalog_version(conn)
+            if self._answers_memo is not None and self._answers_memo[0] == revision:
+                answers = self._answers_memo[1]
+            else:
+                catalog, revision = self._load_catalog()
+                answers = AnswerTable.from_catalog(catalog)
+                self._answers_memo = (revision, answers)
+        with self._view_lock:
+            current = self._view
+            if current.catalog is view.catalog and current.revision == revision:
+                self._view = current._replace(answers=answers)
+        return answers
 
-    
     def create_tables(self):
-        conn = sqlite3.connect(self.database)
-        with conn:
+        with self.write_pool.connection() as conn, conn:
             cur = conn.cursor()
 
             cur.execute("""
@@ -58,82 +537,184 @@ class DB_Manager:
                 );
             """)
 
+    def migrate(self):
+        with self.write_pool.connection() as conn:
+            applied = apply_migrations(conn)
+            self.has_search_index = has_search_index(conn)
+        if self.users_database != self.database:
+            with self.users_pool.connection() as conn:
+                apply_migrations(conn, user_migrations(self.database))
+        return applied
+
+    @timed
     def get_all_categories(self):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT DISTINCT category
-            FROM profession_categories
-            ORDER BY category
-        """)
-        return [row[0] for row in cur.fetchall()]
-
-    def get_all_requirements(self, category):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT requirement
-            FROM profession_requirements
-            WHERE profession_id IN (
-                SELECT profession_id
-                FROM profession_categories
-                WHERE category = ?
-            )
-        """, (category,))
-        return [row[0] for row in cur.fetchall()]
-
-    def get_professions_in_category(self, category):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT p.id, p.name
-            FROM professions p
-            JOIN profession_categories c ON p.id = c.profession_id
-            WHERE c.category = ?
-        """, (category,))
-        return cur.fetchall()
+        """Категории, в которых есть профессии: пары (id, название) по алфавиту."""
+        return list(self._category_vocabulary().items)
+
+    @timed
+    def get_all_requirements(self, category_id):
+        """Требования профессий категории без повторов: пары (id, название) в порядке профессий."""
+        return list(self._requirement_vocabulary(category_id).items)
+
+    @timed
+    def has_category(self, category_id):
+        return category_id in self._category_vocabulary().index
+
+    @timed
+    def has_requirement(self, category_id, requirement_id):
+        return requirement_id in self._requirement_vocabulary(category_id).index
+
+    def category_name(self, category_id):
+        return self._category_vocabulary().index.get(category_id)
+
+    # в ключе — версия каталога: словарь, дочитанный по старой версии после подмены, уже не отдаётся
+    def _category_vocabulary(self):
+        view = self._view
+        return self.vocabulary_cache.get(
+            ("categories", view.version), lambda: make_vocabulary(self._load_categories(view.catalog)))
+
+    def _requirement_vocabulary(self, category_id):
+        view = self._view
+        return self.vocabulary_cache.get(
+            ("requirements", view.version, category_id),
+            lambda: make_vocabulary(self._load_requirements(view.catalog, category_id)))
+
+    def _load_categories(self, catalog):
+        if catalog is not None:
+            return catalog.get_all_categories()
+
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT v.id, v.name
+                FROM categories v
+                WHERE EXISTS (SELECT 1 FROM profession_categories WHERE category_id = v.id)
+                ORDER BY v.name, v.id
+            """)
+            return cur.fetchall()
 
+    def _load_requirements(self, catalog, category_id):
+        if catalog is not None:
+            return catalog.get_all_requirements(category_id)
+
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT r.requirement_id, v.name
+                FROM profession_requirements r
+                JOIN requirements v ON v.id = r.requirement_id
+                WHERE r.profession_id IN (
+                    SELECT profession_id
+                    FROM profession_categories
+                    WHERE category_id = ?
+                )
+                ORDER BY r.profession_id, r.id
+            """, (category_id,))
+            return list(dict.fromkeys(cur.fetchall()))
+
+    @timed
+    def get_professions_in_category(self, category_id, order_by_feedback=False, age=None):
+        if self.catalog is not None:
+            rows = self.catalog.get_professions_in_category(category_id)
+        else:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT DISTINCT p.id, p.name
+                    FROM professions p
+                    JOIN profession_categories c ON p.id = c.profession_id
+                    WHERE c.category_id = ?
+                    ORDER BY p.id
+                """, (category_id,))
+                rows = cur.fetchall()
+
+        if order_by_feedback:
+            rows = self.sort_by_feedback(rows, age)
+        return rows
+
+    @timed
     def get_profession_details(self, prof_id: int):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
+        if self.catalog is not None:
+            return self.catalog.get_profession_details(prof_id)
 
-        cur.execute("""
-            SELECT id, name, description, interaction_level, education_level
-            FROM professions
-            WHERE id = ?
-        """, (prof_id,))
-        row = cur.fetchone()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
 
-        if not row:
-            return None
+            cur.execute("""
+                SELECT id, name, description, interaction_level, education_level
+                FROM professions
+                WHERE id = ?
+            """, (prof_id,))
+            row = cur.fetchone()
+
+            if not row:
+                return None
+
+            result = {
+                "id": row[0],
+                "name": row[1],
+                "description": row[2],
+                "interaction_level": row[3],
+                "education_level": row[4],
+            }
+
+            cur.execute("""
+                SELECT l.category_id, v.name
+                FROM profession_categories l JOIN categories v ON v.id = l.category_id
+                WHERE l.profession_id = ?
+                ORDER BY l.id
+            """, (prof_id,))
+            rows = cur.fetchall()
+            result["categories"] = [r[1] for r in rows]
+            result["category_ids"] = [r[0] for r in rows]
+
+            cur.execute("""
+                SELECT l.requirement_id, v.name
+                FROM profession_requirements l JOIN requirements v ON v.id = l.requirement_id
+                WHERE l.profession_id = ?
+                ORDER BY l.id
+            """, (prof_id,))
+            rows = cur.fetchall()
+            result["requirements"] = [r[1] for r in rows]
+            result["requirement_ids"] = [r[0] for r in rows]
 
-        result = {
-            "id": row[0],
-            "name": row[1],
-            "description": row[2],
-            "interaction_level": row[3],
-            "education_level": row[4],
-        }
-
-        cur.execute("""
-            SELECT category FROM profession_categories
-            WHERE profession_id = ?
-        """, (prof_id,))
-        result["categories"] = [r[0] for r in cur.fetchall()]
-
-        cur.execute("""
-            SELECT requirement FROM profession_requirements
-            WHERE profession_id = ?
-        """, (prof_id,))
-        result["requirements"] = [r[0] for r in cur.fetchall()]
-
-        conn.close()
         return result
 
     
-    def find_professions(self, interaction_level=None, category=None, requirement=None, education_max=None):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
+    @timed
+    def find_professions(self, interaction_level=None, category_id=None, requirement_id=None, education_max=None,
+                         limit=None, after_id=None, before_id=None, order_by_feedback=False, age=None, offset=0):
+        """Профессии по фильтрам в порядке id; категория и требование задаются id из словарей.
+
+        Для постраничного вывода: limit ограничивает число строк, after_id
+        отдаёт строки с id больше заданного, before_id — ближайшие строки с
+        id меньше заданного (тоже по возрастанию id). Сочетания фильтров из
+        теста и смены профессии берутся из таблицы ответов.
+
+        С order_by_feedback профессии идут по оценке Уилсона (для age — по его
+        возрастной группе), при равной оценке — по id, а страницы задаются
+        limit/offset: сортируются id всех подходящих профессий, строки
+        читаются только для страницы.
+        """
+        if order_by_feedback:
+            if after_id is not None or before_id is not None:
+                raise ValueError("order_by_feedback pages by offset, not by id")
+            ids = self._answer_ids(interaction_level, category_id, requirement_id, education_max)
+            if ids is None:
+                ids = [row[0] for row in self.find_professions(interaction_level, category_id, requirement_id,
+                                                               education_max)]
+            ids = [pid for pid, in self.sort_by_feedback([(pid,) for pid in ids], age)]
+            return self.get_rows(ids[offset:] if limit is None else ids[offset:offset + limit])
+
+        view = self._view
+        ids = self._answer_ids(interaction_level, category_id, requirement_id, education_max, limit, after_id,
+                               before_id, view)
+        if ids is not None:
+            return view.catalog.get_rows(ids) if view.catalog is not None else self.get_rows(ids)
+
+        if view.catalog is not None:
+            return view.catalog.find_professions(interaction_level, category_id, requirement_id, education_max,
+                                                 limit, after_id, before_id)
 
         query = """
             SELECT DISTINCT p.id, p.name, p.description
@@ -148,46 +729,271 @@ class DB_Manager:
             query += " AND p.interaction_level = ?"
             params.append(interaction_level)
 
-        if category is not None:
-            query += " AND c.category = ?"
-            params.append(category)
+        if category_id is not None:
+            query += " AND c.category_id = ?"
+            params.append(category_id)
 
-        if requirement is not None:
-            query += " AND r.requirement = ?"
-            params.append(requirement)
+        if requirement_id is not None:
+            query += " AND r.requirement_id = ?"
+            params.append(requirement_id)
 
         if education_max is not None:
             query += " AND p.education_level <= ?"
             params.append(education_max)
 
-        cur.execute(query, params)
-        return cur.fetchall()
-    
+        if after_id is not None:
+            query += " AND p.id > ?"
+            params.append(after_id)
 
-    def add_user(self, user_id: int, name: str, age: int):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
+        if before_id is not None:
+            query += " AND p.id < ?"
+            params.append(before_id)
 
-        cur.execute("""
-            INSERT OR REPLACE INTO users (id, name, age)
-            VALUES (?, ?, ?)
-        """, (user_id, name, age))
+        query += " ORDER BY p.id DESC" if before_id is not None else " ORDER BY p.id"
 
-        conn.commit()
-        conn.close()
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
 
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+
+        if before_id is not None:
+            rows.reverse()
+        return rows
     
-    def save_user_feedback(self, user_id: int, profession_id: int, is_satisfied: int):
-        conn = sqlite3.connect(self.database)
-        cur = conn.cursor()
 
-        cur.execute("""
-            INSERT INTO users_feedback (user_id, profession_id, is_satisfied)
+    def _answer_ids(self, interaction_level, category_id, requirement_id, education_max, limit=None, after_id=None,
+                    before_id=None, view=None):
+        """id из таблицы ответов или None, если такое сочетание фильтров она не покрывает."""
+        answers = (view or self._view).answers
+        # вне воронки таблица не поможет, и строить её ради такого запроса незачем
+        if answers is None:
+            if not AnswerTable.covers(interaction_level, category_id, education_max):
+                return None
+            answers = self._get_answers()
+        return answers.find(interaction_level, category_id, requirement_id, education_max, limit, after_id,
+                            before_id)
+
+    @timed
+    def rank_professions(self, interaction_level=None, category_id=None, requirement_id=None, education_max=None,
+                         k=5):
+        """Самые близкие к ответам профессии, даже когда точных совпадений нет.
+
+        Возвращает строки (id, name, description) по убыванию оценки или
+        пустой список, если numpy не установлен.
+        """
+        ranker = self._get_ranker()
+        if ranker is None:
+            return []
+        ids = [pid for pid, score in ranker.top(interaction_level, category_id, requirement_id, education_max, k)]
+        return self.get_rows(ids)
+
+    @timed
+    def get_rows(self, ids):
+        """(id, name, description) для id в том же порядке; удалённых профессий нет в ответе."""
+        if not ids:
+            return []
+        if self.catalog is not None:
+            return self.catalog.get_rows(ids)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, name, description FROM professions
+                WHERE id IN ({", ".join("?" * len(ids))})
+            """, ids).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [by_id[pid] for pid in ids if pid in by_id]
+
+    def _get_ranker(self):
+        if np is None:
+            return None
+        with self._ranker_lock:
+            if self.ranker is None:
+                catalog = self.catalog
+                if catalog is None:
+                    with self.pool.connection() as conn:
+                        catalog = Catalog.load(conn)
+                self.ranker = Ranker.from_catalog(catalog)
+            return self.ranker
+
+    @timed
+    def nearby_professions(self, category_id, target_category_id=None, education_max=None, k=5,
+                           max_sources=1000):
+        """Профессии вне категории category_id, ближе всего к её профессиям, по графу соседей.
+
+        Для смены сферы: target_category_id ограничивает ответ целевой
+        категорией, education_max — готовностью учиться. Читается не больше
+        k соседей каждой из max_sources профессий категории. Строки —
+        (id, name, description) по убыванию близости.
+        """
+        query = """
+            SELECT p.id, p.name, p.description
+            FROM profession_neighbors n
+            JOIN professions p ON p.id = n.neighbor_id
+            WHERE n.profession_id IN (
+                SELECT profession_id FROM profession_categories WHERE category_id = ?1 LIMIT ?2
+            )
+              AND NOT EXISTS (
+                SELECT 1 FROM profession_categories
+                WHERE profession_id = n.neighbor_id AND category_id = ?1
+            )
+        """
+        params = [category_id, max_sources]
+
+        if target_category_id is not None:
+            query += """
+              AND EXISTS (
+                SELECT 1 FROM profession_categories
+                WHERE profession_id = n.neighbor_id AND category_id = ?
+            )"""
+            params.append(target_category_id)
+
+        if education_max is not None:
+            query += " AND p.education_level <= ?"
+            params.append(education_max)
+
+        query += " GROUP BY p.id ORDER BY max(n.score) DESC, p.id LIMIT ?"
+        params.append(k)
+
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).fetchall()
+
+    @timed
+    def search_professions(self, text, limit=5, offset=0):
+        """Поиск профессий по тексту: (rows, fuzzy).
+
+        Сначала точный поиск по словам (bm25, название весит больше описания),
+        если он ничего не нашёл — нечёткий по триграммам, и тогда fuzzy=True.
+        Нечёткий поиск идёт только по названиям, категориям и требованиям:
+        описаний в триграммном индексе нет (миграция 6), так что опечатка в
+        слове из описания ничего не находит.
+        Строки — (id, name, description), страницы задаются limit/offset.
+        """
+        if not self.has_search_index:
+            pattern = "%" + (text or "").strip() + "%"
+            with self.pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, name, description FROM professions
+                    WHERE name LIKE ?1 OR description LIKE ?1
+                    ORDER BY id LIMIT ?2 OFFSET ?3
+                """, (pattern, limit, offset)).fetchall()
+            return rows, False
+
+        fuzzy = False
+        with self.pool.connection() as conn:
+            query = fts_query(text)
+            ids = self._rank_matches(conn, ("professions_name_fts", "professions_fts"), query,
+                                     offset + limit) if query else []
+            if not ids:
+                query = trigram_query(text)
+                ids = self._rank_matches(conn, ("professions_name_trgm", "professions_trgm"), query,
+                                         offset + limit) if query else []
+                fuzzy = bool(query)
+        return self.get_rows(ids[offset:offset + limit]), fuzzy
+
+    @staticmethod
+    def _rank_matches(conn, tables, query, wanted):
+        """Первые wanted id совпадений по bm25: сначала совпавшие по названию, за ними остальные.
+
+        Каждый индекс сортирует все свои совпадения по bm25 (при равной
+        оценке — по id) и отдаёт первые wanted; из полного индекса берётся
+        столько же, потому что совпавшие по названию в нём повторяются.
+        Полный индекс не спрашивается, если названий хватило на wanted строк.
+        """
+        ranked, seen = [], set()
+        for table in tables:
+            if len(ranked) >= wanted:
+                break
+            weights = "10.0, 1.0, 4.0, 2.0" if table in SEARCH_TABLES else "1.0"
+            found = conn.execute(f"""
+                SELECT rowid FROM {table}
+                WHERE {table} MATCH ? ORDER BY bm25({table}, {weights}), rowid LIMIT ?
+            """, (query, wanted)).fetchall()
+            for pid, in found:
+                if pid not in seen:
+                    seen.add(pid)
+                    ranked.append(pid)
+        return ranked
+
+    @timed
+    def add_user(self, user_id: int, name: str, age: int):
+        self._write(("""
+            INSERT OR REPLACE INTO users (id, name, age)
             VALUES (?, ?, ?)
-        """, (user_id, profession_id, is_satisfied))
+        """, (user_id, name, age)))
 
-        conn.commit()
-        conn.close()
+    
+    @timed
+    def save_user_feedback(self, user_id: int, profession_id: int, is_satisfied: int):
+        self._write((FEEDBACK_UPSERT_SQL, (user_id, profession_id, is_satisfied)))
+
+    @timed
+    def get_feedback_stats(self, prof_id: int):
+        with self.users_pool.connection() as conn:
+            row = conn.execute("""
+                SELECT likes, dislikes, score FROM profession_feedback_stats
+                WHERE profession_id = ?
+            """, (prof_id,)).fetchone()
+        if not row:
+            return {"likes": 0, "dislikes": 0, "score": 0.0}
+        return {"likes": row[0], "dislikes": row[1], "score": row[2]}
+
+    @timed
+    def feedback_scores(self, prof_ids, age=None):
+        """Оценка Уилсона по id профессий; для возраста — по его возрастной группе, если она есть."""
+        prof_ids = list(prof_ids)
+        scores = {}
+        with self.users_pool.connection() as conn:
+            for i in range(0, len(prof_ids), 500):
+                chunk = prof_ids[i:i + 500]
+                marks = ", ".join("?" * len(chunk))
+                scores.update(conn.execute(f"""
+                    SELECT profession_id, score FROM profession_feedback_stats
+                    WHERE profession_id IN ({marks})
+                """, chunk))
+                if age is not None:
+                    scores.update(conn.execute(f"""
+                        SELECT profession_id, score FROM profession_feedback_age_stats
+                        WHERE age_band = ? AND profession_id IN ({marks})
+                    """, [age_band(age)] + chunk))
+        return scores
+
+    @timed
+    def sort_by_feedback(self, rows, age=None):
+        """Сортирует строки с id профессии первым полем (например, из find_professions) по отзывам."""
+        scores = self.feedback_scores((row[0] for row in rows), age)
+        return sorted(rows, key=lambda row: -scores.get(row[0], 0.0))
+
+    @timed
+    def rebuild_feedback_stats(self):
+        """Пересчитывает агрегаты отзывов с нуля за один проход по users_feedback.
+
+        Возвращает число расхождений с инкрементально посчитанными
+        агрегатами (0 — всё согласовано).
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+        tables = (
+            ("profession_feedback_stats", FEEDBACK_STATS_SQL, "profession_id, likes, dislikes"),
+            ("profession_feedback_age_stats", FEEDBACK_AGE_STATS_SQL, "profession_id, age_band, likes, dislikes"),
+        )
+        drift = 0
+        with self.users_pool.connection() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for table, select_sql, key in tables:
+                conn.execute(f"CREATE TEMP TABLE fresh AS SELECT * FROM {table} WHERE 0")
+                conn.execute("INSERT INTO fresh " + select_sql)
+                for a, b in (("fresh", table), (table, "fresh")):
+                    drift += conn.execute(f"""
+                        SELECT COUNT(*) FROM (SELECT {key} FROM {a} EXCEPT SELECT {key} FROM {b})
+                    """).fetchone()[0]
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"INSERT INTO {table} SELECT * FROM fresh")
+                conn.execute("DROP TABLE temp.fresh")
+        return drift
 
 
-    
\ No newline at end of file
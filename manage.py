@@ -0,0 +1,108 @@
+import argparse
+import logging
+import os
+import time
+
+from logic import DB_Manager
+from catalog import Catalog
+from catalog_io import FORMATS, import_catalog, export_catalog
+from snapshot import write_snapshot
+from migrations import get_catalog_version
+from answers import AnswerTable
+import neighbors
+import config
+
+
+def rebuild_feedback_stats(db, args):
+    drift = db.rebuild_feedback_stats()
+    print(f"Агрегаты отзывов пересчитаны, расхождений: {drift}")
+
+
+def import_catalog_cmd(db, args):
+    started = time.perf_counter()
+    stats = import_catalog(db, args.path, args.format)
+    print(f"Импорт завершён за {time.perf_counter() - started:.1f} с: "
+          f"прочитано {stats['read']}, добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+          f"без изменений {stats['unchanged']}, повторов {stats['duplicates']}, пропущено {stats['skipped']}")
+
+
+def export_catalog_cmd(db, args):
+    started = time.perf_counter()
+    count = export_catalog(db, args.path, args.format)
+    print(f"Выгружено профессий: {count} за {time.perf_counter() - started:.1f} с")
+
+
+def build_snapshot(db, args):
+    path = args.path or args.snapshot
+    if not path:
+        raise SystemExit("укажите файл снимка или catalog_snapshot в config.py")
+    started = time.perf_counter()
+    with db.pool.connection() as conn:
+        conn.execute("BEGIN")
+        revision = get_catalog_version(conn)
+        catalog = Catalog.load(conn)
+    write_snapshot(catalog, path, revision)
+    print(f"Снимок каталога {path}: профессий {len(catalog)}, {os.path.getsize(path) / 2**20:.1f} МБ "
+          f"за {time.perf_counter() - started:.1f} с")
+
+
+def build_neighbors(db, args):
+    started = time.perf_counter()
+    edges = db.rebuild_neighbors(args.k)
+    print(f"Граф похожих профессий перестроен за {time.perf_counter() - started:.1f} с, рёбер: {edges}")
+
+
+def answers_report(db, args):
+    with db.pool.connection() as conn:
+        started = time.perf_counter()
+        catalog = Catalog.load(conn)
+        loaded = time.perf_counter()
+    answers = AnswerTable.from_catalog(catalog)
+    built = time.perf_counter()
+    print(f"Таблица ответов воронки: профессий {len(catalog)}, сочетаний {len(answers)}, "
+          f"id в списках {len(answers.ids)}, ~{answers.nbytes() / 2**20:.1f} МБ; "
+          f"каталог загружен за {loaded - started:.2f} с, таблица построена за {built - loaded:.2f} с")
+
+
+FILE_ARGUMENTS = [
+    (("path",), {"help": "файл .csv или .jsonl"}),
+    (("--format",), {"choices": FORMATS, "help": "формат файла, если его не видно по расширению"}),
+]
+
+COMMANDS = {
+    "rebuild-feedback-stats": (rebuild_feedback_stats, "пересчитать агрегаты отзывов с нуля", []),
+    "import-catalog": (import_catalog_cmd, "загрузить или обновить каталог из CSV/JSONL", FILE_ARGUMENTS),
+    "export-catalog": (export_catalog_cmd, "выгрузить каталог в CSV/JSONL", FILE_ARGUMENTS),
+    "build-neighbors": (build_neighbors, "перестроить граф похожих профессий",
+                        [(("-k",), {"type": int, "default": neighbors.K, "help": "соседей на профессию"})]),
+    "answers-report": (answers_report, "построить таблицу ответов воронки и показать её размер и время", []),
+    "build-snapshot": (build_snapshot, "собрать бинарный снимок каталога для быстрого старта",
+                       [(("path",), {"nargs": "?", "help": "файл снимка, по умолчанию --snapshot"})]),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Служебные команды ПрофГайд Бота")
+    parser.add_argument("--database", default=config.database)
+    parser.add_argument("--users-database", default=config.users_database,
+                        help="база пользователей и отзывов, если она отдельная")
+    parser.add_argument("--snapshot", default=config.catalog_snapshot,
+                        help="снимок каталога, который пересобирается после импорта")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (func, help_text, arguments) in COMMANDS.items():
+        command = sub.add_parser(name, help=help_text)
+        for flags, options in arguments:
+            command.add_argument(*flags, **options)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format=config.log_format)
+    db = DB_Manager(args.database, snapshot=args.snapshot if args.command == "import-catalog" else None,
+                    users_database=args.users_database or None)
+    try:
+        COMMANDS[args.command][0](db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
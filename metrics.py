@@ -0,0 +1,341 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Samples, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from telebot import apihelper
+
+try:
+    from telebot import asyncio_helper
+    API_EXCEPTIONS = (apihelper.ApiException, asyncio_helper.ApiException)
+except ImportError:
+    API_EXCEPTIONS = (apihelper.ApiException,)
+
+
+log = logging.getLogger(__name__)
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Гистограмма длительностей с одной меткой, как в формате Prometheus."""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, label, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                # счётчики по корзинам (последняя — +Inf), сумма
+                series = self._series[value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += seconds
+
+    def collect(self):
+        with self._lock:
+            snapshot = {value: list(series) for value, series in self._series.items()}
+        for value, series in sorted(snapshot.items(), key=lambda item: str(item[0])):
+            label = f'{self.label}="{_escape(value)}"'
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f'{self.name}_bucket{{{label},le="{le}"}} {total}'
+            yield f"{self.name}_sum{{{label}}} {series[-1]}"
+            yield f"{self.name}_count{{{label}}} {total}"
+
+
+class Counter:
+    """Монотонный счётчик с одной меткой."""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value, amount=1):
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        for value, amount in sorted(snapshot.items(), key=lambda item: str(item[0])):
+            yield f'{self.name}{{{self.label}="{_escape(value)}"}} {amount}'
+
+
+class Sampled:
+    """Значения, которые снимаются в момент запроса метрик: глубины очередей, статистика кэшей.
+
+    Источники регистрируются через track(value, func); повторная регистрация
+    с тем же значением метки заменяет старый источник.
+    """
+
+    def __init__(self, name, help_text, label, type="gauge"):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.type = type
+        self._sources = {}
+
+    def track(self, value, func):
+        self._sources[value] = func
+
+    def collect(self):
+        for value, func in sorted(self._sources.items(), key=lambda item: str(item[0])):
+            try:
+                amount = func()
+            except Exception as e:
+                log.warning("metric %s[%s] failed: %s", self.name, value, e)
+                continue
+            yield f'{self.name}{{{self.label}="{_escape(value)}"}} {amount}'
+
+
+DB_QUERY_SECONDS = Histogram("profbot_db_query_seconds", "Время запросов DB_Manager", "method")
+DB_ERRORS = Counter("profbot_db_errors_total", "Исключения в запросах DB_Manager", "method")
+HANDLER_SECONDS = Histogram("profbot_handler_seconds", "Время обработчиков бота", "handler")
+HANDLER_ERRORS = Counter("profbot_handler_errors_total", "Исключения в обработчиках бота", "handler")
+STAGE_SECONDS = Histogram("profbot_stage_seconds", "Время этапов диалога", "stage")
+API_ERRORS = Counter("profbot_telegram_api_errors_total", "Ошибки Telegram API по коду", "code")
+CACHE_HITS = Sampled("profbot_cache_hits_total", "Попадания в кэши", "cache", type="counter")
+CACHE_MISSES = Sampled("profbot_cache_misses_total", "Промахи кэшей", "cache", type="counter")
+QUEUE_DEPTH = Sampled("profbot_queue_depth", "Глубина очередей", "queue")
+
+REGISTRY = [DB_QUERY_SECONDS, DB_ERRORS, HANDLER_SECONDS, HANDLER_ERRORS, STAGE_SECONDS, API_ERRORS,
+            CACHE_HITS, CACHE_MISSES, QUEUE_DEPTH]
+
+
+def track_cache(name, cache):
+    CACHE_HITS.track(name, lambda: cache.hits)
+    CACHE_MISSES.track(name, lambda: cache.misses)
+
+
+def api_error(e):
+    """Учитывает ошибку Telegram API, даже если вызывающий код её проглатывает."""
+    API_ERRORS.inc(getattr(e, "error_code", None) or type(e).__name__)
+
+
+def handled_error(where, e):
+    """Исключение, которое обработчик поймал и обошёл сам: в лог с трассировкой и в HANDLER_ERRORS."""
+    HANDLER_ERRORS.inc(where)
+    log.warning("%s failed: %s", where, e, exc_info=e)
+
+
+def db_error(method, e):
+    """Исключение фоновой работы с базой, которое не дошло до timed: в лог и в DB_ERRORS."""
+    DB_ERRORS.inc(method)
+    log.warning("%s failed: %s", method, e, exc_info=e)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def timed(func):
+    """Декоратор для методов DB_Manager: время в гистограмму, исключения в счётчик."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(name)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(name, time.perf_counter() - started)
+    return wrapper
+
+
+def _handler_failed(name, e):
+    if isinstance(e, API_EXCEPTIONS):
+        api_error(e)
+    HANDLER_ERRORS.inc(name)
+
+
+def handler(func):
+    """Декоратор для обработчиков бота (обычных и async): время, ошибки, профайлер."""
+    name = func.__name__
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                if not profiler.enabled:
+                    return await func(*args, **kwargs)
+                with profiler.watch(name):
+                    return await func(*args, **kwargs)
+            except Exception as e:
+                _handler_failed(name, e)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(name, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.watch(name):
+                return func(*args, **kwargs)
+        except Exception as e:
+            _handler_failed(name, e)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(name, time.perf_counter() - started)
+    return wrapper
+
+
+class SlowUpdateProfiler:
+    """Сэмплирующий профайлер медленных апдейтов, включаемый на лету.
+
+    Пока он выключен, обработчики его не трогают. Включённый, он раз в interval
+    секунд снимает стеки потоков, в которых сейчас идёт обработка апдейта,
+    и если обработка заняла дольше threshold секунд, печатает самые частые
+    стеки и сохраняет отчёт в reports. В asyncio-боте все обработчики
+    живут в одном потоке, поэтому их стеки перемешиваются.
+    """
+
+    def __init__(self, threshold=0.5, interval=0.005, depth=15, keep=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.enabled = False
+        self.reports = deque(maxlen=keep)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enable(self, threshold=None):
+        if threshold is not None:
+            self.threshold = threshold
+        with self._lock:
+            self.enabled = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def disable(self):
+        self.enabled = False
+
+    @contextmanager
+    def watch(self, label):
+        if not self.enabled:
+            yield
+            return
+
+        token = object()
+        samples = _Samples()
+        started = time.perf_counter()
+        with self._lock:
+            self._active[token] = (threading.get_ident(), samples)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(token, None)
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold and samples:
+                self._report(label, elapsed, samples)
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.values():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return tuple(stack)
+
+    def _report(self, label, elapsed, samples):
+        total = sum(samples.values())
+        lines = [f"slow update {label}: {elapsed * 1000:.0f} ms, {total} samples"]
+        for stack, count in samples.most_common(5):
+            lines.append(f"  {count * 100 / total:5.1f}%  " + " <- ".join(stack))
+        report = "\n".join(lines)
+        self.reports.append(report)
+        log.warning("%s", report)
+
+
+profiler = SlowUpdateProfiler()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/metrics":
+            self._reply(render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/profile/on":
+            threshold = query.get("threshold_ms")
+            profiler.enable(float(threshold[0]) / 1000 if threshold else None)
+            self._reply(f"profiler on, threshold {profiler.threshold * 1000:.0f} ms\n")
+        elif url.path == "/profile/off":
+            profiler.disable()
+            self._reply("profiler off\n")
+        elif url.path == "/profile":
+            self._reply("\n\n".join(profiler.reports) + "\n")
+        else:
+            self.send_error(404)
+
+    def _reply(self, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(listen="127.0.0.1", port=9464):
+    """Локальный HTTP-сервер: /metrics для Prometheus и /profile/on|off для профайлера."""
+    server = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,801 @@
+import logging
+import os
+import sqlite3
+from functools import partial
+from urllib.parse import quote
+
+from neighbors import rebuild_neighbors
+
+
+log = logging.getLogger(__name__)
+
+AGE_BANDS = ((14, "<14"), (18, "14-17"), (25, "18-24"), (35, "25-34"))
+OLDEST_AGE_BAND = "35+"
+
+
+def age_band(age):
+    for limit, band in AGE_BANDS:
+        if age < limit:
+            return band
+    return OLDEST_AGE_BAND
+
+
+AGE_BAND_SQL = ("CASE " + " ".join(f"WHEN age < {limit} THEN '{band}'" for limit, band in AGE_BANDS)
+                + f" ELSE '{OLDEST_AGE_BAND}' END")
+
+# полный пересчёт агрегатов отзывов; wilson() регистрируется в ConnectionPool
+FEEDBACK_STATS_SQL = """
+    SELECT profession_id,
+           SUM(is_satisfied = 1) AS likes,
+           SUM(is_satisfied = 0) AS dislikes,
+           wilson(SUM(is_satisfied = 1), SUM(is_satisfied = 0))
+    FROM users_feedback
+    GROUP BY profession_id
+"""
+
+# группа отзыва — возраст пользователя на момент оценки (миграция 12), а не нынешний
+FEEDBACK_AGE_STATS_SQL = """
+    SELECT profession_id,
+           age_band,
+           SUM(is_satisfied = 1),
+           SUM(is_satisfied = 0),
+           wilson(SUM(is_satisfied = 1), SUM(is_satisfied = 0))
+    FROM users_feedback
+    WHERE age_band IS NOT NULL
+    GROUP BY profession_id, age_band
+"""
+
+# до миграции 12 группа бралась из нынешнего возраста пользователя
+_LEGACY_FEEDBACK_AGE_STATS_SQL = f"""
+    SELECT f.profession_id,
+           {AGE_BAND_SQL} AS age_band,
+           SUM(f.is_satisfied = 1),
+           SUM(f.is_satisfied = 0),
+           wilson(SUM(f.is_satisfied = 1), SUM(f.is_satisfied = 0))
+    FROM users_feedback f
+    JOIN users u ON u.id = f.user_id
+    WHERE u.age IS NOT NULL
+    GROUP BY f.profession_id, age_band
+"""
+
+
+SEARCH_TABLES = {
+    "professions_fts": "unicode61 remove_diacritics 2",
+    "professions_trgm": "trigram",
+}
+
+# длины префиксов, для которых в professions_fts есть префиксный индекс (миграция 11);
+# logic.fts_query не строит префиксов длиннее и короче
+SEARCH_PREFIX_LENGTHS = (2, 3, 4, 5, 6)
+
+# индексы одних названий (миграция 11): поиск сначала ищет совпадения в названии,
+# а bm25 по ним дёшев — списки документов у слов названий короткие
+NAME_SEARCH_TABLES = {
+    "professions_name_fts": SEARCH_TABLES["professions_fts"],
+    "professions_name_trgm": "trigram",
+}
+
+_SEARCH_ROW_SQL = """
+    SELECT p.id, p.name, p.description,
+           (SELECT group_concat(v.name, ' ') FROM profession_categories l JOIN categories v ON v.id = l.category_id
+            WHERE l.profession_id = p.id),
+           (SELECT group_concat(v.name, ' ') FROM profession_requirements l JOIN requirements v ON v.id = l.requirement_id
+            WHERE l.profession_id = p.id)
+    FROM professions p
+"""
+
+# строки индекса до перехода на словари (миграция 7), когда названия лежали прямо в таблицах связей
+_LEGACY_SEARCH_ROW_SQL = """
+    SELECT p.id, p.name, p.description,
+           (SELECT group_concat(category, ' ') FROM profession_categories WHERE profession_id = p.id),
+           (SELECT group_concat(requirement, ' ') FROM profession_requirements WHERE profession_id = p.id)
+    FROM professions p
+"""
+
+
+# нечёткий поиск идёт только по названию, категориям и требованиям, поэтому
+# описания в триграммный индекс не попадают — без них он строится втрое быстрее
+_NO_DESCRIPTION_TABLES = {"professions_trgm"}
+
+
+def _search_row_sql(table, legacy=False):
+    sql = _LEGACY_SEARCH_ROW_SQL if legacy else _SEARCH_ROW_SQL
+    if table in _NO_DESCRIPTION_TABLES:
+        return sql.replace("p.name, p.description,", "p.name, NULL,")
+    return sql
+
+
+def _refresh_search_row(table, pid, legacy=False):
+    return (f"DELETE FROM {table} WHERE rowid = {pid};\n"
+            f"INSERT INTO {table} (rowid, name, description, categories, requirements) "
+            f"{_search_row_sql(table, legacy)} WHERE p.id = {pid};\n")
+
+
+_SEARCH_SOURCES = (("professions", "id"),
+                   ("profession_categories", "profession_id"),
+                   ("profession_requirements", "profession_id"))
+
+
+def has_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'professions_trgm'").fetchone() is not None
+
+
+def _has_name_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'professions_name_trgm'").fetchone() is not None
+
+
+def _is_legacy_schema(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(profession_categories)")}
+    return "category" in columns
+
+
+def create_search_triggers(conn):
+    legacy = _is_legacy_schema(conn)
+    for table in SEARCH_TABLES:
+        for source, key in _SEARCH_SOURCES:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{source}_ai AFTER INSERT ON {source} BEGIN
+                {_refresh_search_row(table, "new." + key, legacy)}END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{source}_ad AFTER DELETE ON {source} BEGIN
+                {_refresh_search_row(table, "old." + key, legacy)}END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{source}_au AFTER UPDATE ON {source} BEGIN
+                {_refresh_search_row(table, "old." + key, legacy)}{_refresh_search_row(table, "new." + key, legacy)}END
+            """)
+    if not _has_name_index(conn):
+        return
+    for table in NAME_SEARCH_TABLES:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON professions BEGIN
+            INSERT INTO {table} (rowid, name) VALUES (new.id, new.name);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON professions BEGIN
+            DELETE FROM {table} WHERE rowid = old.id;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON professions BEGIN
+            DELETE FROM {table} WHERE rowid = old.id;
+            INSERT INTO {table} (rowid, name) VALUES (new.id, new.name);
+            END
+        """)
+
+
+def drop_search_triggers(conn):
+    for table in SEARCH_TABLES:
+        for source, _ in _SEARCH_SOURCES:
+            for kind in ("ai", "ad", "au"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {table}_{source}_{kind}")
+    for table in NAME_SEARCH_TABLES:
+        for kind in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_{kind}")
+
+
+def refresh_search_rows(conn, ids_sql):
+    """Пересобирает строки поискового индекса для профессий из подзапроса ids_sql."""
+    legacy = _is_legacy_schema(conn)
+    for table in SEARCH_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE rowid IN ({ids_sql})")
+        conn.execute(f"INSERT INTO {table} (rowid, name, description, categories, requirements) "
+                     f"{_search_row_sql(table, legacy)} WHERE p.id IN ({ids_sql})")
+    if _has_name_index(conn):
+        for table in NAME_SEARCH_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE rowid IN ({ids_sql})")
+            conn.execute(f"INSERT INTO {table} (rowid, name) SELECT id, name FROM professions WHERE id IN ({ids_sql})")
+
+
+def create_search_index(conn):
+    """Полнотекстовые индексы по профессиям и триггеры, держащие их в актуальном состоянии.
+
+    Строка индекса — профессия вместе с её категориями и требованиями; любое
+    изменение в трёх таблицах каталога пересобирает строки затронутых профессий.
+    Если SQLite собран без FTS5, миграция ничего не делает.
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except Exception as e:
+        log.warning("FTS5 is not available, /search will use LIKE: %s", e)
+        return
+
+    legacy = _is_legacy_schema(conn)
+    for table, tokenizer in SEARCH_TABLES.items():
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table}
+            USING fts5(name, description, categories, requirements, tokenize = '{tokenizer}')
+        """)
+        # строки целиком, как при первом выпуске миграции; описания из триграммного индекса убирает миграция 6
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} (rowid, name, description, categories, requirements) "
+                     f"{_LEGACY_SEARCH_ROW_SQL if legacy else _SEARCH_ROW_SQL}")
+    create_search_triggers(conn)
+
+
+def drop_fuzzy_descriptions(conn):
+    """Перестраивает триграммный индекс без описаний и пересоздаёт триггеры поиска.
+
+    Это меняет нечёткий поиск: опечатка в слове из описания больше не
+    находит профессию, опечатки прощаются только в названиях, категориях и
+    требованиях. Точный поиск по описаниям (professions_fts) не меняется.
+    """
+    if not has_search_index(conn):
+        return
+    drop_search_triggers(conn)
+    legacy = _is_legacy_schema(conn)
+    for table in _NO_DESCRIPTION_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} (rowid, name, description, categories, requirements) "
+                     f"{_search_row_sql(table, legacy)}")
+    create_search_triggers(conn)
+
+
+def add_name_search(conn):
+    """Префиксные индексы в professions_fts и отдельные индексы названий.
+
+    Без префиксных индексов FTS5 на каждый запрос «слово»* сливает списки всех
+    слов с таким началом; professions_fts пересоздаётся с ними. Индексы
+    названий NAME_SEARCH_TABLES заполняются и держатся в актуальном
+    состоянии триггерами на professions.
+    """
+    if not has_search_index(conn):
+        return
+    drop_search_triggers(conn)
+    prefix = " ".join(map(str, SEARCH_PREFIX_LENGTHS))
+    conn.execute("DROP TABLE professions_fts")
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE professions_fts
+        USING fts5(name, description, categories, requirements,
+                   tokenize = '{SEARCH_TABLES["professions_fts"]}', prefix = '{prefix}')
+    """)
+    conn.execute("INSERT INTO professions_fts (rowid, name, description, categories, requirements) "
+                 f"{_search_row_sql('professions_fts', _is_legacy_schema(conn))}")
+    for table, tokenizer in NAME_SEARCH_TABLES.items():
+        options = f", prefix = '{prefix}'" if tokenizer != "trigram" else ""
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(name, tokenize = '{tokenizer}'{options})")
+        conn.execute(f"INSERT INTO {table} (rowid, name) SELECT id, name FROM professions")
+    create_search_triggers(conn)
+
+
+# индексы таблиц категорий и требований; массовый импорт снимает их на время загрузки
+CATALOG_INDEXES = {
+    "idx_profession_categories_category": "profession_categories (category_id, profession_id)",
+    "idx_profession_categories_profession": "profession_categories (profession_id, category_id)",
+    "idx_profession_requirements_profession": "profession_requirements (profession_id, requirement_id)",
+    "idx_profession_requirements_requirement": "profession_requirements (requirement_id, profession_id)",
+}
+
+
+def create_catalog_indexes(conn):
+    for name, target in CATALOG_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_catalog_indexes(conn):
+    for name in CATALOG_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+# словарь, таблица связей и столбец, в котором до миграции 7 хранилось название
+VOCABULARIES = (
+    ("categories", "profession_categories", "category"),
+    ("requirements", "profession_requirements", "requirement"),
+)
+
+
+def normalize_vocabulary(conn):
+    """Выносит названия категорий и требований в словари с целочисленными id.
+
+    Таблицы связей пересоздаются со ссылками category_id и requirement_id
+    вместо названия, повторявшегося в каждой строке; id связей, а значит и
+    их порядок, сохраняются. Связи без названия (NULL) отбрасываются.
+    """
+    search = has_search_index(conn)
+    if search:
+        drop_search_triggers(conn)
+
+    for vocabulary, links, column in VOCABULARIES:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {vocabulary} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {vocabulary} (name)
+            SELECT DISTINCT {column} FROM {links} WHERE {column} IS NOT NULL ORDER BY {column}
+        """)
+        conn.execute(f"""
+            CREATE TABLE {links}_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profession_id INTEGER NOT NULL REFERENCES professions(id),
+                {column}_id INTEGER NOT NULL REFERENCES {vocabulary}(id)
+            )
+        """)
+        conn.execute(f"""
+            INSERT INTO {links}_new (id, profession_id, {column}_id)
+            SELECT l.id, l.profession_id, v.id
+            FROM {links} l JOIN {vocabulary} v ON v.name = l.{column}
+            WHERE l.profession_id IS NOT NULL
+            ORDER BY l.id
+        """)
+        conn.execute(f"DROP TABLE {links}")
+        conn.execute(f"ALTER TABLE {links}_new RENAME TO {links}")
+
+    create_catalog_indexes(conn)
+    if search:
+        create_search_triggers(conn)
+
+
+# любая запись в эти таблицы увеличивает catalog_version.version; бот сверяет это
+# число и перечитывает каталог, не дожидаясь перезапуска
+VERSIONED_TABLES = ("professions", "profession_categories", "profession_requirements",
+                    "categories", "requirements")
+
+def get_catalog_version(conn):
+    row = conn.execute("SELECT version FROM catalog_version").fetchone()
+    return row[0] if row else 0
+
+
+def bump_catalog_version(conn):
+    conn.execute("UPDATE catalog_version SET version = version + 1")
+
+
+def create_version_triggers(conn):
+    for table in VERSIONED_TABLES:
+        for kind, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{kind} AFTER {event} ON {table} BEGIN
+                    UPDATE catalog_version SET version = version + 1;
+                END
+            """)
+
+
+def drop_version_triggers(conn):
+    for table in VERSIONED_TABLES:
+        for kind in ("ai", "au", "ad"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_version_{kind}")
+
+
+# агрегаты отзывов ведут триггеры: строка отзыва одна на пользователя и профессию,
+# и при смене оценки голос переносится из лайков в дизлайки или обратно
+_FEEDBACK_STATS_UPSERT = """
+    ON CONFLICT ({key}) DO UPDATE SET
+        likes = likes + excluded.likes,
+        dislikes = dislikes + excluded.dislikes,
+        score = wilson(likes + excluded.likes, dislikes + excluded.dislikes)
+"""
+
+_FEEDBACK_STATS_CHANGE = """
+    SET likes = likes + new.is_satisfied - old.is_satisfied,
+        dislikes = dislikes + old.is_satisfied - new.is_satisfied,
+        score = wilson(likes + new.is_satisfied - old.is_satisfied, dislikes + old.is_satisfied - new.is_satisfied)
+"""
+
+_LEGACY_FEEDBACK_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_feedback_stats_ai AFTER INSERT ON users_feedback BEGIN
+        INSERT INTO profession_feedback_stats (profession_id, likes, dislikes, score)
+        VALUES (new.profession_id, new.is_satisfied, 1 - new.is_satisfied,
+                wilson(new.is_satisfied, 1 - new.is_satisfied))
+        {_FEEDBACK_STATS_UPSERT.format(key="profession_id")};
+        INSERT INTO profession_feedback_age_stats (profession_id, age_band, likes, dislikes, score)
+        SELECT new.profession_id, {AGE_BAND_SQL}, new.is_satisfied, 1 - new.is_satisfied,
+               wilson(new.is_satisfied, 1 - new.is_satisfied)
+        FROM users WHERE id = new.user_id AND age IS NOT NULL
+        {_FEEDBACK_STATS_UPSERT.format(key="profession_id, age_band")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_feedback_stats_au AFTER UPDATE OF is_satisfied ON users_feedback
+    WHEN old.is_satisfied IS NOT new.is_satisfied BEGIN
+        UPDATE profession_feedback_stats {_FEEDBACK_STATS_CHANGE}
+        WHERE profession_id = new.profession_id;
+        UPDATE profession_feedback_age_stats {_FEEDBACK_STATS_CHANGE}
+        WHERE profession_id = new.profession_id
+          AND age_band = (SELECT {AGE_BAND_SQL} FROM users WHERE id = new.user_id AND age IS NOT NULL);
+    END
+    """,
+]
+
+_FEEDBACK_AGE_STATS_ADD = f"""
+    INSERT INTO profession_feedback_age_stats (profession_id, age_band, likes, dislikes, score)
+    SELECT new.profession_id, new.age_band, new.is_satisfied, 1 - new.is_satisfied,
+           wilson(new.is_satisfied, 1 - new.is_satisfied)
+    WHERE new.age_band IS NOT NULL
+    {_FEEDBACK_STATS_UPSERT.format(key="profession_id, age_band")}
+"""
+
+# с миграции 12 группа хранится в самом отзыве: при смене оценки или группы голос
+# вычитается из старой группы и добавляется в новую, а смена возраста в users его не трогает
+FEEDBACK_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS users_feedback_stats_ai",
+    "DROP TRIGGER IF EXISTS users_feedback_stats_au",
+    f"""
+    CREATE TRIGGER users_feedback_stats_ai AFTER INSERT ON users_feedback BEGIN
+        INSERT INTO profession_feedback_stats (profession_id, likes, dislikes, score)
+        VALUES (new.profession_id, new.is_satisfied, 1 - new.is_satisfied,
+                wilson(new.is_satisfied, 1 - new.is_satisfied))
+        {_FEEDBACK_STATS_UPSERT.format(key="profession_id")};
+        {_FEEDBACK_AGE_STATS_ADD};
+    END
+    """,
+    f"""
+    CREATE TRIGGER users_feedback_stats_au AFTER UPDATE OF is_satisfied, age_band ON users_feedback
+    WHEN old.is_satisfied IS NOT new.is_satisfied OR old.age_band IS NOT new.age_band BEGIN
+        UPDATE profession_feedback_stats {_FEEDBACK_STATS_CHANGE}
+        WHERE profession_id = new.profession_id;
+        UPDATE profession_feedback_age_stats
+        SET likes = likes - old.is_satisfied,
+            dislikes = dislikes - 1 + old.is_satisfied,
+            score = wilson(likes - old.is_satisfied, dislikes - 1 + old.is_satisfied)
+        WHERE profession_id = old.profession_id AND age_band = old.age_band;
+        DELETE FROM profession_feedback_age_stats
+        WHERE profession_id = old.profession_id AND age_band = old.age_band AND likes = 0 AND dislikes = 0;
+        {_FEEDBACK_AGE_STATS_ADD};
+    END
+    """,
+]
+
+
+# одна оценка на пользователя и профессию: повтор ничего не меняет (даже если возраст
+# с тех пор сменился), новая оценка заменяет старую вместе с возрастной группой;
+# агрегаты поправляют триггеры
+FEEDBACK_UPSERT_SQL = f"""
+    INSERT INTO users_feedback (user_id, profession_id, is_satisfied, age_band)
+    VALUES (?1, ?2, ?3, (SELECT {AGE_BAND_SQL} FROM users WHERE id = ?1 AND age IS NOT NULL))
+    ON CONFLICT (user_id, profession_id) DO UPDATE SET
+        is_satisfied = excluded.is_satisfied,
+        age_band = excluded.age_band
+    WHERE is_satisfied IS NOT excluded.is_satisfied
+"""
+
+# до миграции 12 у отзыва не было группы
+_LEGACY_FEEDBACK_UPSERT_SQL = """
+    INSERT INTO users_feedback (user_id, profession_id, is_satisfied)
+    VALUES (?, ?, ?)
+    ON CONFLICT (user_id, profession_id) DO UPDATE SET is_satisfied = excluded.is_satisfied
+    WHERE is_satisfied IS NOT excluded.is_satisfied
+"""
+
+
+def compact_feedback(conn):
+    """Оставляет по одному отзыву на пользователя и профессию — последний.
+
+    Агрегаты пересчитываются с нуля, потому что после удаления повторов
+    каждый пользователь голосует за профессию один раз.
+    """
+    conn.execute("""
+        DELETE FROM users_feedback
+        WHERE id NOT IN (SELECT max(id) FROM users_feedback GROUP BY user_id, profession_id)
+    """)
+    conn.execute("DELETE FROM profession_feedback_stats")
+    conn.execute("INSERT INTO profession_feedback_stats " + FEEDBACK_STATS_SQL)
+    conn.execute("DELETE FROM profession_feedback_age_stats")
+    conn.execute("INSERT INTO profession_feedback_age_stats " + _LEGACY_FEEDBACK_AGE_STATS_SQL)
+
+
+def add_feedback_age_band(conn):
+    """Записывает в каждый отзыв возрастную группу и пересчитывает по ним агрегаты.
+
+    Для уже накопленных отзывов возраст на момент оценки неизвестен, так что
+    берётся нынешний; дальше группу ставит FEEDBACK_UPSERT_SQL.
+    """
+    conn.execute("ALTER TABLE users_feedback ADD COLUMN age_band TEXT")
+    conn.execute(f"""
+        UPDATE users_feedback SET age_band = (
+            SELECT {AGE_BAND_SQL} FROM users WHERE users.id = users_feedback.user_id AND age IS NOT NULL
+        )
+    """)
+    for sql in FEEDBACK_TRIGGERS:
+        conn.execute(sql)
+    conn.execute("DELETE FROM profession_feedback_age_stats")
+    conn.execute("INSERT INTO profession_feedback_age_stats " + FEEDBACK_AGE_STATS_SQL)
+
+
+# применённая миграция не меняется: база, где она уже прошла, её не перечитает, так что
+# любое изменение схемы — новой миграцией со следующим номером
+MIGRATIONS = [
+    (1, "индексы каталога", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_profession_categories_category
+        ON profession_categories (category, profession_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_profession_categories_profession
+        ON profession_categories (profession_id, category)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_profession_requirements_profession
+        ON profession_requirements (profession_id, requirement)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_profession_requirements_requirement
+        ON profession_requirements (requirement, profession_id)
+        """,
+    ]),
+    (2, "индексы отзывов", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_users_feedback_user
+        ON users_feedback (user_id, profession_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_users_feedback_profession
+        ON users_feedback (profession_id, is_satisfied)
+        """,
+    ]),
+    (3, "агрегаты отзывов", [
+        """
+        CREATE TABLE IF NOT EXISTS profession_feedback_stats (
+            profession_id INTEGER PRIMARY KEY,
+            likes INTEGER NOT NULL DEFAULT 0,
+            dislikes INTEGER NOT NULL DEFAULT 0,
+            score REAL NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS profession_feedback_age_stats (
+            profession_id INTEGER NOT NULL,
+            age_band TEXT NOT NULL,
+            likes INTEGER NOT NULL DEFAULT 0,
+            dislikes INTEGER NOT NULL DEFAULT 0,
+            score REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (profession_id, age_band)
+        )
+        """,
+        "INSERT INTO profession_feedback_stats " + FEEDBACK_STATS_SQL,
+        "INSERT INTO profession_feedback_age_stats " + _LEGACY_FEEDBACK_AGE_STATS_SQL,
+    ]),
+    (4, "полнотекстовый поиск", [create_search_index]),
+    (5, "индекс по названию профессии", [
+        "CREATE INDEX IF NOT EXISTS idx_professions_name ON professions (name)",
+    ]),
+    (6, "триграммный индекс без описаний", [drop_fuzzy_descriptions]),
+    (7, "словари категорий и требований", [normalize_vocabulary]),
+    (8, "граф похожих профессий", [
+        """
+        CREATE TABLE IF NOT EXISTS profession_neighbors (
+            profession_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            neighbor_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (profession_id, rank)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_profession_neighbors_neighbor
+        ON profession_neighbors (neighbor_id)
+        """,
+        rebuild_neighbors,
+    ]),
+    (9, "один отзыв на пользователя и профессию", [
+        compact_feedback,
+        "DROP INDEX IF EXISTS idx_users_feedback_user",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_feedback_user_profession
+        ON users_feedback (user_id, profession_id)
+        """,
+        *_LEGACY_FEEDBACK_TRIGGERS,
+    ]),
+    (10, "версия каталога", [
+        """
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (0, 0)",
+        create_version_triggers,
+    ]),
+    (11, "префиксные индексы и индексы названий для поиска", [add_name_search]),
+    (12, "возрастная группа в отзыве", [add_feedback_age_band]),
+]
+
+
+def copy_legacy_users(catalog_database, conn):
+    """Переносит пользователей и отзывы, которые до разделения баз лежали в базе каталога."""
+    if not os.path.exists(catalog_database):
+        return
+    source = sqlite3.connect("file:" + quote(catalog_database) + "?mode=ro", uri=True)
+    try:
+        tables = {name for (name,) in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "users" in tables:
+            conn.executemany("INSERT OR IGNORE INTO users (id, name, age) VALUES (?, ?, ?)",
+                             source.execute("SELECT id, name, age FROM users"))
+        if "users_feedback" in tables:
+            conn.executemany(_LEGACY_FEEDBACK_UPSERT_SQL, source.execute("""
+                SELECT user_id, profession_id, is_satisfied FROM users_feedback
+                WHERE is_satisfied IN (0, 1)
+                ORDER BY id
+            """))
+    finally:
+        source.close()
+
+
+def user_migrations(catalog_database):
+    """Миграции отдельной базы пользователей и отзывов.
+
+    Схема та же, что у этих таблиц в базе каталога после миграции 12;
+    catalog_database — база, из которой переносятся уже накопленные
+    пользователи и отзывы.
+    """
+    return [
+        (1, "пользователи и отзывы", [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                age INTEGER
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS users_feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                profession_id INTEGER,
+                is_satisfied INTEGER CHECK (is_satisfied IN (0,1)),
+                UNIQUE (user_id, profession_id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_users_feedback_profession
+            ON users_feedback (profession_id, is_satisfied)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS profession_feedback_stats (
+                profession_id INTEGER PRIMARY KEY,
+                likes INTEGER NOT NULL DEFAULT 0,
+                dislikes INTEGER NOT NULL DEFAULT 0,
+                score REAL NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS profession_feedback_age_stats (
+                profession_id INTEGER NOT NULL,
+                age_band TEXT NOT NULL,
+                likes INTEGER NOT NULL DEFAULT 0,
+                dislikes INTEGER NOT NULL DEFAULT 0,
+                score REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (profession_id, age_band)
+            )
+            """,
+            *_LEGACY_FEEDBACK_TRIGGERS,
+        ]),
+        (2, "перенос пользователей и отзывов из базы каталога", [partial(copy_legacy_users, catalog_database)]),
+        (3, "возрастная группа в отзыве", [add_feedback_age_band]),
+    ]
+
+
+def add_session_search(conn):
+    """Столбцы поиска в сессиях, созданных до того, как они появились в CREATE TABLE."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    for name, decl in (("search", "TEXT"), ("search_id", "INTEGER")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE sessions ADD COLUMN {name} {decl}")
+
+
+# TEXT-значение → INTEGER; не число (остатки свободного текста до словарей) → NULL
+_SESSION_ID_SQL = "CASE WHEN {0} != '' AND {0} NOT GLOB '*[^0-9]*' THEN CAST({0} AS INTEGER) END"
+
+
+def integer_session_ids(conn):
+    """Пересоздаёт sessions с INTEGER-столбцами для id категорий."""
+    conn.execute("""
+        CREATE TABLE sessions_new (
+            user_id INTEGER PRIMARY KEY,
+            stage TEXT,
+            touched REAL,
+            name TEXT,
+            age INTEGER,
+            interaction_level INTEGER,
+            category INTEGER,
+            current_field INTEGER,
+            wants_to_stay INTEGER,
+            ready INTEGER,
+            target_field INTEGER,
+            search TEXT,
+            search_id INTEGER
+        )
+    """)
+    category, current_field, target_field = (_SESSION_ID_SQL.format(name)
+                                              for name in ("category", "current_field", "target_field"))
+    conn.execute(f"""
+        INSERT INTO sessions_new
+        SELECT user_id, stage, touched, name, age, interaction_level, {category}, {current_field},
+               wants_to_stay, ready, {target_field}, search, search_id
+        FROM sessions
+    """)
+    conn.execute("DROP TABLE sessions")
+    conn.execute("ALTER TABLE sessions_new RENAME TO sessions")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_touched ON sessions (touched)")
+
+
+# миграции базы сессий (config.sessions_database) со своей таблицей версий SESSION_SCHEMA_TABLE:
+# база сессий может совпасть с другой базой. Первая повторяет схему, которую SQLiteSessionStore
+# создавал сам, поэтому на уже существующей базе ничего не меняет
+SESSION_SCHEMA_TABLE = "sessions_schema_version"
+
+SESSION_MIGRATIONS = [
+    (1, "сессии", [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id INTEGER PRIMARY KEY,
+            stage TEXT,
+            touched REAL,
+            name TEXT,
+            age INTEGER,
+            interaction_level INTEGER,
+            category TEXT,
+            current_field TEXT,
+            wants_to_stay INTEGER,
+            ready INTEGER,
+            target_field TEXT,
+            search TEXT,
+            search_id INTEGER
+        )
+        """,
+        add_session_search,
+        "CREATE INDEX IF NOT EXISTS idx_sessions_touched ON sessions (touched)",
+    ]),
+    (2, "id категорий в сессиях — INTEGER", [integer_session_ids]),
+]
+
+
+MIGRATION_BUSY_TIMEOUT_MS = 600000
+
+
+def get_schema_version(conn, table="schema_version"):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute(f"SELECT MAX(version) FROM {table}").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn, migrations=MIGRATIONS, table="schema_version"):
+    """Применяет по порядку все миграции новее текущей версии схемы.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью в
+    schema_version. Транзакция берёт блокировку записи сразу (BEGIN
+    IMMEDIATE), и версия перечитывается уже под ней, поэтому процессы,
+    стартующие одновременно, применяют каждую миграцию ровно один раз:
+    остальные ждут и видят, что она уже есть. Шаг миграции — либо
+    SQL-строка, либо функция от conn. Свой table нужен наборам миграций,
+    которые могут оказаться в одном файле с другими (SESSION_MIGRATIONS).
+    """
+    with conn:
+        current = get_schema_version(conn, table)
+    applied = []
+    busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    # миграция большой базы идёт минутами, и всё это время другие процессы ждут её
+    conn.execute(f"PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}")
+    try:
+        for version, description, steps in migrations:
+            if version <= current:
+                continue
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                current = get_schema_version(conn, table)
+                if version <= current:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    f"INSERT INTO {table} (version, description) VALUES (?, ?)",
+                    (version, description),
+                )
+            applied.append(version)
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+    return applied
@@ -0,0 +1,177 @@
+import heapq
+from bisect import bisect_left
+
+from catalog import Catalog
+
+
+K = 10
+# кандидатов в соседи на профессию: сначала из самых узких категорий и требований,
+# из длинных списков — ближайшие по id
+MAX_CANDIDATES = 100
+
+CATEGORY_WEIGHT = 1.0
+REQUIREMENT_WEIGHT = 1.5
+# штраф за каждую ступень образования выше, чем у исходной профессии
+EDUCATION_GAP_WEIGHT = 0.5 / 3
+
+
+def _order(item):
+    return -item[1], item[0]
+
+
+def _bits(ids, positions):
+    mask = 0
+    for i in ids:
+        mask |= 1 << positions.setdefault(i, len(positions))
+    return mask
+
+
+class SimilarityIndex:
+    """Близость профессий каталога по общим категориям и требованиям с учётом образования.
+
+    Оценка — взвешенная сумма коэффициентов Жаккара по категориям и по
+    требованиям минус штраф, если соседняя профессия требует более высокого
+    образования. Множества хранятся битовыми масками, так что пересечение —
+    это & и bit_count(). Кандидаты в соседи — профессии с хотя бы одной общей
+    категорией или требованием, не больше MAX_CANDIDATES на профессию. Половина мест в списке соседей
+    отдаётся профессиям из других категорий: иначе их вытесняют соседи по
+    своей сфере, а при смене сферы нужны именно они.
+    """
+
+    def __init__(self, catalog, max_candidates=MAX_CANDIDATES):
+        self.max_candidates = max_candidates
+        self.education = {pid: row[4] for pid, row in catalog.professions.items()}
+        self.category_ids, self.requirement_ids = {}, {}
+        # (битовая маска, размер множества)
+        self.categories, self.requirements = {}, {}
+        category_bits, requirement_bits = {}, {}
+        for pid in self.education:
+            cats = self.category_ids[pid] = list(dict.fromkeys(catalog.categories.get(pid, ())))
+            reqs = self.requirement_ids[pid] = list(dict.fromkeys(catalog.requirements.get(pid, ())))
+            self.categories[pid] = (_bits(cats, category_bits), len(cats))
+            self.requirements[pid] = (_bits(reqs, requirement_bits), len(reqs))
+        # профессии по категориям и требованиям, по возрастанию id
+        self.by_category = {c: sorted(q for q in ids if q in self.education)
+                            for c, ids in catalog.by_category.items()}
+        self.by_requirement = {r: sorted(q for q in ids if q in self.education)
+                               for r, ids in catalog.by_requirement.items()}
+
+    def __contains__(self, pid):
+        return pid in self.education
+
+    def score(self, a, b):
+        return self._score(a, b)[0]
+
+    def _score(self, a, b):
+        """Оценка близости b к a и число их общих категорий."""
+        (ca, na), (ra, ma) = self.categories[a], self.requirements[a]
+        (cb, nb), (rb, mb) = self.categories[b], self.requirements[b]
+        score = 0.0
+        shared_categories = (ca & cb).bit_count()
+        if shared_categories:
+            score += CATEGORY_WEIGHT * shared_categories / (na + nb - shared_categories)
+        shared = (ra & rb).bit_count()
+        if shared:
+            score += REQUIREMENT_WEIGHT * shared / (ma + mb - shared)
+        ea, eb = self.education[a], self.education[b]
+        if ea is not None and eb is not None and eb > ea:
+            score -= EDUCATION_GAP_WEIGHT * (eb - ea)
+        return score, shared_categories
+
+    def candidates(self, pid):
+        postings = [self.by_category[c] for c in self.category_ids[pid]]
+        postings += [self.by_requirement[r] for r in self.requirement_ids[pid]]
+        postings.sort(key=len)
+
+        result = set()
+        for ids in postings:
+            room = self.max_candidates - len(result)
+            if room <= 0:
+                break
+            if len(ids) <= room:
+                result.update(ids)
+            else:
+                start = bisect_left(ids, pid)
+                result.update(ids[start:start + room])
+                result.update(ids[:max(0, start + room - len(ids))])
+        result.discard(pid)
+        return result
+
+    def neighbors(self, pid, k=K):
+        """До k пар (id, оценка) с положительной оценкой по убыванию; при равенстве — по id."""
+        inside, outside = [], []
+        for q in self.candidates(pid):
+            score, shared_categories = self._score(pid, q)
+            if score > 0:
+                (inside if shared_categories else outside).append((q, score))
+
+        taken = min(len(outside), max(k - k // 2, k - len(inside)))
+        inside = heapq.nsmallest(k - taken, inside, key=_order)
+        outside = heapq.nsmallest(taken, outside, key=_order)
+        return sorted(inside + outside, key=_order)
+
+
+def _insert(conn, pid, neighbors):
+    conn.executemany(
+        "INSERT INTO profession_neighbors (profession_id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)",
+        [(pid, rank, q, score) for rank, (q, score) in enumerate(neighbors)])
+
+
+def _replace(conn, pid, neighbors):
+    conn.execute("DELETE FROM profession_neighbors WHERE profession_id = ?", (pid,))
+    _insert(conn, pid, neighbors)
+
+
+def rebuild_neighbors(conn, catalog=None, k=K):
+    """Строит граф k ближайших соседей с нуля. Возвращает число рёбер."""
+    if catalog is None:
+        catalog = Catalog.load(conn)
+    index = SimilarityIndex(catalog)
+
+    conn.execute("DELETE FROM profession_neighbors")
+    edges = 0
+    for pid in catalog.professions:
+        neighbors = index.neighbors(pid, k)
+        _insert(conn, pid, neighbors)
+        edges += len(neighbors)
+    return edges
+
+
+def update_neighbors(conn, catalog, changed_ids, k=K):
+    """Обновляет граф после изменения профессий changed_ids (в том числе удаления).
+
+    Заново строятся списки изменённых профессий, тех, у кого они были
+    соседями, и тех их кандидатов, в чей список изменённая профессия теперь
+    проходит по оценке. Профессии, которых нет среди кандидатов изменённой,
+    не пересчитываются, поэтому результат может немного отличаться от
+    полной перестройки.
+    """
+    index = SimilarityIndex(catalog)
+    changed = set(changed_ids)
+    affected = set()
+    for pid in changed:
+        affected.update(q for (q,) in conn.execute(
+            "SELECT profession_id FROM profession_neighbors WHERE neighbor_id = ?", (pid,)))
+    affected -= changed
+
+    for pid in changed:
+        if pid not in index:
+            conn.execute("DELETE FROM profession_neighbors WHERE profession_id = ?", (pid,))
+            continue
+        _replace(conn, pid, index.neighbors(pid, k))
+
+        for q in index.candidates(pid):
+            if q in changed or q in affected:
+                continue
+            score = index.score(q, pid)
+            if score <= 0:
+                continue
+            current = conn.execute("""
+                SELECT count(*), min(score) FROM profession_neighbors WHERE profession_id = ?
+            """, (q,)).fetchone()
+            if current[0] < k or score > current[1]:
+                affected.add(q)
+
+    for q in affected:
+        if q in index:
+            _replace(conn, q, index.neighbors(q, k))
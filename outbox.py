@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import metrics
+
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Не больше rate вызовов в секунду с запасом на burst подряд; rate=0 — без ограничения."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now):
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        if self.rate:
+            self._refill(now)
+            self.tokens -= 1
+
+    def full(self, now):
+        return not self.rate or self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+class _Call:
+    __slots__ = ("chat_id", "func", "args", "kwargs", "attempts")
+
+    def __init__(self, chat_id, func, args, kwargs):
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+
+
+def retry_after(e):
+    """Сколько секунд ждать по ответу 429 Too Many Requests, или None для других ошибок."""
+    if getattr(e, "error_code", None) != 429:
+        return None
+    parameters = (getattr(e, "result_json", None) or {}).get("parameters") or {}
+    return parameters.get("retry_after", 1)
+
+
+class SendScheduler:
+    """Порядок отправки исходящих вызовов Telegram API.
+
+    Общий token bucket ограничивает частоту вызовов бота в целом, свой
+    bucket у каждого чата — частоту сообщений в чат. Вызовы одного чата
+    уходят строго по порядку, чаты обходятся по кругу, а ответы на
+    callback-кнопки (chat_id=None) идут вне очереди — пока на них нет
+    ответа, у пользователя крутятся часики. После 429 чат (или весь бот
+    для ответов на кнопки) ставится на паузу на retry_after секунд.
+
+    Сам по себе не потокобезопасен: его обслуживают Outbox и AsyncOutbox.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3):
+        now = time.monotonic()
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1), now)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.urgent = deque()
+        self.chats = OrderedDict()
+        self.buckets = {}
+        self.blocked = {}
+        self.paused_until = 0.0
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def push(self, call, front=False):
+        if call.chat_id is None:
+            queue = self.urgent
+        else:
+            queue = self.chats.get(call.chat_id)
+            if queue is None:
+                queue = self.chats[call.chat_id] = deque()
+        if front:
+            queue.appendleft(call)
+        else:
+            queue.append(call)
+        self.pending += 1
+
+    def pop(self, now, shard=0, shards=1):
+        """Следующий вызов, который отправитель shard из shards может сделать сейчас.
+
+        Возвращает (call, 0) или (None, сколько ждать); если ждать нужно до
+        следующего push — (None, None). Чат закреплён за одним отправителем
+        (chat_id % shards), поэтому его вызовы уходят строго по очереди, а
+        ответы на кнопки берёт любой свободный отправитель.
+        """
+        if not self.pending:
+            return None, None
+        wait = max(self.paused_until - now, self.global_bucket.delay(now))
+        if wait > 0:
+            return None, wait
+
+        if self.urgent:
+            return self._take(self.urgent.popleft(), now), 0
+
+        best = None
+        for chat_id, queue in self.chats.items():
+            if chat_id % shards != shard:
+                continue
+            bucket = self.buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+            delay = max(self.blocked.get(chat_id, 0) - now, bucket.delay(now))
+            if delay <= 0:
+                call = queue.popleft()
+                if queue:
+                    self.chats.move_to_end(chat_id)
+                else:
+                    del self.chats[chat_id]
+                bucket.take(now)
+                return self._take(call, now), 0
+            best = delay if best is None else min(best, delay)
+        return None, best
+
+    def failed(self, call, e, now):
+        """Обрабатывает ошибку вызова: после 429 вызов повторяется, остальное только учитывается."""
+        delay = retry_after(e)
+        if delay is not None and call.attempts < self.max_retries:
+            call.attempts += 1
+            if call.chat_id is None:
+                self.paused_until = max(self.paused_until, now + delay)
+            else:
+                self.blocked[call.chat_id] = max(self.blocked.get(call.chat_id, 0), now + delay)
+            self.push(call, front=True)
+            return
+
+        metrics.api_error(e)
+        log.warning("%s failed: %s", getattr(call.func, "__name__", "api call"), e)
+
+    def _take(self, call, now):
+        self.pending -= 1
+        self.global_bucket.take(now)
+        if len(self.buckets) > 4096:
+            self._prune(now)
+        return call
+
+    def _prune(self, now):
+        for chat_id in [c for c, b in self.buckets.items() if c not in self.chats and b.full(now)]:
+            del self.buckets[chat_id]
+        for chat_id in [c for c, until in self.blocked.items() if until <= now]:
+            del self.blocked[chat_id]
+
+
+class Outbox:
+    """Исходящие вызовы синхронного бота: обработчики ставят их в очередь и сразу возвращаются.
+
+    Вызовы делают senders потоков в порядке SendScheduler: пока один ждёт
+    ответа Telegram, другие отправляют дальше, так что пропускная
+    способность не упирается в 1/RTT. Методы повторяют сигнатуры TeleBot,
+    но ничего не возвращают — ошибки пишутся в лог и метрики.
+    """
+
+    def __init__(self, bot, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3, senders=8):
+        self.bot = bot
+        self.scheduler = SendScheduler(global_rate, chat_rate, chat_burst, max_retries)
+        self.senders = senders
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, args=(shard,), name=f"outbox-{shard}", daemon=True)
+                         for shard in range(senders)]
+        for thread in self._threads:
+            thread.start()
+        metrics.QUEUE_DEPTH.track("outbox", lambda: len(self.scheduler))
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._submit(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self._submit(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+
+    def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        self._submit(chat_id, self.bot.edit_message_reply_markup, chat_id, message_id, reply_markup=reply_markup)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        self._submit(None, self.bot.answer_callback_query, callback_query_id, text, **kwargs)
+
+    def _submit(self, chat_id, func, *args, **kwargs):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("outbox is closed")
+            self.scheduler.push(_Call(chat_id, func, args, kwargs))
+            self._cond.notify_all()
+
+    def flush(self):
+        """Блокируется, пока не будет сделан каждый поставленный вызов."""
+        with self._cond:
+            while len(self.scheduler) or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, shard):
+        while True:
+            with self._cond:
+                while True:
+                    call, wait = self.scheduler.pop(time.monotonic(), shard, self.senders)
+                    if call is not None:
+                        self._busy += 1
+                        break
+                    if self._closed and not len(self.scheduler):
+                        return
+                    self._cond.wait(wait)
+
+            try:
+                call.func(*call.args, **call.kwargs)
+            except Exception as e:
+                with self._cond:
+                    self.scheduler.failed(call, e, time.monotonic())
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+
+
+class AsyncOutbox:
+    """То же для AsyncTeleBot: очередь обслуживают senders задач в цикле событий.
+
+    Методы ставят вызов в очередь и возвращаются сразу (их не нужно
+    await-ить); start() и close() вызываются внутри работающего цикла.
+    """
+
+    def __init__(self, bot, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3, senders=8):
+        self.bot = bot
+        self.scheduler = SendScheduler(global_rate, chat_rate, chat_burst, max_retries)
+        self.senders = senders
+        self._wakeup = None
+        self._idle = None
+        self._tasks = None
+        self._busy = 0
+        self._closed = False
+        metrics.QUEUE_DEPTH.track("outbox", lambda: len(self.scheduler))
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run(shard)) for shard in range(self.senders)]
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._submit(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self._submit(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+
+    def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        self._submit(chat_id, self.bot.edit_message_reply_markup, chat_id, message_id, reply_markup=reply_markup)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        self._submit(None, self.bot.answer_callback_query, callback_query_id, text, **kwargs)
+
+    def _submit(self, chat_id, func, *args, **kwargs):
+        if self._closed:
+            raise RuntimeError("outbox is closed")
+        if self._tasks is None:
+            self.start()
+        self.scheduler.push(_Call(chat_id, func, args, kwargs))
+        self._idle.clear()
+        self._wakeup.set()
+
+    async def flush(self):
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def close(self):
+        self._closed = True
+        if self._tasks is not None:
+            self._wakeup.set()
+            await asyncio.gather(*self._tasks)
+
+    async def _run(self, shard):
+        while True:
+            call, wait = self.scheduler.pop(time.monotonic(), shard, self.senders)
+            if call is None:
+                if not len(self.scheduler):
+                    if not self._busy:
+                        self._idle.set()
+                    if self._closed:
+                        return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._busy += 1
+            try:
+                await call.func(*call.args, **call.kwargs)
+            except Exception as e:
+                self.scheduler.failed(call, e, time.monotonic())
+            finally:
+                self._busy -= 1
+                # остальные отправители перепроверяют очередь: flush() и close() ждут всех
+                self._wakeup.set()
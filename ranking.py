@@ -0,0 +1,131 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Ranker:
+    """Ранжирование всего каталога по ответам пользователя.
+
+    Уровни общения и образования хранятся плотными векторами, а категории и
+    требования — как разреженные столбцы multi-hot матрицы (для каждого
+    значения — массив номеров строк). Оценка всего каталога — одна
+    векторная операция плюс пара scatter-add по нужным столбцам, top-k —
+    partition по оценке и сортировка отобранных по (-оценка, id).
+    Профессии можно добавлять и удалять по одной, не пересобирая всё.
+    """
+
+    W_INTERACTION = 1.0
+    W_CATEGORY = 2.0
+    W_REQUIREMENT = 1.5
+    W_EDUCATION = 1.0
+
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise RuntimeError("numpy is required for ranking")
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.interaction = np.zeros(capacity, dtype=np.float32)
+        self.education = np.zeros(capacity, dtype=np.float32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.rows = {}
+        self.row_labels = {}
+        self._columns = {}
+        self._frozen = {}
+        self._free = []
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        ranker = cls(capacity=max(len(catalog), 1))
+        for pid, interaction_level, education_level, categories, requirements in catalog.ranking_rows():
+            ranker.upsert(pid, interaction_level, education_level, categories, requirements)
+        return ranker
+
+    def __len__(self):
+        return len(self.rows)
+
+    def upsert(self, pid, interaction_level, education_level, categories, requirements):
+        row = self.rows.get(pid)
+        if row is not None:
+            self._drop_labels(row)
+        else:
+            row = self._free.pop() if self._free else self._append_row()
+            self.rows[pid] = row
+
+        self.ids[row] = pid
+        self.interaction[row] = -10 if interaction_level is None else interaction_level
+        self.education[row] = 10 if education_level is None else education_level
+        self.active[row] = True
+
+        labels = [("c", c) for c in set(categories)] + [("r", r) for r in set(requirements)]
+        for label in labels:
+            self._columns.setdefault(label, set()).add(row)
+            self._frozen.pop(label, None)
+        self.row_labels[row] = labels
+
+    def remove(self, pid):
+        row = self.rows.pop(pid, None)
+        if row is None:
+            return
+        self._drop_labels(row)
+        self.active[row] = False
+        self._free.append(row)
+
+    def top(self, interaction_level=None, category=None, requirement=None, education_max=None, k=5):
+        """До k пар (id, score) по убыванию оценки; при равенстве — по id."""
+        n = self.size
+        if not self.rows or k <= 0:
+            return []
+
+        scores = np.zeros(n, dtype=np.float32)
+        if interaction_level is not None:
+            scores += self.W_INTERACTION * np.clip(1 - np.abs(self.interaction[:n] - interaction_level) / 2, 0, 1)
+        if education_max is not None:
+            gap = np.maximum(self.education[:n] - education_max, 0)
+            scores += self.W_EDUCATION * np.clip(1 - gap / 3, 0, 1)
+        if category is not None:
+            scores[self._column(("c", category))] += self.W_CATEGORY
+        if requirement is not None:
+            scores[self._column(("r", requirement))] += self.W_REQUIREMENT
+        scores[~self.active[:n]] = -np.inf
+
+        k = min(k, len(self.rows))
+        if k < n:
+            # argpartition берёт из равных k-й оценке строк какие попало, поэтому
+            # среди них отбираются сами наименьшие id
+            kth = np.partition(scores, n - k)[n - k]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)
+            need = k - len(above)
+            if need < len(tied):
+                tied = tied[np.argpartition(self.ids[tied], need - 1)[:need]]
+            candidates = np.concatenate((above, tied))
+        else:
+            candidates = np.arange(n)
+        order = np.lexsort((self.ids[candidates], -scores[candidates]))
+        best = candidates[order][:k]
+        return [(int(self.ids[i]), float(scores[i])) for i in best if self.active[i]]
+
+    def _column(self, label):
+        column = self._frozen.get(label)
+        if column is None:
+            column = self._frozen[label] = np.fromiter(self._columns.get(label, ()), dtype=np.int64)
+        return column
+
+    def _drop_labels(self, row):
+        for label in self.row_labels.pop(row, ()):
+            rows = self._columns.get(label)
+            if rows is not None:
+                rows.discard(row)
+                self._frozen.pop(label, None)
+
+    def _append_row(self):
+        if self.size == len(self.ids):
+            capacity = max(len(self.ids) * 2, 16)
+            for name in ("ids", "interaction", "education", "active"):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        self.size += 1
+        return self.size - 1
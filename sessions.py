@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import db_error
+from migrations import SESSION_MIGRATIONS, SESSION_SCHEMA_TABLE, apply_migrations
+
+
+class Session:
+    """Состояние диалога одного пользователя."""
+
+    __slots__ = (
+        "user_id", "stage", "touched",
+        "name", "age", "interaction_level", "category",
+        "current_field", "wants_to_stay", "ready", "target_field",
+        "search", "search_id",
+    )
+
+    FIELDS = __slots__[1:]
+
+    def __init__(self, user_id, stage="awaiting_name", touched=None, name=None, age=None,
+                 interaction_level=None, category=None, current_field=None,
+                 wants_to_stay=None, ready=None, target_field=None, search=None, search_id=0):
+        self.user_id = user_id
+        self.stage = stage
+        self.touched = time.time() if touched is None else touched
+        self.name = name
+        self.age = age
+        self.interaction_level = interaction_level
+        self.category = category
+        self.current_field = current_field
+        self.wants_to_stay = wants_to_stay
+        self.ready = ready
+        self.target_field = target_field
+        self.search = search
+        self.search_id = search_id
+
+    def as_row(self):
+        return (self.user_id,) + tuple(getattr(self, f) for f in self.FIELDS)
+
+
+class SessionStore:
+    """Сессии в памяти с вытеснением давно неактивных (LRU + TTL).
+
+    Обработчик апдейта получает сессию через get() или start(), меняет её и
+    по окончании вызывает save().
+    """
+
+    def __init__(self, maxsize=100000, ttl=7 * 24 * 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, user_id):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None and now - session.touched > self.ttl:
+                del self._sessions[user_id]
+                session = None
+            if session is None:
+                session = self._load(user_id, now)
+                if session is None:
+                    return None
+                self._sessions[user_id] = session
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(user_id)
+            session.touched = now
+            return session
+
+    def start(self, user_id):
+        session = Session(user_id)
+        with self._lock:
+            self._sessions[user_id] = session
+            self._sessions.move_to_end(user_id)
+            self._evict(session.touched)
+            self._saved(session)
+        return session
+
+    def save(self, session):
+        """Сессию изменили: обработчик закончил с ней работать."""
+        if session is None:
+            return
+        with self._lock:
+            self._saved(session)
+
+    def close(self):
+        pass
+
+    def _evict(self, now):
+        sessions = self._sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if len(sessions) <= self.maxsize and now - oldest.touched <= self.ttl:
+                break
+            sessions.popitem(last=False)
+
+    def _load(self, user_id, now):
+        return None
+
+    def _saved(self, session):
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Сессии, переживающие перезапуск: в памяти держится только активная часть.
+
+    Сессия подгружается из базы при первом обращении. save() снимает копию
+    строки сессии в момент вызова — уже после обработчика, — и эти копии
+    пачкой записываются раз в flush_interval секунд и при закрытии, так что
+    в базу не попадает сессия, которую прямо сейчас меняет другой поток.
+    """
+
+    def __init__(self, database, maxsize=100000, ttl=7 * 24 * 3600, flush_interval=5):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(database, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        apply_migrations(self._conn, SESSION_MIGRATIONS, SESSION_SCHEMA_TABLE)
+        self._db_lock = threading.Lock()
+        self._dirty = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-flusher", daemon=True)
+        self._thread.start()
+
+    def _load(self, user_id, now):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT * FROM sessions WHERE user_id = ? AND touched >= ?",
+                (user_id, now - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        session = Session(*row)
+        if session.wants_to_stay is not None:
+            session.wants_to_stay = bool(session.wants_to_stay)
+        if session.ready is not None:
+            session.ready = bool(session.ready)
+        return session
+
+    def _saved(self, session):
+        self._dirty[session.user_id] = session.as_row()
+
+    def flush(self):
+        with self._lock:
+            rows = list(self._dirty.values())
+            self._dirty = {}
+        if not rows:
+            return
+        placeholders = ", ".join("?" * len(rows[0]))
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO sessions VALUES ({placeholders})", rows
+            )
+            self._conn.execute("DELETE FROM sessions WHERE touched < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._conn.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                db_error("session_flush", e)
@@ -0,0 +1,293 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+MAGIC = b"PGCATSNP"
+FORMAT_VERSION = 3
+NONE = 0xFFFFFFFF
+
+# заголовок: MAGIC, версия формата, число секций, catalog_version базы; затем по секции:
+# имя (24 байта), typecode (1 байт), смещение и число элементов
+_HEADER = struct.Struct("<8sIIq")
+_SECTION = struct.Struct("<24scxxxxxxxQQ")
+
+# уровни общения и образования; NULL хранится как -1 и попадает в нулевую корзину
+INTERACTION_LEVELS = (-1, 0, 1, 2)
+EDUCATION_LEVELS = (-1, 0, 1, 2, 3)
+
+
+def _csr(groups):
+    """Список списков → (смещения, значения) в виде двух array('I')."""
+    offsets, values = array("I", [0]), array("I")
+    for group in groups:
+        values.extend(group)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def write_snapshot(catalog, path, revision=0):
+    """Сохраняет каталог в бинарный снимок path атомарно: запись во временный файл и rename.
+
+    revision — catalog_version базы, из которой прочитан каталог; она
+    записывается в заголовок, и процессы, открывшие снимок, знают его версию.
+
+    Профессии идут по возрастанию id; строки (названия профессий, описания,
+    названия категорий и требований) лежат в общей таблице без повторов,
+    связи — массивами id категорий и требований, а индексы по категориям,
+    требованиям и уровням — массивами позиций строк (CSR).
+    """
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return NONE
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    ids = array("q", sorted(catalog.professions))
+    names, descriptions = array("I"), array("I")
+    interaction, education = array("b"), array("b")
+    categories, requirements = [], []
+    by_interaction = {level: [] for level in INTERACTION_LEVELS}
+    by_education = {level: [] for level in EDUCATION_LEVELS}
+    by_category, by_requirement = {}, {}
+
+    for row, pid in enumerate(ids):
+        _, name, description, interaction_level, education_level = catalog.professions[pid]
+        names.append(intern(name))
+        descriptions.append(intern(description))
+        interaction.append(-1 if interaction_level is None else interaction_level)
+        education.append(-1 if education_level is None else education_level)
+        by_interaction[interaction[-1]].append(row)
+        by_education[education[-1]].append(row)
+
+        cats = catalog.categories.get(pid, ())
+        reqs = catalog.requirements.get(pid, ())
+        categories.append(cats)
+        requirements.append(reqs)
+        for c in dict.fromkeys(cats):
+            by_category.setdefault(c, []).append(row)
+        for r in dict.fromkeys(reqs):
+            by_requirement.setdefault(r, []).append(row)
+
+    # порядок категорий — как у Catalog.get_all_categories: по названию
+    category_ids = array("I", sorted(by_category, key=lambda c: (catalog.category_names[c], c)))
+    requirement_ids = array("I", sorted(by_requirement))
+    category_names = array("I", (intern(catalog.category_names[c]) for c in category_ids))
+    requirement_names = array("I", (intern(catalog.requirement_names[r]) for r in requirement_ids))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_offsets = array("Q", [0])
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+
+    sections = {
+        "ids": ids,
+        "names": names,
+        "descriptions": descriptions,
+        "interaction": interaction,
+        "education": education,
+        "string_offsets": string_offsets,
+        "strings": array("B", b"".join(encoded)),
+        "category_ids": category_ids,
+        "category_names": category_names,
+        "requirement_ids": requirement_ids,
+        "requirement_names": requirement_names,
+    }
+    sections["cat_offsets"], sections["cat_values"] = _csr(categories)
+    sections["req_offsets"], sections["req_values"] = _csr(requirements)
+    sections["by_cat_offsets"], sections["by_cat_rows"] = _csr(by_category[c] for c in category_ids)
+    sections["by_req_offsets"], sections["by_req_rows"] = _csr(by_requirement[r] for r in requirement_ids)
+    sections["by_inter_offsets"], sections["by_inter_rows"] = _csr(by_interaction[l] for l in INTERACTION_LEVELS)
+    sections["by_edu_offsets"], sections["by_edu_rows"] = _csr(by_education[l] for l in EDUCATION_LEVELS)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            offset = _HEADER.size + _SECTION.size * len(sections)
+            layout = []
+            for name, data in sections.items():
+                offset = (offset + 7) & ~7
+                layout.append((name, data, offset))
+                offset += len(data) * data.itemsize
+
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), revision))
+            for name, data, start in layout:
+                f.write(_SECTION.pack(name.encode(), data.typecode.encode(), start, len(data)))
+            for name, data, start in layout:
+                f.write(b"\0" * (start - f.tell()))
+                data.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class CatalogSnapshot:
+    """Каталог из бинарного снимка, отображённого в память только для чтения.
+
+    Массивы — memoryview поверх mmap без копирования, поэтому открытие
+    занимает миллисекунды, а процессы с одним снимком делят страницы через
+    кэш ОС. Строки декодируются при обращении; в памяти процесса строятся
+    только словари id → название для категорий и требований. Отвечает на те
+    же запросы, что и Catalog; revision — catalog_version из заголовка.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(f.fileno())
+
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path} is not a catalog snapshot of version {FORMAT_VERSION}")
+        magic, version, count, self.revision = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a catalog snapshot of version {FORMAT_VERSION}")
+
+        view = memoryview(self._mmap)
+        for i in range(count):
+            name, typecode, offset, length = _SECTION.unpack_from(self._mmap, _HEADER.size + i * _SECTION.size)
+            size = array(typecode.decode()).itemsize
+            section = view[offset:offset + length * size].cast(typecode.decode())
+            setattr(self, "_" + name.rstrip(b"\0").decode(), section)
+
+        self._category_index = {c: i for i, c in enumerate(self._category_ids)}
+        self._requirement_index = {r: i for i, r in enumerate(self._requirement_ids)}
+        self.category_names = {c: self._string(n) for c, n in zip(self._category_ids, self._category_names)}
+        self.requirement_names = {r: self._string(n) for r, n in zip(self._requirement_ids, self._requirement_names)}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _string(self, index):
+        if index == NONE:
+            return None
+        return str(self._strings[self._string_offsets[index]:self._string_offsets[index + 1]], "utf-8")
+
+    @staticmethod
+    def _slice(offsets, values, i):
+        return values[offsets[i]:offsets[i + 1]]
+
+    def _row(self, pid):
+        row = bisect_left(self._ids, pid)
+        if row < len(self._ids) and self._ids[row] == pid:
+            return row
+        return None
+
+
+    def _rows_with(self, index, offsets, values, key):
+        i = index.get(key)
+        if i is None:
+            return values[0:0]
+        return self._slice(offsets, values, i)
+
+    def get_all_categories(self):
+        return list(self.category_names.items())
+
+    def get_all_requirements(self, category_id):
+        result = {}
+        for row in self._rows_with(self._category_index, self._by_cat_offsets, self._by_cat_rows, category_id):
+            for r in self._slice(self._req_offsets, self._req_values, row):
+                result.setdefault(r, self.requirement_names[r])
+        return list(result.items())
+
+    def get_professions_in_category(self, category_id):
+        rows = self._rows_with(self._category_index, self._by_cat_offsets, self._by_cat_rows, category_id)
+        return [(self._ids[row], self._string(self._names[row])) for row in rows]
+
+    def get_profession_details(self, prof_id):
+        row = self._row(prof_id)
+        if row is None:
+            return None
+
+        interaction_level, education_level = self._interaction[row], self._education[row]
+        categories = list(self._slice(self._cat_offsets, self._cat_values, row))
+        requirements = list(self._slice(self._req_offsets, self._req_values, row))
+        return {
+            "id": self._ids[row],
+            "name": self._string(self._names[row]),
+            "description": self._string(self._descriptions[row]),
+            "interaction_level": None if interaction_level < 0 else interaction_level,
+            "education_level": None if education_level < 0 else education_level,
+            "categories": [self.category_names[c] for c in categories],
+            "requirements": [self.requirement_names[r] for r in requirements],
+            "category_ids": categories,
+            "requirement_ids": requirements,
+        }
+
+    def get_rows(self, ids):
+        rows = (self._row(pid) for pid in ids)
+        return [(self._ids[row], self._string(self._names[row]), self._string(self._descriptions[row]))
+                for row in rows if row is not None]
+
+    def find_professions(self, interaction_level=None, category_id=None, requirement_id=None, education_max=None,
+                         limit=None, after_id=None, before_id=None):
+        # кандидаты — самый узкий из списков строк, остальные фильтры проверяются по строке
+        candidates, others = None, []
+        if category_id is not None:
+            others.append(self._rows_with(self._category_index, self._by_cat_offsets, self._by_cat_rows,
+                                          category_id))
+        if requirement_id is not None:
+            others.append(self._rows_with(self._requirement_index, self._by_req_offsets, self._by_req_rows,
+                                          requirement_id))
+        if interaction_level is not None:
+            if interaction_level not in INTERACTION_LEVELS[1:]:
+                return []
+            others.append(self._slice(self._by_inter_offsets, self._by_inter_rows,
+                                      INTERACTION_LEVELS.index(interaction_level)))
+        if others:
+            others.sort(key=len)
+            candidates = others.pop(0)
+        members = [set(rows) for rows in others]
+
+        start, stop = 0, len(self._ids)
+        if after_id is not None:
+            start = bisect_right(self._ids, after_id)
+        if before_id is not None:
+            stop = bisect_left(self._ids, before_id)
+
+        if candidates is None:
+            candidates = range(start, stop)
+        else:
+            candidates = candidates[bisect_left(candidates, start):bisect_left(candidates, stop)]
+
+        def matches(row):
+            if education_max is not None and not 0 <= self._education[row] <= education_max:
+                return False
+            return all(row in rows for rows in members)
+
+        if before_id is not None:
+            rows = []
+            for row in reversed(candidates):
+                if limit is not None and len(rows) >= limit:
+                    break
+                if matches(row):
+                    rows.append(row)
+            rows.reverse()
+        else:
+            rows = []
+            for row in candidates:
+                if limit is not None and len(rows) >= limit:
+                    break
+                if matches(row):
+                    rows.append(row)
+
+        return [(self._ids[row], self._string(self._names[row]), self._string(self._descriptions[row]))
+                for row in rows]
+
+    def ranking_rows(self):
+        for row, pid in enumerate(self._ids):
+            interaction_level, education_level = self._interaction[row], self._education[row]
+            yield (pid, None if interaction_level < 0 else interaction_level,
+                   None if education_level < 0 else education_level,
+                   list(self._slice(self._cat_offsets, self._cat_values, row)),
+                   list(self._slice(self._req_offsets, self._req_values, row)))
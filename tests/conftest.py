@@ -0,0 +1,16 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Копия поставляемой profession.db: DB_Manager применяет к ней миграции."""
+    path = str(tmp_path / "profession.db")
+    shutil.copy(os.path.join(ROOT, "profession.db"), path)
+    return path
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import answers
+from logic import DB_Manager
+
+
+def _count_builds(monkeypatch):
+    builds = []
+    from_catalog = answers.AnswerTable.from_catalog.__func__
+
+    def counting(cls, catalog):
+        builds.append(catalog)
+        return from_catalog(cls, catalog)
+
+    monkeypatch.setattr(answers.AnswerTable, "from_catalog", classmethod(counting))
+    return builds
+
+
+def test_answer_table_is_built_on_first_use(database, tmp_path, monkeypatch):
+    builds = _count_builds(monkeypatch)
+    db = DB_Manager(database, use_catalog=True, users_database=str(tmp_path / "users.db"))
+    try:
+        assert db.answers is None and not builds
+        category_id = db.get_all_categories()[0][0]
+        rows = db.find_professions(interaction_level=1, category_id=category_id)
+        assert len(builds) == 1 and db.answers is not None
+        assert db.find_professions(interaction_level=1, category_id=category_id) == rows
+        assert len(builds) == 1
+    finally:
+        db.close()
+
+
+def test_empty_answer_table_is_used_as_is(database, tmp_path):
+    db = DB_Manager(database, use_catalog=True, users_database=str(tmp_path / "users.db"))
+    try:
+        empty = answers.AnswerTable(answers.array("q"), {})
+        assert not empty
+        db._view = db._view._replace(answers=empty)
+        db._get_answers = lambda: pytest.fail("таблица ответов уже есть, пусть и пустая")
+        assert db.find_professions(interaction_level=1, category_id=db.get_all_categories()[0][0]) == []
+    finally:
+        db.close()
+
+
+def test_warm_answers_builds_in_background(database, tmp_path):
+    db = DB_Manager(database, use_catalog=True, users_database=str(tmp_path / "users.db"), warm_answers=True)
+    try:
+        db._warmer.join()
+        assert db.answers is not None
+    finally:
+        db.close()
+
+
+def test_sql_mode_builds_once_per_catalog_revision(database, tmp_path, monkeypatch):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        category_id = db.get_all_categories()[0][0]
+        conn = sqlite3.connect(database)
+        with conn:
+            conn.execute("UPDATE professions SET name = name || ' ' WHERE id = 1")
+        conn.close()
+        # изменение ещё не опубликовано опросом: версия в CatalogView старая
+        builds = _count_builds(monkeypatch)
+        for _ in range(5):
+            db.find_professions(category_id=category_id)
+        assert len(builds) == 1
+    finally:
+        db.close()
+
+
+def test_queries_outside_funnel_do_not_build_table(database, tmp_path, monkeypatch):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        builds = _count_builds(monkeypatch)
+        assert db.find_professions(interaction_level=1)
+        assert db.find_professions(category_id=db.get_all_categories()[0][0], education_max=3) is not None
+        assert not builds and db.answers is None
+    finally:
+        db.close()
@@ -0,0 +1,54 @@
+import cache
+from cache import Debouncer, TTLCache
+
+
+def test_load_racing_invalidate_is_not_stored():
+    cache = TTLCache()
+
+    def loader():
+        # каталог поменялся, пока значение читалось
+        cache.invalidate()
+        return "stale"
+
+    assert cache.get("key", loader) == "stale"
+    assert cache.get("key", lambda: "fresh") == "fresh"
+    assert cache.get("key", lambda: "other") == "fresh"
+
+
+def test_keyed_invalidate():
+    cache = TTLCache()
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.invalidate("a")
+    assert cache.get("a", lambda: 3) == 3
+    assert cache.get("b", lambda: 4) == 2
+    assert cache.stats() == {"hits": 1, "misses": 3, "size": 2}
+
+
+def test_debouncer_drops_repeated_callbacks(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    debounce = Debouncer(window=10)
+    press = (1, 42, "fb_yes:5")
+
+    assert not debounce.seen("call-1", press)
+    # Telegram прислал тот же callback ещё раз
+    assert debounce.seen("call-1", press)
+    # пользователь нажал ту же кнопку повторно: id новый, но кнопка та же
+    assert debounce.seen("call-2", press)
+    # другая кнопка в том же сообщении — не повтор
+    assert not debounce.seen("call-3", (1, 42, "fb_no:5"))
+
+    now[0] += 11
+    assert not debounce.seen("call-4", press)
+    assert (debounce.hits, debounce.misses) == (2, 3)
+
+
+def test_debouncer_evicts_oldest_keys():
+    debounce = Debouncer(window=60, maxsize=4)
+    for i in range(4):
+        assert not debounce.seen(i)
+    # для нового ключа вытесняется самый старый
+    assert not debounce.seen(4)
+    assert not debounce.seen(0)
+    assert debounce.seen(4)
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+
+import pytest
+
+import manage
+from catalog_io import export_catalog, import_catalog
+from logic import DB_Manager
+from migrations import get_catalog_version
+
+
+@pytest.fixture
+def db(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    yield db
+    db.close()
+
+
+def _write_jsonl(path, lines):
+    path.write_text("".join((line if isinstance(line, str) else json.dumps(line, ensure_ascii=False)) + "\n"
+                            for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def _revision(database):
+    conn = sqlite3.connect(database)
+    try:
+        return get_catalog_version(conn)
+    finally:
+        conn.close()
+
+
+def _by_name(db, name):
+    with db.pool.connection() as conn:
+        row = conn.execute("SELECT id FROM professions WHERE name = ?", (name,)).fetchone()
+    return db.get_profession_details(row[0]) if row else None
+
+
+def test_import_dedupes_and_skips_malformed_lines(db, tmp_path):
+    path = _write_jsonl(tmp_path / "catalog.jsonl", [
+        {"name": "Квазизубрилог", "description": "первая версия", "categories": ["Наука"]},
+        "{не json",
+        {"name": "   ", "description": "без названия"},
+        {"name": "Уровень мимо", "interaction_level": 7},
+        ["не", "объект"],
+        {"name": "Квазизубрилог", "description": "последняя версия", "interaction_level": 1,
+         "categories": ["Наука", "Наука", " "], "requirements": "Терпение;Внимательность"},
+    ])
+    stats = import_catalog(db, path)
+    assert stats == {"read": 6, "skipped": 4, "duplicates": 1, "inserted": 1, "updated": 0, "unchanged": 0}
+
+    prof = _by_name(db, "Квазизубрилог")
+    assert prof["description"] == "последняя версия" and prof["interaction_level"] == 1
+    assert prof["categories"] == ["Наука"]
+    assert prof["requirements"] == ["Терпение", "Внимательность"]
+
+
+def test_import_updates_changed_and_keeps_unchanged(db, database, tmp_path):
+    export = str(tmp_path / "export.jsonl")
+    export_catalog(db, export)
+    with open(export, encoding="utf-8") as f:
+        first, second = (json.loads(f.readline()) for _ in range(2))
+    first["description"] = "Переписанное описание"
+    second_requirements = list(second["requirements"])
+
+    revision = _revision(database)
+    stats = import_catalog(db, _write_jsonl(tmp_path / "patch.jsonl", [
+        first, second, {"name": "Совсем новая профессия", "categories": ["Наука"]},
+    ]))
+    assert stats["inserted"] == 1 and stats["updated"] == 1 and stats["unchanged"] == 1
+    assert _by_name(db, first["name"])["description"] == "Переписанное описание"
+    assert _by_name(db, second["name"])["requirements"] == second_requirements
+
+    # версия каталога растёт один раз на загрузку, и читатели видят новые данные и поиск
+    assert _revision(database) == revision + 1
+    assert db.catalog_revision == revision + 1
+    rows, fuzzy = db.search_professions("Переписанное", limit=10)
+    assert not fuzzy and [row[1] for row in rows] == [first["name"]]
+    rows, _ = db.search_professions("Совсем новая профессия", limit=10)
+    assert rows and rows[0][1] == "Совсем новая профессия"
+
+    # повторная загрузка того же файла ничего не меняет и версию не трогает
+    stats = import_catalog(db, str(tmp_path / "patch.jsonl"))
+    assert stats["inserted"] == stats["updated"] == 0 and stats["unchanged"] == 3
+    assert _revision(database) == revision + 1
+
+
+def _duplicated_links(db):
+    with db.pool.connection() as conn:
+        return conn.execute("""
+            SELECT count(DISTINCT profession_id) FROM (
+                SELECT profession_id FROM profession_categories GROUP BY profession_id, category_id HAVING count(*) > 1
+                UNION ALL
+                SELECT profession_id FROM profession_requirements GROUP BY profession_id, requirement_id HAVING count(*) > 1
+            )
+        """).fetchone()[0]
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_export_import_round_trip(db, database, tmp_path, fmt):
+    path = str(tmp_path / f"catalog.{fmt}")
+    count = export_catalog(db, path)
+
+    # первая загрузка только убирает повторы категорий и требований у профессий
+    duplicated = _duplicated_links(db)
+    stats = import_catalog(db, path)
+    assert stats == {"read": count, "skipped": 0, "duplicates": 0, "inserted": 0,
+                     "updated": duplicated, "unchanged": count - duplicated}
+    assert _duplicated_links(db) == 0
+
+    # дальше выгрузка и загрузка ничего не меняют
+    path = str(tmp_path / f"clean.{fmt}")
+    assert export_catalog(db, path) == count
+    revision = _revision(database)
+    stats = import_catalog(db, path)
+    assert stats == {"read": count, "skipped": 0, "duplicates": 0, "inserted": 0, "updated": 0, "unchanged": count}
+    assert _revision(database) == revision
+
+    again = str(tmp_path / f"again.{fmt}")
+    assert export_catalog(db, again) == count
+    with open(path, encoding="utf-8") as a, open(again, encoding="utf-8") as b:
+        assert a.read() == b.read()
+
+
+def test_manage_import_catalog_rebuilds_snapshot(database, tmp_path, capsys):
+    path = _write_jsonl(tmp_path / "catalog.jsonl", [{"name": "Квазизубрилог", "categories": ["Наука"]}, "{"])
+    snapshot = str(tmp_path / "catalog.snap")
+    manage.main(["--database", database, "--users-database", str(tmp_path / "users.db"), "--snapshot", snapshot,
+                 "import-catalog", path])
+    out = capsys.readouterr().out
+    assert "добавлено 1" in out and "пропущено 1" in out
+
+    # снимок собран уже с новой профессией и под новой версией каталога
+    db = DB_Manager(database, snapshot=snapshot, users_database=str(tmp_path / "users.db"))
+    try:
+        assert db.catalog_revision == _revision(database)
+        assert _by_name(db, "Квазизубрилог")["categories"] == ["Наука"]
+    finally:
+        db.close()
@@ -0,0 +1,125 @@
+import itertools
+
+import pytest
+
+from logic import DB_Manager
+from ranking import np
+
+
+class _NoAnswers:
+    """Таблица ответов, которая ничего не покрывает: find_professions уходит в каталог или в SQL."""
+
+    def find(self, *args):
+        return None
+
+
+def _without_answers(db):
+    db._view = db._view._replace(answers=None)
+    db._get_answers = lambda: _NoAnswers()
+    return db
+
+
+@pytest.fixture
+def sql(database, tmp_path):
+    db = _without_answers(DB_Manager(database, users_database=str(tmp_path / "users.db")))
+    for user_id, age in ((1, 16), (2, 40), (3, 16)):
+        db.add_user(user_id, f"user {user_id}", age)
+    for user_id, pid, liked in ((1, 1, 1), (2, 1, 0), (3, 2, 1), (1, 5, 1), (2, 5, 1), (3, 7, 0)):
+        db.save_user_feedback(user_id, pid, liked)
+    yield db
+    db.close()
+
+
+@pytest.fixture(params=["memory", "snapshot", "answers"])
+def other(request, sql, database, tmp_path):
+    """Тот же каталог через Catalog в памяти, через снимок и через SQL с таблицей ответов."""
+    users_database = str(tmp_path / "users.db")
+    if request.param == "memory":
+        db = _without_answers(DB_Manager(database, use_catalog=True, users_database=users_database))
+    elif request.param == "snapshot":
+        db = _without_answers(DB_Manager(database, snapshot=str(tmp_path / "catalog.snap"),
+                                         users_database=users_database))
+    else:
+        db = DB_Manager(database, users_database=users_database)
+    yield db
+    db.close()
+
+
+def _requirement_ids(db):
+    return sorted({r for c, _ in db.get_all_categories() for r, _ in db.get_all_requirements(c)})
+
+
+def test_vocabularies(sql, other):
+    categories = sql.get_all_categories()
+    assert categories
+    assert other.get_all_categories() == categories
+
+    requirements = _requirement_ids(sql)
+    for c, name in categories + [(10 ** 6, None)]:
+        assert other.get_all_requirements(c) == sql.get_all_requirements(c)
+        assert other.has_category(c) == sql.has_category(c)
+        assert other.category_name(c) == sql.category_name(c) == name
+        for r in requirements:
+            assert other.has_requirement(c, r) == sql.has_requirement(c, r)
+
+
+def test_professions_in_category(sql, other):
+    for (c, _), by_feedback, age in itertools.product(sql.get_all_categories(), (False, True), (None, 16, 40)):
+        assert other.get_professions_in_category(c, by_feedback, age) == \
+            sql.get_professions_in_category(c, by_feedback, age)
+
+
+def test_profession_details(sql, other):
+    ids = [pid for pid, _, _ in sql.find_professions()]
+    assert ids
+    for pid in ids + [0, max(ids) + 1]:
+        assert other.get_profession_details(pid) == sql.get_profession_details(pid)
+
+
+def test_find_professions(sql, other):
+    categories = [None] + [c for c, _ in sql.get_all_categories()]
+    for c in categories:
+        requirements = [None] + ([r for r, _ in sql.get_all_requirements(c)] if c is not None
+                                 else _requirement_ids(sql)[:5])
+        for r, interaction, education in itertools.product(requirements, (None, 0, 1, 2), (None, 0, 1, 2, 3)):
+            filters = dict(interaction_level=interaction, category_id=c, requirement_id=r, education_max=education)
+            expected = sql.find_professions(**filters)
+            assert other.find_professions(**filters) == expected, filters
+            if len(expected) <= 3:
+                continue
+
+            # постранично вперёд и назад
+            page = sql.find_professions(**filters, limit=3)
+            assert other.find_professions(**filters, limit=3) == page
+            while page:
+                after = sql.find_professions(**filters, limit=3, after_id=page[-1][0])
+                assert other.find_professions(**filters, limit=3, after_id=page[-1][0]) == after, filters
+                if after:
+                    before = sql.find_professions(**filters, limit=3, before_id=after[0][0])
+                    assert before == page
+                    assert other.find_professions(**filters, limit=3, before_id=after[0][0]) == before, filters
+                page = after
+
+
+def test_get_rows(sql, other):
+    ids = [pid for pid, _, _ in sql.find_professions()]
+    wanted = ids[::-3] + [10 ** 6] + ids[:4]
+    assert other.get_rows(wanted) == sql.get_rows(wanted)
+    assert [row[0] for row in sql.get_rows(wanted)] == [pid for pid in wanted if pid in ids]
+    assert other.get_rows([]) == sql.get_rows([]) == []
+
+
+@pytest.mark.skipif(np is None, reason="ранжирование требует numpy")
+def test_rank_professions(sql, other):
+    for (c, _), interaction, education in itertools.product(sql.get_all_categories(), (None, 1), (None, 1)):
+        for r in [None] + [r for r, _ in sql.get_all_requirements(c)][:2]:
+            filters = dict(interaction_level=interaction, category_id=c, requirement_id=r, education_max=education)
+            assert other.rank_professions(**filters) == sql.rank_professions(**filters), filters
+
+
+def test_nearby_and_search(sql, other):
+    categories = [c for c, _ in sql.get_all_categories()]
+    for c, target in itertools.product(categories, [None] + categories[:2]):
+        assert other.nearby_professions(c, target) == sql.nearby_professions(c, target)
+    for text in ("программист", "врач", "дизайн", "програмист", ""):
+        assert other.search_professions(text) == sql.search_professions(text)
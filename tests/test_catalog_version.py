@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+import pytest
+
+from logic import DB_Manager
+from migrations import VERSIONED_TABLES, get_catalog_version
+
+
+def _write(database, *statements):
+    conn = sqlite3.connect(database)
+    with conn:
+        for sql, params in statements:
+            conn.execute(sql, params)
+    revision = get_catalog_version(conn)
+    conn.close()
+    return revision
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def db(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    yield db
+    db.close()
+
+
+def test_catalog_writes_bump_version(db, database):
+    revision = db.catalog_revision
+    category_id = db.get_all_categories()[0][0]
+    writes = [
+        ("UPDATE professions SET name = 'Квазизубрилог' WHERE id = ?", (1,)),
+        ("INSERT INTO categories (name) VALUES (?)", ("Новая категория",)),
+        ("INSERT INTO requirements (name) VALUES (?)", ("Новое требование",)),
+        ("INSERT INTO profession_categories (profession_id, category_id) VALUES (?, ?)", (1, category_id)),
+        ("DELETE FROM profession_requirements WHERE id = (SELECT min(id) FROM profession_requirements)", ()),
+    ]
+    assert {table for sql, _ in writes for table in VERSIONED_TABLES if f" {table} " in sql} == set(VERSIONED_TABLES)
+    for sql, params in writes:
+        bumped = _write(database, (sql, params))
+        assert bumped == revision + 1, sql
+        revision = bumped
+
+    # отзывы каталог не меняют
+    db.save_user_feedback(1, 1, 1)
+    assert _write(database) == revision
+
+
+@pytest.mark.parametrize("use_catalog", [False, True])
+def test_poll_publishes_new_view(database, tmp_path, use_catalog):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"), use_catalog=use_catalog, catalog_poll=0.02)
+    try:
+        category_id = db.get_profession_details(1)["category_ids"][0]
+        before = db.find_professions(category_id=category_id)
+        assert db.answers is not None
+        version = db.catalog_version
+
+        revision = _write(database, ("UPDATE professions SET name = 'Квазизубрилог' WHERE id = ?", (1,)))
+        assert _wait(lambda: db.catalog_revision == revision)
+        assert db.catalog_version > version
+        assert db.get_profession_details(1)["name"] == "Квазизубрилог"
+        after = db.find_professions(category_id=category_id)
+        assert [row[0] for row in after] == [row[0] for row in before]
+        assert dict((row[0], row[1]) for row in after)[1] == "Квазизубрилог"
+    finally:
+        db.close()
+
+
+def test_check_catalog_rebuilds_once(db, database):
+    assert not db.check_catalog()
+    version = db.catalog_version
+    revision = _write(database, ("UPDATE professions SET description = 'Новое' WHERE id = ?", (2,)))
+    assert db.check_catalog()
+    assert db.catalog_revision == revision and db.catalog_version == version + 1
+    assert not db.check_catalog()
@@ -0,0 +1,128 @@
+import json
+from html.parser import HTMLParser
+from types import SimpleNamespace
+
+import pytest
+
+from conversation import (PAGE_SIZE, Chat, choice_keyboard, choose, on_info_choose_category, profession_card,
+                          render_professions, turn_page)
+from logic import DB_Manager
+from sessions import Session
+
+
+NAME = "C*_`[x] <b>&</b> инженер_по*качеству"
+DESCRIPTION = "Пишет `код` и *звёздочки*, использует a < b && c > d"
+
+
+class _Telegram(HTMLParser):
+    """Разбор HTML так, как его понимает Telegram: только разрешённые теги, текст — отдельно."""
+
+    ALLOWED = {"b", "i"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open, self.bold, self.italic, self.text = [], [], [], []
+
+    def handle_starttag(self, tag, attrs):
+        assert tag in self.ALLOWED and not attrs, tag
+        self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.open and self.open.pop() == tag, tag
+
+    def handle_data(self, data):
+        self.text.append(data)
+        if "b" in self.open:
+            self.bold.append(data)
+        elif "i" in self.open:
+            self.italic.append(data)
+
+
+def _parse(text):
+    parser = _Telegram()
+    parser.feed(text)
+    parser.close()
+    assert not parser.open
+    return parser
+
+
+def test_card_escapes_special_characters():
+    prof = {"name": NAME, "description": DESCRIPTION, "categories": ["IT & <связь>"], "requirements": ["C_*"],
+            "interaction_level": 1, "education_level": 2}
+    parsed = _parse(profession_card(prof))
+    assert NAME in parsed.bold
+    text = "".join(parsed.text)
+    assert DESCRIPTION in text and "IT & <связь>" in text and "C_*" in text
+
+
+def test_list_escapes_special_characters():
+    text, _ = render_professions("Найденные профессии:", [(1, NAME, DESCRIPTION)])
+    parsed = _parse(text)
+    assert NAME in parsed.bold
+    assert DESCRIPTION in parsed.italic
+
+
+def test_info_category_is_paged_like_search(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        category_id, ids = next(((c, [row[0] for row in db.find_professions(category_id=c)])
+                                 for c, _ in db.get_all_categories()
+                                 if len(db.find_professions(category_id=c)) > PAGE_SIZE), (None, None))
+        if category_id is None:
+            pytest.skip("нет категории больше одной страницы")
+        sent = []
+        ctx = SimpleNamespace(db=db, send=lambda text, **kwargs: sent.append((text, kwargs)))
+        state = SimpleNamespace(search=None, search_id=None, age=None)
+        assert on_info_choose_category(ctx, state, category_id) == "menu"
+
+        text, kwargs = sent[-1]
+        buttons = [b for row in json.loads(kwargs["reply_markup"])["inline_keyboard"] for b in row]
+        assert sum(b["callback_data"].startswith("viewprof:") for b in buttons) == PAGE_SIZE
+        nav = [b["callback_data"] for b in buttons if b["callback_data"].startswith("page:")]
+        assert nav == [f"page:{state.search_id}:n:{PAGE_SIZE}"]
+        assert all(len(b["callback_data"].encode()) <= 64 for b in buttons)
+
+        seen = []
+        for offset in range(0, len(ids), PAGE_SIZE):
+            _, kb = turn_page(db, state, f"page:{state.search_id}:n:{offset}")
+            seen += [int(b["callback_data"].split(":")[1])
+                     for row in json.loads(kb)["inline_keyboard"] for b in row
+                     if b["callback_data"].startswith("viewprof:")]
+        assert sorted(seen) == ids
+    finally:
+        db.close()
+
+
+def _callbacks(kb):
+    return [b["callback_data"] for row in json.loads(kb)["inline_keyboard"] for b in row]
+
+
+def test_choice_buttons_carry_only_ids(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        categories = db.get_all_categories()
+        category_id, _ = categories[0]
+        assert _callbacks(choice_keyboard("cat", categories + [(10**9, "Очень длинная категория " * 10)])) == \
+            [f"cat:{cid}" for cid, _ in categories] + [f"cat:{10**9}"]
+
+        sent = []
+        state = Session(1, stage="test_category", interaction_level=1)
+        ctx = Chat(1, db, lambda chat_id, text, **kwargs: sent.append((text, kwargs)))
+        # требование не по этапу и несуществующая категория не двигают разговор
+        assert not choose(ctx, state, "req:1")
+        assert choose(ctx, state, "cat:999999") and state.stage == "test_category"
+
+        assert choose(ctx, state, f"cat:{category_id}")
+        ctx.flush()
+        assert state.category == category_id and state.stage == "test_requirement"
+        requirements = db.get_all_requirements(category_id)
+        assert _callbacks(sent[-1][1]["reply_markup"]) == [f"req:{rid}" for rid, _ in requirements]
+
+        # требование из чужой категории отвергается, своё — даёт подбор
+        other = {rid for cid, _ in categories[1:] for rid, _ in db.get_all_requirements(cid)}
+        foreign = min(other - {rid for rid, _ in requirements})
+        assert choose(ctx, state, f"req:{foreign}") and state.stage == "test_requirement"
+        assert choose(ctx, state, f"req:{requirements[0][0]}") and state.stage == "menu"
+        assert not choose(ctx, state, f"req:{requirements[0][0]}")
+    finally:
+        db.close()
@@ -0,0 +1,84 @@
+import pytest
+
+from logic import DB_Manager, wilson_lower_bound
+
+
+@pytest.fixture(params=["same", "separate"])
+def db(request, database, tmp_path):
+    """Отзывы в базе каталога (миграция 12) и в отдельной базе пользователей (миграция 3)."""
+    users_database = str(tmp_path / "users.db") if request.param == "separate" else None
+    db = DB_Manager(database, users_database=users_database)
+    yield db
+    db.close()
+
+
+def _age_stats(db, pid):
+    with db.users_pool.connection() as conn:
+        return {band: (likes, dislikes) for band, likes, dislikes in conn.execute("""
+            SELECT age_band, likes, dislikes FROM profession_feedback_age_stats WHERE profession_id = ?
+        """, (pid,))}
+
+
+def _category_with(db, count):
+    for category_id, _ in db.get_all_categories():
+        ids = [row[0] for row in db.find_professions(category_id=category_id)]
+        if len(ids) >= count:
+            return category_id, ids
+    pytest.skip("нет категории с нужным числом профессий")
+
+
+def test_feedback_keeps_age_band_of_the_rating(db):
+    db.add_user(1, "user", 16)
+    db.save_user_feedback(1, 5, 1)
+    assert _age_stats(db, 5) == {"14-17": (1, 0)}
+
+    # пользователь повзрослел: прежний голос остаётся в прежней группе
+    db.add_user(1, "user", 30)
+    db.save_user_feedback(1, 5, 1)
+    assert _age_stats(db, 5) == {"14-17": (1, 0)}
+
+    # новая оценка переносит голос в нынешнюю группу, ничего не уходит в минус
+    db.save_user_feedback(1, 5, 0)
+    assert _age_stats(db, 5) == {"25-34": (0, 1)}
+    assert db.get_feedback_stats(5)["likes"] == 0 and db.get_feedback_stats(5)["dislikes"] == 1
+
+    # пересчёт с нуля сходится с тем, что насчитали триггеры
+    assert db.rebuild_feedback_stats() == 0
+
+
+def test_feedback_without_age_counts_only_overall(db):
+    db.save_user_feedback(2, 7, 1)
+    assert db.get_feedback_stats(7)["likes"] == 1
+    assert _age_stats(db, 7) == {}
+    assert db.rebuild_feedback_stats() == 0
+
+
+def test_results_are_ordered_by_wilson_score(db):
+    category_id, ids = _category_with(db, 4)
+    low, high, young = ids[1], ids[2], ids[3]
+    for user_id in range(1, 6):
+        db.add_user(user_id, f"user {user_id}", 40)
+        db.save_user_feedback(user_id, high, 1)
+    db.add_user(10, "one", 40)
+    db.save_user_feedback(10, low, 1)
+    assert wilson_lower_bound(5, 0) > wilson_lower_bound(1, 0)
+    db.add_user(20, "young", 15)
+    for pid in (young, high):
+        db.save_user_feedback(20, pid, pid == young)
+
+    rows = db.find_professions(category_id=category_id, order_by_feedback=True)
+    order = [row[0] for row in rows]
+    # при равной оценке и без оценок профессии остаются в порядке id
+    assert order[:3] == [high, low, young]
+    assert order[3:] == sorted(order[3:])
+    assert sorted(order) == ids
+
+    # для подростка решают оценки его группы, а где их нет — общие: у high в группе только дизлайк
+    order = [row[0] for row in db.find_professions(category_id=category_id, order_by_feedback=True, age=16)]
+    assert order[:2] == [low, young]
+    assert high in order[2:] and order[2:] == sorted(order[2:])
+
+    pages = []
+    for offset in range(0, len(ids), 2):
+        pages += db.find_professions(category_id=category_id, order_by_feedback=True, limit=2, offset=offset)
+    assert pages == rows
@@ -0,0 +1,72 @@
+import logging
+import sqlite3
+
+from conversation import Chat, send_nearby_professions
+from logic import DB_Manager
+from metrics import DB_ERRORS, DB_QUERY_SECONDS, HANDLER_ERRORS
+from sessions import Session
+
+
+def _count(method):
+    for line in DB_QUERY_SECONDS.collect():
+        if line.startswith(f'{DB_QUERY_SECONDS.name}_count{{method="{method}"}}'):
+            return int(line.rsplit(" ", 1)[1])
+    return 0
+
+
+def test_catalog_methods_are_timed(database, tmp_path):
+    db = DB_Manager(database, snapshot=str(tmp_path / "catalog.snap"), users_database=str(tmp_path / "users.db"))
+    try:
+        calls = {
+            "get_rows": lambda: db.get_rows([1, 2]),
+            "check_catalog": db.check_catalog,
+            "reload_catalog": db.reload_catalog,
+            "load_snapshot": db.load_snapshot,
+            "refresh_snapshot": db.refresh_snapshot,
+        }
+        for method, call in calls.items():
+            before = _count(method)
+            call()
+            assert _count(method) == before + 1, method
+    finally:
+        db.close()
+
+
+def _counter(counter, label):
+    prefix = f'{counter.name}{{{counter.label}="{label}"}} '
+    for line in counter.collect():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+class _FailingDB:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+        return fail
+
+
+def test_swallowed_handler_errors_are_counted_and_logged(caplog):
+    ctx = Chat(1, _FailingDB(), lambda *args, **kwargs: None)
+    state = Session(1)
+    state.current_field, state.target_field = 1, 2
+    before = _counter(HANDLER_ERRORS, "nearby_professions")
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        send_nearby_professions(ctx, state)
+    assert _counter(HANDLER_ERRORS, "nearby_professions") == before + 1
+    assert "database is locked" in caplog.text and "Traceback" in caplog.text
+
+
+def test_broken_snapshot_is_counted_and_rebuilt(database, tmp_path, caplog):
+    snapshot = tmp_path / "catalog.snap"
+    snapshot.write_bytes(b"not a snapshot")
+    before = _counter(DB_ERRORS, "load_snapshot")
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        db = DB_Manager(database, snapshot=str(snapshot), users_database=str(tmp_path / "users.db"))
+    try:
+        assert _counter(DB_ERRORS, "load_snapshot") == before + 1
+        assert "load_snapshot failed" in caplog.text
+        assert db.catalog.revision == db.catalog_revision
+    finally:
+        db.close()
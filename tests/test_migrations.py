@@ -0,0 +1,133 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from logic import DB_Manager, wilson_lower_bound
+from migrations import MIGRATIONS, _LEGACY_FEEDBACK_UPSERT_SQL, apply_migrations
+
+
+def _start(database, users_database, barrier):
+    from logic import DB_Manager
+    barrier.wait()
+    DB_Manager(database, users_database=users_database).close()
+
+
+def test_concurrent_startup_applies_each_migration_once(database, tmp_path):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(4)
+    workers = [context.Process(target=_start, args=(database, str(tmp_path / "users.db"), barrier))
+               for _ in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(120)
+    assert [p.exitcode for p in workers] == [0] * 4
+
+    conn = sqlite3.connect(database)
+    versions = [v for (v,) in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    conn.close()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_fuzzy_index_drops_descriptions(database):
+    # до миграции 6 триграммный индекс знал описания, и нечёткий поиск находил опечатки в них
+    conn = sqlite3.connect(database)
+    conn.create_function("wilson", 2, wilson_lower_bound)
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] < 6])
+    trgm = "SELECT count(*) FROM professions_trgm WHERE description IS NOT NULL"
+    assert conn.execute(trgm).fetchone()[0] > 0
+
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] == 6])
+    assert conn.execute(trgm).fetchone()[0] == 0
+    assert conn.execute("SELECT count(*) FROM professions_trgm").fetchone()[0] == \
+        conn.execute("SELECT count(*) FROM professions").fetchone()[0]
+    # пересозданные триггеры тоже не кладут описание в индекс
+    with conn:
+        conn.execute("UPDATE professions SET description = 'Новое описание' WHERE id = 1")
+    assert conn.execute(trgm).fetchone()[0] == 0
+    assert conn.execute("SELECT count(*) FROM professions_fts WHERE professions_fts MATCH 'описание'").fetchone()[0] > 0
+    conn.close()
+
+
+def _links(conn, table, column):
+    return conn.execute(f"SELECT id, profession_id, {column} FROM {table} ORDER BY id").fetchall()
+
+
+def test_vocabulary_normalization_keeps_links(database):
+    conn = sqlite3.connect(database)
+    conn.create_function("wilson", 2, wilson_lower_bound)
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] < 7])
+    # старые свободные строки: повторы, спецсимволы, пустые названия и связи без профессии
+    with conn:
+        pid = conn.execute("INSERT INTO professions (name) VALUES ('Квазизубрилог')").lastrowid
+        conn.executemany("INSERT INTO profession_categories (profession_id, category) VALUES (?, ?)",
+                         [(pid, "Наука & <жизнь>"), (pid, None), (None, "Наука & <жизнь>"), (pid, "IT")])
+        conn.executemany("INSERT INTO profession_requirements (profession_id, requirement) VALUES (?, ?)",
+                         [(pid, "Терпение"), (pid, "Терпение"), (pid, None)])
+    old = {table: _links(conn, table, column)
+           for table, column in (("profession_categories", "category"), ("profession_requirements", "requirement"))}
+
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] == 7])
+    for (vocabulary, table, column), (old_table, rows) in zip(
+            (("categories", "profession_categories", "category"),
+             ("requirements", "profession_requirements", "requirement")), old.items()):
+        names = [name for (name,) in conn.execute(f"SELECT name FROM {vocabulary}")]
+        assert sorted(names) == sorted({name for _, _, name in rows if name is not None})
+        # id связей и их порядок сохраняются, связи без названия или профессии отбрасываются
+        assert conn.execute(f"""
+            SELECT l.id, l.profession_id, v.name FROM {table} l JOIN {vocabulary} v ON v.id = l.{column}_id
+            ORDER BY l.id
+        """).fetchall() == [row for row in rows if None not in row]
+
+    # пересозданные триггеры поиска берут названия категорий из словаря
+    match = "SELECT rowid FROM professions_fts WHERE professions_fts MATCH 'categories: жизнь'"
+    assert conn.execute(match).fetchall() == [(pid,)]
+    with conn:
+        conn.execute("UPDATE professions SET description = 'Наблюдает мухоловок' WHERE id = ?", (pid,))
+    assert conn.execute(match).fetchall() == [(pid,)]
+    conn.close()
+
+
+def _stats(conn):
+    return conn.execute("SELECT profession_id, likes, dislikes FROM profession_feedback_stats ORDER BY 1").fetchall()
+
+
+def test_feedback_compaction_keeps_last_vote(database, tmp_path):
+    conn = sqlite3.connect(database)
+    conn.create_function("wilson", 2, wilson_lower_bound)
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] < 9])
+    # до миграции 9 повторные нажатия добавляли строки, и агрегаты считали каждую из них
+    with conn:
+        conn.execute("DELETE FROM users_feedback")
+        conn.executemany("INSERT OR REPLACE INTO users (id, name, age) VALUES (?, ?, ?)", [(101, "a", 16), (102, "b", 40)])
+        conn.executemany("INSERT INTO users_feedback (user_id, profession_id, is_satisfied) VALUES (?, ?, ?)",
+                         [(101, 5, 1), (101, 5, 0), (101, 5, 1), (102, 5, 0), (101, 6, 0), (101, 6, 0)])
+        conn.execute("DELETE FROM profession_feedback_stats")
+        conn.execute("INSERT INTO profession_feedback_stats (profession_id, likes, dislikes) VALUES (5, 2, 2)")
+
+    apply_migrations(conn, [m for m in MIGRATIONS if m[0] == 9])
+    assert conn.execute("SELECT user_id, profession_id, is_satisfied FROM users_feedback ORDER BY 1, 2").fetchall() \
+        == [(101, 5, 1), (101, 6, 0), (102, 5, 0)]
+    assert _stats(conn) == [(5, 1, 1), (6, 0, 1)]
+    assert conn.execute("""
+        SELECT profession_id, age_band, likes, dislikes FROM profession_feedback_age_stats ORDER BY 1, 2
+    """).fetchall() == [(5, "14-17", 1, 0), (5, "35+", 0, 1), (6, "14-17", 0, 1)]
+
+    # повторная оценка заменяет прежнюю, а не добавляет строку
+    with conn:
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO users_feedback (user_id, profession_id, is_satisfied) VALUES (101, 6, 1)")
+    with conn:
+        conn.execute(_LEGACY_FEEDBACK_UPSERT_SQL, (101, 6, 1))
+        conn.execute(_LEGACY_FEEDBACK_UPSERT_SQL, (101, 6, 1))
+    assert conn.execute("SELECT count(*) FROM users_feedback WHERE user_id = 101 AND profession_id = 6"
+                        ).fetchone()[0] == 1
+    assert _stats(conn) == [(5, 1, 1), (6, 1, 0)]
+    conn.close()
+
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        assert db.rebuild_feedback_stats() == 0
+    finally:
+        db.close()
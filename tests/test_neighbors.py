@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import neighbors
+from catalog import Catalog
+from logic import DB_Manager
+
+
+@pytest.fixture
+def db(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    yield db
+    db.close()
+
+
+def _catalog(db):
+    with db.pool.connection() as conn:
+        return Catalog.load(conn)
+
+
+def _graph(db):
+    with db.pool.connection() as conn:
+        graph = {}
+        for pid, q, score in conn.execute("""
+            SELECT profession_id, neighbor_id, score FROM profession_neighbors ORDER BY profession_id, rank
+        """):
+            graph.setdefault(pid, []).append((q, score))
+        return graph
+
+
+def test_neighbors_use_score_and_keep_room_for_other_categories(db):
+    catalog = _catalog(db)
+    index = neighbors.SimilarityIndex(catalog, max_candidates=len(catalog))
+    k = 6
+    for pid in catalog.professions:
+        result = index.neighbors(pid, k)
+        assert len(result) <= k and pid not in dict(result)
+        assert result == sorted(result, key=lambda item: (-item[1], item[0]))
+        assert all(score > 0 and score == index.score(pid, q) for q, score in result)
+
+        # все кандидаты видны, так что выбор совпадает с полным перебором
+        inside, outside = [], []
+        for q in catalog.professions:
+            if q != pid and index.score(pid, q) > 0:
+                shared = set(index.category_ids[pid]) & set(index.category_ids[q])
+                (inside if shared else outside).append((q, index.score(pid, q)))
+        taken = min(len(outside), max(k - k // 2, k - len(inside)))
+        best = sorted(inside, key=neighbors._order)[:k - taken] + sorted(outside, key=neighbors._order)[:taken]
+        assert result == sorted(best, key=neighbors._order)
+
+
+def test_graph_is_rebuilt_and_updated(db, database):
+    catalog = _catalog(db)
+    index = neighbors.SimilarityIndex(catalog)
+    graph = _graph(db)
+    assert graph == {pid: result for pid in catalog.professions if (result := index.neighbors(pid))}
+    assert db.rebuild_neighbors() == sum(map(len, graph.values()))
+
+    # профессия меняет категорию: её список и списки, где она была, пересчитываются
+    pid, _ = next(iter(graph.items()))
+    other = next(c for c, _ in db.get_all_categories() if c not in catalog.categories[pid])
+    conn = sqlite3.connect(database)
+    with conn:
+        conn.execute("DELETE FROM profession_categories WHERE profession_id = ?", (pid,))
+        conn.execute("INSERT INTO profession_categories (profession_id, category_id) VALUES (?, ?)", (pid, other))
+    conn.close()
+    db.invalidate_catalog([pid])
+
+    catalog = _catalog(db)
+    index = neighbors.SimilarityIndex(catalog)
+    graph = _graph(db)
+    assert graph.get(pid, []) == index.neighbors(pid)
+    for q, result in graph.items():
+        assert all(score == pytest.approx(index.score(q, n)) for n, score in result)
+
+
+def test_nearby_professions_follow_the_graph(db):
+    catalog = _catalog(db)
+    graph = _graph(db)
+    for category_id, _ in db.get_all_categories():
+        members = set(catalog.by_category[category_id])
+        best = {}
+        for pid in members:
+            for q, score in graph.get(pid, []):
+                if q not in members:
+                    best[q] = max(best.get(q, score), score)
+        expected = sorted(best, key=lambda q: (-best[q], q))
+        assert [row[0] for row in db.nearby_professions(category_id, k=len(catalog))] == expected
+        assert [row[0] for row in db.nearby_professions(category_id, k=3)] == expected[:3]
+
+        for target, _ in db.get_all_categories():
+            if target == category_id:
+                continue
+            rows = db.nearby_professions(category_id, target, education_max=1, k=len(catalog))
+            education = {q: catalog.professions[q][4] for q in expected}
+            assert [row[0] for row in rows] == [q for q in expected if q in catalog.by_category[target]
+                                                and education[q] is not None and education[q] <= 1]
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+from outbox import AsyncOutbox, Outbox
+
+LATENCY = 0.05
+
+
+class _FakeBot:
+    """Записывает вызовы; каждый отвечает через LATENCY секунд, как Telegram по сети."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        time.sleep(LATENCY)
+        with self._lock:
+            self.calls.append((chat_id, text))
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        with self._lock:
+            self.calls.append((None, callback_query_id))
+
+
+class _AsyncFakeBot(_FakeBot):
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.calls.append((chat_id, text))
+
+    async def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        self.calls.append((None, callback_query_id))
+
+
+def _per_chat(calls):
+    chats = {}
+    for chat_id, text in calls:
+        chats.setdefault(chat_id, []).append(text)
+    return chats
+
+
+def test_senders_overlap_calls_and_keep_chat_order():
+    bot = _FakeBot()
+    outbox = Outbox(bot, global_rate=0, chat_rate=0, senders=8)
+    started = time.perf_counter()
+    for n in range(5):
+        for chat_id in range(1, 17):
+            outbox.send_message(chat_id, n)
+    outbox.flush()
+    elapsed = time.perf_counter() - started
+    outbox.close()
+
+    # 80 вызовов по 50 мс: один отправитель потратил бы 4 с
+    assert elapsed < 1.5
+    assert _per_chat(bot.calls) == {chat_id: [0, 1, 2, 3, 4] for chat_id in range(1, 17)}
+
+
+def test_callback_answer_does_not_wait_behind_chat_queue():
+    bot = _FakeBot()
+    outbox = Outbox(bot, global_rate=0, chat_rate=0, senders=2)
+    for n in range(10):
+        outbox.send_message(1, n)
+    time.sleep(LATENCY / 2)
+    outbox.answer_callback_query("cb")
+    deadline = time.monotonic() + 1
+    while (None, "cb") not in bot.calls and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert bot.calls.index((None, "cb")) <= 1
+    outbox.flush()
+    outbox.close()
+
+
+def test_async_senders_overlap_calls_and_keep_chat_order():
+    bot = _AsyncFakeBot()
+
+    async def run():
+        outbox = AsyncOutbox(bot, global_rate=0, chat_rate=0, senders=8)
+        outbox.start()
+        started = time.perf_counter()
+        for n in range(5):
+            for chat_id in range(1, 17):
+                outbox.send_message(chat_id, n)
+        await outbox.flush()
+        elapsed = time.perf_counter() - started
+        await outbox.close()
+        return elapsed
+
+    assert asyncio.run(run()) < 1.5
+    assert _per_chat(bot.calls) == {chat_id: [0, 1, 2, 3, 4] for chat_id in range(1, 17)}
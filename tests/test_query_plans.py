@@ -0,0 +1,78 @@
+import re
+
+import pytest
+
+from logic import DB_Manager
+from migrations import FEEDBACK_STATS_SQL
+
+
+class _NoAnswers:
+    def find(self, *args):
+        return None
+
+
+@pytest.fixture
+def db(database, tmp_path):
+    # SQL-режим без таблицы ответов: все запросы идут в базу
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    db._get_answers = lambda: _NoAnswers()
+    yield db
+    db.close()
+
+
+def plans(pool, call):
+    """Выполняет call и возвращает план EXPLAIN QUERY PLAN каждого SELECT, который он сделал через pool."""
+    statements = []
+    with pool.connection() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        # пул отдаёт последнее возвращённое соединение, так что call работал на нём же
+        with pool.connection() as conn:
+            conn.set_trace_callback(None)
+            return [[row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                    for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def _check(found, indexes):
+    steps = [step for plan in found for step in plan]
+    assert steps
+    for index in indexes:
+        assert any(re.search(rf"\bINDEX ({index})\b", step) for step in steps), (index, steps)
+    # ни одного полного прохода по таблице
+    assert not any(step.startswith("SCAN ") for step in steps), steps
+
+
+def test_catalog_queries_use_indexes(db):
+    c = db.get_all_categories()[0][0]
+    r = db.get_all_requirements(c)[0][0]
+    cases = [
+        (lambda: db.get_professions_in_category(c), ["idx_profession_categories_category"]),
+        (lambda: db.get_all_requirements(c), ["idx_profession_categories_category",
+                                              "idx_profession_requirements_profession"]),
+        (lambda: db.get_profession_details(3), ["idx_profession_categories_profession",
+                                                "idx_profession_requirements_profession"]),
+        (lambda: db.find_professions(category_id=c, requirement_id=r, limit=3),
+         ["idx_profession_categories_category", "idx_profession_requirements_requirement"]),
+        (lambda: db.find_professions(requirement_id=r), ["idx_profession_requirements_requirement"]),
+        (lambda: db.nearby_professions(c), ["idx_profession_categories_category",
+                                            "idx_profession_categories_profession"]),
+    ]
+    for call, indexes in cases:
+        db.vocabulary_cache.invalidate()
+        _check(plans(db.pool, call), indexes)
+
+
+def test_feedback_queries_use_indexes(db):
+    with db.users_pool.connection() as conn:
+        lookup = [row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN SELECT is_satisfied FROM users_feedback WHERE user_id = 1 AND profession_id = 2
+        """)]
+        stats = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + FEEDBACK_STATS_SQL)]
+    # в отдельной базе пользователей уникальность задана в самой таблице
+    _check([lookup], ["idx_users_feedback_user_profession|sqlite_autoindex_users_feedback_1"])
+    # полный пересчёт агрегатов проходит все отзывы, но по покрывающему индексу, а не по таблице
+    assert stats == ["SCAN users_feedback USING COVERING INDEX idx_users_feedback_profession"]
+
+    _check(plans(db.users_pool, lambda: db.feedback_scores([1, 2, 3], age=16)), [])
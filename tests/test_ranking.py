@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from ranking import Ranker, np
+
+
+pytestmark = pytest.mark.skipif(np is None, reason="ранжирование требует numpy")
+
+
+def _brute_force(ranker, k, **answers):
+    """Оценка каждой профессии по отдельности и полная сортировка по (-оценка, id)."""
+    scored = []
+    for pid, row in ranker.rows.items():
+        one = Ranker(capacity=1)
+        labels = ranker.row_labels[row]
+        one.upsert(pid, None, None, [v for kind, v in labels if kind == "c"], [v for kind, v in labels if kind == "r"])
+        one.interaction[0], one.education[0] = ranker.interaction[row], ranker.education[row]
+        scored.append((pid, one.top(k=1, **answers)[0][1]))
+    return sorted(scored, key=lambda item: (-item[1], item[0]))[:k]
+
+
+def test_ties_at_the_boundary_go_by_id():
+    ranker = Ranker(capacity=4)
+    # строки идут не по порядку id, а часть освободившихся строк занята заново
+    pids = list(range(100, 160))
+    random.Random(1).shuffle(pids)
+    for pid in pids:
+        ranker.upsert(pid, 1, 1, [7] if pid % 3 == 0 else [8], [])
+    for pid in pids[:10]:
+        ranker.remove(pid)
+    for pid in pids[:5]:
+        ranker.upsert(pid, 1, 1, [8], [])
+
+    for k in (1, 3, 5, 17, 40, 100):
+        top = ranker.top(interaction_level=1, category=7, k=k)
+        expected = _brute_force(ranker, k, interaction_level=1, category=7)
+        assert top == expected
+
+    # все оценки равны: первые k по id
+    assert [pid for pid, _ in ranker.top(k=7)] == sorted(ranker.rows)[:7]
+
+
+def test_top_matches_brute_force():
+    rnd = random.Random(2)
+    ranker = Ranker()
+    for pid in range(1, 300):
+        ranker.upsert(pid, rnd.choice([None, 0, 1, 2]), rnd.choice([None, 0, 1, 2, 3]),
+                      rnd.sample(range(6), rnd.randint(0, 2)), rnd.sample(range(10), rnd.randint(0, 3)))
+    for pid in rnd.sample(range(1, 300), 40):
+        ranker.remove(pid)
+    assert len(ranker) == 259
+
+    for _ in range(50):
+        answers = {"interaction_level": rnd.choice([None, 0, 1, 2]), "category": rnd.choice([None, 1, 4]),
+                   "requirement": rnd.choice([None, 3, 9]), "education_max": rnd.choice([None, 0, 2, 3])}
+        k = rnd.choice([1, 5, 20, 300])
+        assert ranker.top(k=k, **answers) == _brute_force(ranker, k, **answers)
+
+
+def test_removed_and_updated_rows():
+    ranker = Ranker()
+    ranker.upsert(1, 2, 0, [1], [])
+    ranker.upsert(2, 2, 0, [2], [])
+    assert ranker.top(category=1, k=1) == [(1, Ranker.W_CATEGORY)]
+
+    ranker.upsert(1, 2, 0, [2], [])
+    assert ranker.top(category=1, k=2) == [(1, 0.0), (2, 0.0)]
+    ranker.remove(1)
+    assert ranker.top(category=2, k=5) == [(2, Ranker.W_CATEGORY)]
+    ranker.remove(2)
+    assert ranker.top(k=5) == []
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from logic import DB_Manager, fts_query
+
+
+@pytest.fixture
+def db(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    yield db
+    db.close()
+
+
+def _add_profession(database, name, description):
+    conn = sqlite3.connect(database)
+    with conn:
+        pid = conn.execute("""
+            INSERT INTO professions (name, description, interaction_level, education_level) VALUES (?, ?, 1, 1)
+        """, (name, description)).lastrowid
+    conn.close()
+    return pid
+
+
+def _ids(result):
+    rows, fuzzy = result
+    return [row[0] for row in rows], fuzzy
+
+
+def test_fts_query():
+    assert fts_query("Программисты и врачи") == '"програ"* "врач"*'
+    assert fts_query("1с 123456") == '"1с"* "123456"*'
+    assert fts_query("к и") == ""
+
+
+def test_fuzzy_search_covers_names_but_not_descriptions(db, database):
+    pid = _add_profession(database, "Квазизубрилог", "Наблюдает фрактальных мухоловок.")
+    assert _ids(db.search_professions("квазизубрилог")) == ([pid], False)
+    assert _ids(db.search_professions("мухоловок")) == ([pid], False)
+
+    # опечатка в названии находится по триграммам
+    ids, fuzzy = _ids(db.search_professions("кваиззубрилог"))
+    assert fuzzy and ids[0] == pid
+    # описаний в триграммном индексе нет, так что опечатка в описании эту профессию не находит
+    ids, fuzzy = _ids(db.search_professions("мхуоловок", limit=100))
+    assert fuzzy and pid not in ids
+
+
+def test_name_matches_rank_first(db):
+    rows, fuzzy = db.search_professions("аналитик", limit=10)
+    assert not fuzzy
+    # профессия с «аналитиком» в названии первая, хотя раньше неё по id идут совпадения по описанию
+    assert "аналитик" in rows[0][1].lower()
+    assert rows[0][0] > min(row[0] for row in rows[1:])
+
+
+def test_pages_follow_one_order(db):
+    for text in ("аналитик", "разрабатывает", "enigneer"):
+        whole, fuzzy = db.search_professions(text, limit=100)
+        assert whole
+        paged = []
+        for offset in range(0, len(whole) + 2, 2):
+            rows, page_fuzzy = db.search_professions(text, limit=2, offset=offset)
+            assert page_fuzzy == fuzzy
+            paged += rows
+        assert paged == whole, text
+
+
+def test_renamed_profession_is_found_by_new_name(db, database):
+    pid = _add_profession(database, "Квазизубрилог", "")
+    conn = sqlite3.connect(database)
+    with conn:
+        conn.execute("UPDATE professions SET name = 'Гиперболоидщик' WHERE id = ?", (pid,))
+    conn.close()
+    assert _ids(db.search_professions("гиперболоидщик")) == ([pid], False)
+    assert pid not in _ids(db.search_professions("квазизубрилог"))[0]
+
+
+def test_best_match_wins_over_lower_ids(db, database):
+    # сотни совпадений с меньшими id и одно лучшее по bm25 — последним
+    common = [_add_profession(database, f"Слесарь {i}", "Изредка вспоминает про квазизубрилогию, "
+                              "а в остальное время чинит трубы, краны, насосы и прочее оборудование.")
+              for i in range(300)]
+    best = _add_profession(database, "Смотритель", "Квазизубрилогия и квазизубрилогия.")
+    assert _ids(db.search_professions("квазизубрилогия", limit=1)) == ([best], False)
+
+    # страницы доходят до последнего совпадения
+    paged = []
+    for offset in range(0, 320, 50):
+        paged += _ids(db.search_professions("квазизубрилогия", limit=50, offset=offset))[0]
+    assert paged == [best] + common
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+from sessions import SQLiteSessionStore
+
+
+def test_change_after_background_flush_is_persisted(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, flush_interval=3600)
+    store.save(store.start(1))
+    store.flush()
+
+    session = store.get(1)
+    # фоновая запись срабатывает между get() и обработчиком
+    store.flush()
+    session.stage = "test_category"
+    session.name = "Аня"
+    store.save(session)
+    store.close()
+
+    store = SQLiteSessionStore(path, flush_interval=3600)
+    try:
+        session = store.get(1)
+        assert (session.stage, session.name) == ("test_category", "Аня")
+    finally:
+        store.close()
+
+
+def test_flush_writes_state_as_of_save(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, flush_interval=3600)
+    session = store.start(1)
+    session.name = "Аня"
+    store.save(session)
+    # следующий обработчик уже меняет сессию, но ещё не закончил
+    session.name = "наполовину"
+    store.flush()
+    store._sessions.clear()
+    assert store.get(1).name == "Аня"
+    store.close()
+
+
+def test_legacy_text_ids_are_migrated_to_integers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    # сессии в том виде, в каком их хранил SQLiteSessionStore до миграций: id категорий в TEXT
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sessions (
+            user_id INTEGER PRIMARY KEY, stage TEXT, touched REAL, name TEXT, age INTEGER,
+            interaction_level INTEGER, category TEXT, current_field TEXT, wants_to_stay INTEGER,
+            ready INTEGER, target_field TEXT
+        )
+    """)
+    now = time.time()
+    conn.executemany("INSERT INTO sessions VALUES (?, 'test_category', ?, 'Аня', 16, 1, ?, ?, 1, 0, ?)",
+                     [(1, now, "5", "12", "7"), (2, now, "Программирование", "", None)])
+    conn.commit()
+    conn.close()
+
+    store = SQLiteSessionStore(path, flush_interval=3600)
+    try:
+        first, second = store.get(1), store.get(2)
+        assert (first.category, first.current_field, first.target_field) == (5, 12, 7)
+        assert (second.category, second.current_field, second.target_field) == (None, None, None)
+        assert (first.wants_to_stay, first.ready) == (True, False)
+        types = {row[1]: row[2] for row in store._conn.execute("PRAGMA table_info(sessions)")}
+        assert types["category"] == types["current_field"] == types["target_field"] == "INTEGER"
+
+        first.category = 9
+        store.save(first)
+        store.flush()
+        assert store._conn.execute("SELECT typeof(category) FROM sessions WHERE user_id = 1").fetchone() == ("integer",)
+    finally:
+        store.close()
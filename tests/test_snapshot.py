@@ -0,0 +1,54 @@
+import os
+import sqlite3
+
+import pytest
+
+from logic import DB_Manager
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return str(tmp_path / "catalog.snap")
+
+
+def _open(database, snapshot, tmp_path):
+    return DB_Manager(database, snapshot=snapshot, users_database=str(tmp_path / "users.db"))
+
+
+def _rename(database, pid, name):
+    conn = sqlite3.connect(database)
+    with conn:
+        conn.execute("UPDATE professions SET name = ? WHERE id = ?", (name, pid))
+    conn.close()
+
+
+def test_loaded_snapshot_keeps_its_revision(database, snapshot, tmp_path):
+    writer = _open(database, snapshot, tmp_path)
+    reader = _open(database, snapshot, tmp_path)
+    try:
+        assert reader.catalog_revision == writer.catalog_revision is not None
+        inode = os.stat(snapshot).st_ino
+        # опрос в другом процессе не перестраивает снимок из базы, даже если база изменилась
+        _rename(database, 1, "Квазизубрилог")
+        assert not reader.check_catalog()
+        assert os.stat(snapshot).st_ino == inode
+        assert reader.get_profession_details(1)["name"] != "Квазизубрилог"
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_follows_snapshot_written_by_writer(database, snapshot, tmp_path):
+    writer = _open(database, snapshot, tmp_path)
+    reader = _open(database, snapshot, tmp_path)
+    try:
+        _rename(database, 1, "Квазизубрилог")
+        writer.invalidate_catalog([1])
+        assert reader.check_catalog()
+        assert reader.get_profession_details(1)["name"] == "Квазизубрилог"
+        assert reader.catalog_revision == writer.catalog_revision
+        assert os.stat(snapshot).st_ino == reader.catalog.stat.st_ino == writer.catalog.stat.st_ino
+        assert not reader.check_catalog()
+    finally:
+        reader.close()
+        writer.close()
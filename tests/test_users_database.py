@@ -0,0 +1,111 @@
+import os
+import sqlite3
+
+import pytest
+
+from logic import DB_Manager, wilson_lower_bound
+from migrations import apply_migrations, copy_legacy_users, user_migrations
+
+
+VOTES = [(101, 5, 1), (101, 5, 0), (102, 5, 1), (102, 6, None), (103, 6, 0)]
+
+
+def _seed_legacy_users(database, votes=VOTES):
+    conn = sqlite3.connect(database)
+    with conn:
+        conn.execute("DELETE FROM users_feedback")
+        conn.executemany("INSERT OR REPLACE INTO users (id, name, age) VALUES (?, ?, ?)",
+                         [(101, "Аня", 16), (102, "Борис", 40), (103, "Вера", None)])
+        conn.executemany("INSERT INTO users_feedback (user_id, profession_id, is_satisfied) VALUES (?, ?, ?)", votes)
+    users = conn.execute("SELECT id, name, age FROM users ORDER BY id").fetchall()
+    conn.close()
+    return users
+
+
+def _users_conn(users_database, catalog_database):
+    conn = sqlite3.connect(users_database)
+    conn.create_function("wilson", 2, wilson_lower_bound)
+    apply_migrations(conn, user_migrations(catalog_database))
+    return conn
+
+
+def test_legacy_users_move_to_users_database(database, tmp_path):
+    users = _seed_legacy_users(database)
+    conn = _users_conn(str(tmp_path / "users.db"), database)
+    try:
+        assert conn.execute("SELECT id, name, age FROM users ORDER BY id").fetchall() == users
+        # из повторов остаётся последний голос, голоса без значения не переносятся
+        assert conn.execute("""
+            SELECT user_id, profession_id, is_satisfied, age_band FROM users_feedback ORDER BY 1, 2
+        """).fetchall() == [(101, 5, 0, "14-17"), (102, 5, 1, "35+"), (103, 6, 0, None)]
+        assert conn.execute("SELECT profession_id, likes, dislikes FROM profession_feedback_stats ORDER BY 1"
+                            ).fetchall() == [(5, 1, 1), (6, 0, 1)]
+
+        # повторный перенос ничего не удваивает
+        with conn:
+            copy_legacy_users(database, conn)
+        assert conn.execute("SELECT count(*) FROM users_feedback").fetchone()[0] == 3
+    finally:
+        conn.close()
+
+
+def test_missing_catalog_database_is_skipped(tmp_path):
+    conn = _users_conn(str(tmp_path / "users.db"), str(tmp_path / "absent.db"))
+    try:
+        assert conn.execute("SELECT count(*) FROM users").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert not os.path.exists(tmp_path / "absent.db")
+
+
+def test_manager_reads_users_from_separate_database(database, tmp_path):
+    _seed_legacy_users(database, [vote for vote in VOTES if vote[2] is not None])
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        assert db.get_feedback_stats(5)["likes"] == 1 and db.get_feedback_stats(5)["dislikes"] == 1
+        assert db.rebuild_feedback_stats() == 0
+        # новые отзывы пишутся в базу пользователей, а не в базу каталога
+        db.save_user_feedback(104, 7, 1)
+        with db.pool.connection() as conn:
+            assert conn.execute("SELECT count(*) FROM users_feedback WHERE user_id = 104").fetchone()[0] == 0
+        with db.users_pool.connection() as conn:
+            assert conn.execute("SELECT count(*) FROM users_feedback WHERE user_id = 104").fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+def test_catalog_readers_are_read_only(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    try:
+        with db.pool.connection() as conn:
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("UPDATE professions SET name = 'x' WHERE id = 1")
+            # mode=ro держит и без query_only
+            conn.execute("PRAGMA query_only = 0")
+            with pytest.raises(sqlite3.OperationalError, match="readonly"):
+                conn.execute("UPDATE professions SET name = 'x' WHERE id = 1")
+            conn.execute("PRAGMA query_only = 1")
+        assert db.get_profession_details(1)["name"] != "x"
+    finally:
+        db.close()
+
+
+def test_immutable_catalog(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"))
+    name = db.get_profession_details(1)["name"] + " (обновлено)"
+    with db.write_pool.connection() as conn, conn:
+        conn.execute("UPDATE professions SET name = ? WHERE id = 1", (name,))
+    db.save_user_feedback(1, 1, 1)
+    db.close()
+
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"), immutable=True, catalog_poll=0.01)
+    try:
+        # immutable-соединения не видят WAL, поэтому при старте он сливается в основной файл
+        wal = database + "-wal"
+        assert not os.path.exists(wal) or os.path.getsize(wal) == 0
+        assert db._poller is None
+        assert db.get_profession_details(1)["name"] == name
+        assert db.search_professions("обновлено")[0][0][0] == 1
+        assert db.get_feedback_stats(1)["likes"] == 1
+    finally:
+        db.close()
@@ -0,0 +1,44 @@
+import threading
+from contextlib import contextmanager
+
+from logic import DB_Manager
+from writer import WriteBehindWriter
+
+
+def test_batch_keeps_submission_order(database, tmp_path):
+    db = DB_Manager(database, users_database=str(tmp_path / "users.db"), write_behind=True)
+    try:
+        db.add_user(1, "a", 16)
+        db.writer.flush()
+        # в одной пачке: отзыв старого пользователя, затем новый пользователь и его отзыв
+        db.save_user_feedback(1, 5, 1)
+        db.add_user(2, "b", 40)
+        db.save_user_feedback(2, 5, 0)
+        db.writer.flush()
+        with db.users_pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT age_band, likes, dislikes FROM profession_feedback_age_stats
+                WHERE profession_id = 5 ORDER BY age_band
+            """).fetchall()
+        assert rows == [("14-17", 1, 0), ("35+", 0, 1)]
+    finally:
+        db.close()
+
+
+class _BrokenPool:
+    @contextmanager
+    def connection(self):
+        raise OSError("disk is gone")
+        yield
+
+
+def test_failed_batch_does_not_hang_flush():
+    writer = WriteBehindWriter(_BrokenPool(), flush_interval=0.01)
+    writer.submit([("INSERT INTO t VALUES (?)", (1,))])
+    done = threading.Event()
+    threading.Thread(target=lambda: (writer.flush(), done.set()), daemon=True).start()
+    assert done.wait(5)
+
+    writer.submit([("INSERT INTO t VALUES (?)", (2,))])
+    writer.flush()
+    writer.close()
@@ -0,0 +1,129 @@
+import logging
+import queue
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+from metrics import QUEUE_DEPTH
+
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def update_user_id(update):
+    """id пользователя, по которому шардируются апдейты (0, если его нет)."""
+    for kind in ("message", "edited_message", "callback_query", "inline_query"):
+        obj = getattr(update, kind, None)
+        if obj is not None and obj.from_user is not None:
+            return obj.from_user.id
+    return 0
+
+
+class ShardedWorkerPool:
+    """Пул обработчиков, в котором у каждого пользователя своя очередь-шард.
+
+    Апдейты одного пользователя всегда попадают в один и тот же поток и
+    обрабатываются строго по порядку, а разные пользователи — параллельно.
+    """
+
+    def __init__(self, handle, workers=8, queue_size=1000):
+        self.handle = handle
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"update-worker-{i}", daemon=True)
+            for i, q in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, key, item, timeout=None):
+        """Ставит апдейт в очередь его шарда; при переполнении бросает queue.Full."""
+        self.queues[key % len(self.queues)].put(item, timeout=timeout)
+
+    def depths(self):
+        return [q.qsize() for q in self.queues]
+
+    def close(self):
+        """Дожидается обработки всего, что уже стоит в очередях."""
+        for q in self.queues:
+            q.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            try:
+                self.handle(item)
+            except Exception as e:
+                # ошибки обработчиков уже посчитал metrics.handler
+                log.exception("update handling failed: %s", e)
+
+
+def make_handler(pool, path, secret_token=None, put_timeout=1):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self.send_error(404)
+                return
+            if secret_token and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+                self.send_error(403)
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                update = types.Update.de_json(self.rfile.read(length).decode("utf-8"))
+            except Exception:
+                self.send_error(400)
+                return
+
+            try:
+                pool.submit(update_user_id(update), update, timeout=put_timeout)
+            except queue.Full:
+                # Telegram повторит доставку позже
+                self.send_error(503)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def run_webhook(bot, url, listen="127.0.0.1", port=8443, path="/telegram", secret_token=None,
+                workers=8, queue_size=1000):
+    """Запускает локальный HTTP-сервер для вебхука и блокируется до остановки.
+
+    TLS терминируется снаружи (nginx и т.п.), который проксирует url на
+    listen:port. По SIGINT/SIGTERM сервер перестаёт принимать запросы, а
+    уже принятые апдейты дообрабатываются.
+    """
+    pool = ShardedWorkerPool(lambda update: bot.process_new_updates([update]), workers, queue_size)
+    for i, q in enumerate(pool.queues):
+        QUEUE_DEPTH.track(f"webhook_{i}", q.qsize)
+    server = ThreadingHTTPServer((listen, port), make_handler(pool, path, secret_token))
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    bot.remove_webhook()
+    bot.set_webhook(url=url.rstrip("/") + path, secret_token=secret_token or None,
+                    max_connections=min(workers * 2, 100))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.close()
@@ -0,0 +1,118 @@
+import logging
+import queue
+import threading
+import time
+
+from metrics import db_error
+
+
+log = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Фоновая запись в базу: INSERT-ы копятся в очереди и коммитятся пачками.
+
+    Элемент очереди — список пар (sql, params), которые должны попасть в
+    базу вместе, например отзыв и обновление его агрегатов. Запросы
+    выполняются строго в порядке постановки; в один executemany сливаются
+    только идущие подряд запросы с одинаковым SQL.
+
+    Пачка сбрасывается, когда набралось batch_size записей или прошло
+    flush_interval секунд с первой записи в ней. Если очередь заполнена,
+    submit ждёт до put_timeout секунд и затем бросает queue.Full.
+    """
+
+    def __init__(self, pool, max_queue=10000, batch_size=500, flush_interval=0.2, put_timeout=5):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def submit(self, statements):
+        if self._closed:
+            raise RuntimeError("writer is closed")
+        self._queue.put(statements, timeout=self.put_timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Блокируется, пока всё поставленное в очередь не будет записано."""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if not batch:
+                continue
+            # поток не должен умереть, иначе flush() и close() ждали бы вечно
+            try:
+                self._write(batch)
+            except Exception as e:
+                db_error("write_behind", e)
+                log.error("batch of %d writes is lost", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        runs = []
+        for statements in batch:
+            for sql, params in statements:
+                if runs and runs[-1][0] == sql:
+                    runs[-1][1].append(params)
+                else:
+                    runs.append((sql, [params]))
+
+        with self.pool.connection() as conn:
+            try:
+                with conn:
+                    conn.execute("BEGIN")
+                    for sql, rows in runs:
+                        conn.executemany(sql, rows)
+                return
+            except Exception as e:
+                log.warning("batch write failed, retrying row by row: %s", e)
+
+            for statements in batch:
+                try:
+                    with conn:
+                        conn.execute("BEGIN")
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                except Exception as e:
+                    db_error("write_behind", e)